@@ -1,10 +1,34 @@
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for, send_file
+from flask import Flask, render_template, request, jsonify, session, redirect, url_for, send_file, g, Response, has_request_context
+from flask import before_render_template, template_rendered, send_from_directory
+from markupsafe import Markup, escape
+from werkzeug.utils import safe_join
 from flask_sqlalchemy import SQLAlchemy
-from flask_bcrypt import Bcrypt
+from sqlalchemy import event, text, select, insert, delete, update
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.engine import Engine
 from datetime import datetime, timedelta
+from contextlib import contextmanager
 import json
+import math
+import multiprocessing
+import mimetypes
 import os
 import sqlite3
+import threading
+import time
+import cProfile
+import re
+import secrets
+import bcrypt as bcrypt_lib
+from asset_bundles import BUNDLES, NPM_PREFIX, bundle_name, cdn_package_bases, cdn_url
+from emotion_smoothing import EmotionSmoother, pack_probabilities, unpack_probabilities
+from sample_codec import CONTENT_TYPE as SAMPLE_BATCH_CONTENT_TYPE, decode_sample_batch
+from live_sessions import LiveSession, to_epoch
+from shared_backend import create_shared_backend
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import letter, A4
 from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image, PageBreak
@@ -32,16 +56,74 @@ except ImportError:
    CHARTS_AVAILABLE = False
    print("Charts功能暫時無法使用，將生成純文字報告")
 
+# pyinstrument 為選用套件，未安裝時使用內建的 cProfile
+try:
+   from pyinstrument import Profiler as PyinstrumentProfiler
+   PYINSTRUMENT_AVAILABLE = True
+except ImportError:
+   PYINSTRUMENT_AVAILABLE = False
+
 from io import BytesIO
 import base64
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'your-secret-key-here')
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///learning_system.db'
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///learning_system.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# 效能監測（預設關閉）：ENABLE_METRICS=1 開啟 /metrics，PROFILE_SLOW_REQUEST_MS>0 時輸出慢請求的效能剖析
+app.config['ENABLE_METRICS'] = os.environ.get('ENABLE_METRICS', '0') == '1'
+app.config['PROFILE_SLOW_REQUEST_MS'] = int(os.environ.get('PROFILE_SLOW_REQUEST_MS', 0))
+app.config['PROFILE_DIR'] = os.environ.get('PROFILE_DIR', 'profiles')
+# 背景工作：大量刪除與資料庫維護改由背景執行緒分批處理，避免長時間佔用寫入鎖
+# 各程序於第一個請求時啟動背景執行緒；設為 0 時須另以 flask run-jobs 執行，否則閒置的學習階段不會自動結束
+app.config['JOB_WORKER_ENABLED'] = os.environ.get('JOB_WORKER_ENABLED', '1') == '1'
+app.config['JOB_POLL_SECONDS'] = float(os.environ.get('JOB_POLL_SECONDS', 2))
+app.config['JOB_CHUNK_PAUSE_SECONDS'] = float(os.environ.get('JOB_CHUNK_PAUSE_SECONDS', 0.05))
+app.config['JOB_MAX_ATTEMPTS'] = int(os.environ.get('JOB_MAX_ATTEMPTS', 3))
+app.config['EMOTION_RETENTION_DAYS'] = int(os.environ.get('EMOTION_RETENTION_DAYS', 0))  # 0 表示永久保留
+app.config['REPORT_RETENTION_HOURS'] = int(os.environ.get('REPORT_RETENTION_HOURS', 24))
+app.config['MAINTENANCE_INTERVAL_HOURS'] = float(os.environ.get('MAINTENANCE_INTERVAL_HOURS', 24))
+app.config['VACUUM_INTERVAL_HOURS'] = float(os.environ.get('VACUUM_INTERVAL_HOURS', 24 * 7))  # 0 表示不自動重整
+# 密碼雜湊：bcrypt 於獨立程序池中計算，避免登入尖峰時佔滿處理請求的執行緒
+app.config['BCRYPT_LOG_ROUNDS'] = int(os.environ.get('BCRYPT_LOG_ROUNDS', 12))
+app.config['PASSWORD_HASH_WORKERS'] = int(os.environ.get('PASSWORD_HASH_WORKERS', 2))  # 0 表示在請求執行緒中計算
+app.config['PASSWORD_HASH_QUEUE_LIMIT'] = int(os.environ.get('PASSWORD_HASH_QUEUE_LIMIT', 16))
+app.config['PASSWORD_HASH_WAIT_SECONDS'] = float(os.environ.get('PASSWORD_HASH_WAIT_SECONDS', 5))
+# 情緒取樣：前端在情緒穩定時自動降低頻率，伺服器可設定最短取樣間隔以限制負載
+app.config['MIN_SAMPLE_INTERVAL_MS'] = int(os.environ.get('MIN_SAMPLE_INTERVAL_MS', 1000))
+app.config['MAX_SAMPLE_WEIGHT'] = float(os.environ.get('MAX_SAMPLE_WEIGHT', 60))
+app.config['MAX_INGEST_BATCH'] = int(os.environ.get('MAX_INGEST_BATCH', 500))  # 離線補傳每批最多筆數
+app.config['EMOTION_WINDOW_SECONDS'] = int(os.environ.get('EMOTION_WINDOW_SECONDS', 0))  # 0 表示逐筆上傳，否則前端依時間窗彙整
+# 裝置與伺服器的時間差超過此值才校正前端時間，較小的差距多半只是網路延遲
+app.config['CLOCK_SKEW_TOLERANCE_MS'] = int(os.environ.get('CLOCK_SKEW_TOLERANCE_MS', 2000))
+# 多個程序或多台主機共用的後端（分析快取、進行中學習階段的登錄表、限流、PDF 報告，見 shared_backend.py）：
+# 空白為程序記憶體，或設定 redis://... 、file:///共用目錄；舊設定 LIVE_SESSION_REDIS_URL 仍然有效
+app.config['SHARED_BACKEND_URL'] = os.environ.get('SHARED_BACKEND_URL', os.environ.get('LIVE_SESSION_REDIS_URL', ''))
+# 分析快取秒數（0 表示不快取）：程序記憶體中的快取無法由其他程序失效（如 gunicorn -w N），預設只在設定共用後端時開啟
+app.config['ANALYTICS_CACHE_SECONDS'] = int(os.environ.get('ANALYTICS_CACHE_SECONDS',
+                                                           300 if app.config['SHARED_BACKEND_URL'] else 0))
+# 閒置超過時間的學習階段自動結束（0 表示不自動結束）
+app.config['SESSION_IDLE_MINUTES'] = float(os.environ.get('SESSION_IDLE_MINUTES', 30))
+app.config['IDLE_SWEEP_SECONDS'] = float(os.environ.get('IDLE_SWEEP_SECONDS', 60))
+# 上傳限流：每個帳號與每個學習階段各一個權杖桶（每秒請求數、可累積的突發量，速率 0 表示不限制）
+app.config['INGEST_USER_RATE'] = float(os.environ.get('INGEST_USER_RATE', 5))
+app.config['INGEST_USER_BURST'] = int(os.environ.get('INGEST_USER_BURST', 60))
+app.config['INGEST_SESSION_RATE'] = float(os.environ.get('INGEST_SESSION_RATE', 2))
+app.config['INGEST_SESSION_BURST'] = int(os.environ.get('INGEST_SESSION_BURST', 20))
+app.config['START_SESSION_RATE'] = float(os.environ.get('START_SESSION_RATE', 0.1))
+app.config['START_SESSION_BURST'] = int(os.environ.get('START_SESSION_BURST', 5))
+# 准入控制：同時寫入資料庫的上傳請求數上限（0 表示不限制），等待逾時回傳 429，並逐級加倍建議的取樣間隔
+app.config['INGEST_MAX_WRITERS'] = int(os.environ.get('INGEST_MAX_WRITERS', 4))
+app.config['INGEST_WRITE_WAIT_SECONDS'] = float(os.environ.get('INGEST_WRITE_WAIT_SECONDS', 0.5))
+app.config['INGEST_OVERLOAD_MAX_LEVEL'] = int(os.environ.get('INGEST_OVERLOAD_MAX_LEVEL', 3))
+app.config['INGEST_OVERLOAD_DECAY_SECONDS'] = float(os.environ.get('INGEST_OVERLOAD_DECAY_SECONDS', 30))
 
 db = SQLAlchemy(app)
-bcrypt = Bcrypt(app)
+shared_backend = create_shared_backend(app.config['SHARED_BACKEND_URL'])
+live_registry = shared_backend.registry
+rate_limiter = shared_backend.rate_limiter
+analytics_cache = shared_backend.cache
+report_store = shared_backend.reports
 
 # 註冊中文字體用於 PDF - 使用微軟正黑體
 try:
@@ -74,7 +156,7 @@ class User(db.Model):
 
 class Child(db.Model):
    id = db.Column(db.Integer, primary_key=True)
-   user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+   user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False, index=True)
    nickname = db.Column(db.String(80), nullable=False)
    gender = db.Column(db.String(10), nullable=False)  # male/female
    age = db.Column(db.Integer, nullable=False)
@@ -84,23 +166,150 @@ class Child(db.Model):
 
 class StudySession(db.Model):
    id = db.Column(db.Integer, primary_key=True)
-   child_id = db.Column(db.Integer, db.ForeignKey('child.id'), nullable=False)
+   child_id = db.Column(db.Integer, db.ForeignKey('child.id', ondelete='CASCADE'), nullable=False, index=True)
    subject = db.Column(db.String(50), nullable=False)
    duration_minutes = db.Column(db.Integer, nullable=False)
    start_time = db.Column(db.DateTime, default=datetime.utcnow)
    end_time = db.Column(db.DateTime)
    avg_attention = db.Column(db.Float)
    avg_emotion_score = db.Column(db.Float)
+   inference_backend = db.Column(db.String(30))  # 前端選用的 TF.js 後端
+   inference_ms = db.Column(db.Float)            # 該後端單次推論耗時
+   reaped = db.Column(db.Boolean, default=False)  # 閒置過久由伺服器自動結束（前端補送結束時間時重新結算）
    # 移除 best_subject_of_day 欄位，改用動態計算
    emotion_data = db.relationship('EmotionData', backref='study_session', lazy=True, cascade='all, delete-orphan')
 
 class EmotionData(db.Model):
    id = db.Column(db.Integer, primary_key=True)
-   session_id = db.Column(db.Integer, db.ForeignKey('study_session.id'), nullable=False)
+   session_id = db.Column(db.Integer, db.ForeignKey('study_session.id', ondelete='CASCADE'), nullable=False, index=True)
    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
    emotion = db.Column(db.String(20))
    attention_level = db.Column(db.Integer)  # 1-低, 2-中, 3-高
    confidence = db.Column(db.Float)
+   sample_weight = db.Column(db.Float, default=1.0)  # 此筆資料代表的秒數（自適應取樣）
+   seq = db.Column(db.Integer)  # 前端佇列的序號，同一學習階段內唯一（舊資料為 NULL）
+   probabilities = db.Column(db.LargeBinary)  # 模型輸出的七類機率（emotion_smoothing.PROBABILITY_FORMAT）
+   client_ts = db.Column(db.Float)  # 前端記錄的裝置時間原值（epoch 毫秒），重算平滑時與前端使用相同的時間
+   __table_args__ = (db.Index('ux_emotion_data_session_seq', 'session_id', 'seq', unique=True),)
+
+class EmotionWindow(db.Model):
+   """前端依固定時間窗彙整的情緒摘要（EMOTION_WINDOW_SECONDS > 0 時取代逐筆 EmotionData）"""
+   id = db.Column(db.Integer, primary_key=True)
+   session_id = db.Column(db.Integer, db.ForeignKey('study_session.id', ondelete='CASCADE'), nullable=False, index=True)
+   seq = db.Column(db.Integer, nullable=False)  # 與逐筆資料共用前端佇列的序號
+   start_time = db.Column(db.DateTime, nullable=False)
+   duration_seconds = db.Column(db.Float, nullable=False)
+   sample_count = db.Column(db.Integer, nullable=False)  # 時間窗內的有效檢測數
+   weight = db.Column(db.Float, nullable=False)  # 取樣權重總和（秒），平均值以此加權
+   avg_attention = db.Column(db.Float, nullable=False)
+   avg_confidence = db.Column(db.Float, nullable=False)
+   max_confidence = db.Column(db.Float, nullable=False)
+   emotion_counts = db.Column(db.Text)  # JSON：{情緒: 加權次數}
+   __table_args__ = (db.Index('ux_emotion_window_session_seq', 'session_id', 'seq', unique=True),)
+
+class BackgroundJob(db.Model):
+   id = db.Column(db.Integer, primary_key=True)
+   job_type = db.Column(db.String(50), nullable=False)
+   target_id = db.Column(db.Integer, index=True)  # 刪除對象的 user/child id
+   payload = db.Column(db.Text)  # JSON 參數
+   status = db.Column(db.String(20), nullable=False, default='pending', index=True)  # pending/running/done/failed
+   attempts = db.Column(db.Integer, nullable=False, default=0)
+   error = db.Column(db.Text)
+   created_at = db.Column(db.DateTime, default=datetime.utcnow)
+   started_at = db.Column(db.DateTime)
+   finished_at = db.Column(db.DateTime)
+
+@event.listens_for(Engine, 'connect')
+def enable_sqlite_foreign_keys(dbapi_connection, connection_record):
+   """SQLite 預設不檢查外鍵，開啟後 ON DELETE CASCADE 才會生效"""
+   if isinstance(dbapi_connection, sqlite3.Connection):
+       cursor = dbapi_connection.cursor()
+       cursor.execute('PRAGMA foreign_keys=ON')
+       cursor.close()
+
+class PasswordHashBusy(Exception):
+   """密碼雜湊佇列已滿"""
+
+# 密碼雜湊程序池
+password_hash_pool = None
+password_hash_slots = None
+password_hash_lock = threading.Lock()
+
+def hash_password_sync(password, rounds):
+   """計算 bcrypt 雜湊（於工作程序中執行）"""
+   return bcrypt_lib.hashpw(password.encode('utf-8'), bcrypt_lib.gensalt(rounds)).decode('utf-8')
+
+def check_password_sync(password_hash, password):
+   """驗證 bcrypt 雜湊（於工作程序中執行）"""
+   return bcrypt_lib.checkpw(password.encode('utf-8'), password_hash.encode('utf-8'))
+
+def exit_with_parent(parent_pid):
+   """工作程序的初始化：伺服器程序被結束（例如 SIGTERM，不會關閉程序池）後跟著結束，不留下孤兒程序"""
+   def watch():
+       while os.getppid() == parent_pid:
+           time.sleep(1)
+       os._exit(0)
+   threading.Thread(target=watch, name='parent-watch', daemon=True).start()
+
+def get_password_hash_pool():
+   """建立或取得密碼雜湊程序池"""
+   global password_hash_pool, password_hash_slots
+   with password_hash_lock:
+       if password_hash_pool is None:
+           # 以 spawn 建立工作程序：fork 會讓工作程序繼承伺服器的監聽 socket，伺服器結束後仍佔用連接埠
+           password_hash_pool = ProcessPoolExecutor(max_workers=app.config['PASSWORD_HASH_WORKERS'],
+                                                    mp_context=multiprocessing.get_context('spawn'),
+                                                    initializer=exit_with_parent, initargs=(os.getpid(),))
+           password_hash_slots = threading.BoundedSemaphore(app.config['PASSWORD_HASH_QUEUE_LIMIT'])
+       return password_hash_pool, password_hash_slots
+
+def reset_password_hash_pool():
+   """工作程序異常結束時重建程序池"""
+   global password_hash_pool
+   with password_hash_lock:
+       if password_hash_pool is not None:
+           password_hash_pool.shutdown(wait=False)
+       password_hash_pool = None
+
+def run_password_task(func, *args):
+   """在程序池中執行密碼運算，排隊數量超過上限時拋出 PasswordHashBusy"""
+   if app.config['PASSWORD_HASH_WORKERS'] <= 0:
+       return func(*args)
+   pool, slots = get_password_hash_pool()
+   if not slots.acquire(timeout=app.config['PASSWORD_HASH_WAIT_SECONDS']):
+       raise PasswordHashBusy()
+   try:
+       return pool.submit(func, *args).result()
+   except BrokenProcessPool:
+       reset_password_hash_pool()
+       return func(*args)
+   finally:
+       slots.release()
+
+def hash_password(password):
+   """以目前設定的 rounds 產生密碼雜湊"""
+   return run_password_task(hash_password_sync, password, app.config['BCRYPT_LOG_ROUNDS'])
+
+def check_password(password_hash, password):
+   """驗證密碼"""
+   return run_password_task(check_password_sync, password_hash, password)
+
+def password_needs_rehash(password_hash):
+   """雜湊的 rounds 與目前設定不同時需要重新雜湊"""
+   try:
+       return int(password_hash.split('$')[2]) != app.config['BCRYPT_LOG_ROUNDS']
+   except (IndexError, ValueError):
+       return False
+
+def password_busy_response():
+   """密碼雜湊佇列已滿時的回應"""
+   response = jsonify({'success': False, 'message': '系統忙碌中，請稍後再試'})
+   response.status_code = 503
+   response.headers['Retry-After'] = '2'
+   return response
+
+# 批次刪除的每批筆數，每批獨立提交以縮短寫入鎖定時間
+DELETE_CHUNK_SIZE = 5000
 
 # 學科分類配置 - 更新程式設計為電腦科學
 SUBJECTS = {
@@ -125,17 +334,395 @@ GENDERS = {
    'female': '女生'
 }
 
+# 建置後的靜態資源（build_assets.py 產生）：檔名含內容雜湊，可永久快取
+ASSET_BUILD_DIR = os.path.join(app.static_folder, 'build')
+ASSET_MANIFEST_PATH = os.path.join(ASSET_BUILD_DIR, 'manifest.json')
+PRECOMPRESSED_ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+ASSET_CACHE_SECONDS = 365 * 24 * 3600
+HASHED_ASSET_PATTERN = re.compile(r'\.[0-9a-f]{10}\.[A-Za-z0-9]+$')
+asset_manifest_cache = {'mtime': None, 'entries': {}}
+# 較舊的 Python 沒有 .wasm 的 MIME 類型，瀏覽器需要 application/wasm 才能串流編譯
+mimetypes.add_type('application/wasm', '.wasm')
+
+def asset_manifest():
+   """讀取資源清單，檔案更新時重新載入；尚未建置時回傳空清單"""
+   try:
+       mtime = os.path.getmtime(ASSET_MANIFEST_PATH)
+   except OSError:
+       return {}
+   if mtime != asset_manifest_cache['mtime']:
+       with open(ASSET_MANIFEST_PATH, encoding='utf-8') as f:
+           asset_manifest_cache['entries'] = json.load(f)
+       asset_manifest_cache['mtime'] = mtime
+   return asset_manifest_cache['entries']
+
+@app.template_global()
+def asset_url(name):
+   """資源網址：已建置時使用雜湊檔名；尚未建置時第三方檔案使用 CDN，其餘使用 static/ 下的原始檔案"""
+   entry = asset_manifest().get(name)
+   if entry:
+       return url_for('static', filename=entry['path'])
+   if name.startswith(NPM_PREFIX):
+       return cdn_url(name)
+   return url_for('static', filename=name)
+
+@app.template_global()
+def asset_tags(bundle):
+   """頁面資源的 <script> / <link> 標籤：已建置時只引用合併後的檔案，否則逐一引用原始檔案"""
+   if bundle_name(bundle) in asset_manifest():
+       urls = [asset_url(bundle_name(bundle))]
+   else:
+       urls = [asset_url(source) for source in BUNDLES[bundle]]
+   if bundle.endswith('.css'):
+       tags = [f'<link href="{escape(url)}" rel="stylesheet">' for url in urls]
+   else:
+       tags = [f'<script src="{escape(url)}"></script>' for url in urls]
+   return Markup('\n    '.join(tags))
+
+@app.template_global()
+def client_assets():
+   """提供前端的資源清單：{名稱: {url, hash}}"""
+   return {name: {'url': url_for('static', filename=entry['path']), 'hash': entry['hash']}
+           for name, entry in asset_manifest().items()}
+
+@app.template_global()
+def client_vendor_bases():
+   """第三方套件的 CDN 根目錄，前端在尚未建置時使用"""
+   return cdn_package_bases()
+
+@app.route('/static/build/<path:filename>')
+def build_asset(filename):
+   """建置資源：依 Accept-Encoding 送出預先壓縮的版本，含雜湊的檔案可永久快取"""
+   mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+   response = None
+   for encoding, suffix in PRECOMPRESSED_ENCODINGS:
+       compressed = safe_join(ASSET_BUILD_DIR, filename + suffix)
+       if encoding in request.accept_encodings and compressed and os.path.isfile(compressed):
+           response = send_from_directory(ASSET_BUILD_DIR, filename + suffix, mimetype=mimetype)
+           response.headers['Content-Encoding'] = encoding
+           break
+   if response is None:
+       response = send_from_directory(ASSET_BUILD_DIR, filename, mimetype=mimetype)
+   response.vary.add('Accept-Encoding')
+
+   if HASHED_ASSET_PATTERN.search(filename):
+       response.cache_control.no_cache = None
+       response.cache_control.public = True
+       response.cache_control.max_age = ASSET_CACHE_SECONDS
+       response.cache_control.immutable = True
+   return response
+
+# 效能監測：記錄每個路由的執行時間、資料庫查詢、載入資料列與模板渲染時間
+REQUEST_DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+route_metrics = {}
+route_metrics_lock = threading.Lock()
+# 前端回報的 TF.js 後端：{後端: [學習次數, 推論耗時總和(ms)]}
+inference_backend_metrics = {}
+# 前端回報的頁面載入：{頁面: {views, <欄位>_sum, <欄位>_count, transfer_bytes}}
+page_load_metrics = {}
+# 回報中的時間（毫秒）與統計欄位：首次內容繪製、load 事件完成、頁面模組載入
+PAGE_TIMING_FIELDS = (
+   ('first_contentful_paint_ms', 'fcp'),
+   ('page_load_ms', 'load'),
+   ('module_load_ms', 'module')
+)
+
+def new_page_load_metrics():
+   """建立單一頁面的載入統計欄位"""
+   stats = {'views': 0, 'transfer_bytes': 0}
+   for _, field in PAGE_TIMING_FIELDS:
+       stats[f'{field}_sum'] = 0.0
+       stats[f'{field}_count'] = 0
+   return stats
+
+def new_route_metrics():
+   """建立單一路由的統計欄位"""
+   return {
+       'requests': {},
+       'duration_buckets': [0] * len(REQUEST_DURATION_BUCKETS),
+       'duration_sum': 0.0,
+       'duration_count': 0,
+       'db_queries': 0,
+       'db_seconds': 0.0,
+       'db_queries_max': 0,
+       'rows_loaded': 0,
+       'template_seconds': 0.0
+   }
+
+def current_request_metrics():
+   """取得目前請求的監測資料，未開啟監測或不在請求中時回傳 None"""
+   if not has_request_context():
+       return None
+   return g.get('request_metrics')
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def metrics_before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+   """記錄查詢開始時間"""
+   if current_request_metrics() is not None:
+       conn.info.setdefault('query_start_time', []).append(time.perf_counter())
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def metrics_after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+   """累計查詢次數與時間"""
+   metrics = current_request_metrics()
+   if metrics is not None and conn.info.get('query_start_time'):
+       metrics['db_queries'] += 1
+       metrics['db_seconds'] += time.perf_counter() - conn.info['query_start_time'].pop()
+
+@event.listens_for(db.Model, 'load', propagate=True)
+def metrics_on_model_load(target, context):
+   """累計 ORM 載入的資料列數"""
+   metrics = current_request_metrics()
+   if metrics is not None:
+       metrics['rows_loaded'] += 1
+
+def metrics_before_render(sender, template, context, **extra):
+   """記錄模板渲染開始時間"""
+   metrics = current_request_metrics()
+   if metrics is not None:
+       metrics['template_start'] = time.perf_counter()
+
+def metrics_after_render(sender, template, context, **extra):
+   """累計模板渲染時間"""
+   metrics = current_request_metrics()
+   if metrics is not None and 'template_start' in metrics:
+       metrics['template_seconds'] += time.perf_counter() - metrics.pop('template_start')
+
+before_render_template.connect(metrics_before_render, app)
+template_rendered.connect(metrics_after_render, app)
+
+def start_request_profiler():
+   """開始慢請求剖析，同時只允許一個 cProfile 啟用"""
+   if PYINSTRUMENT_AVAILABLE:
+       profiler = PyinstrumentProfiler(async_mode='disabled')
+       profiler.start()
+       return profiler
+   profiler = cProfile.Profile()
+   try:
+       profiler.enable()
+   except ValueError:
+       # 其他執行緒的剖析仍在進行
+       return None
+   return profiler
+
+def stop_request_profiler(profiler, elapsed):
+   """停止剖析，超過門檻時輸出剖析檔"""
+   if PYINSTRUMENT_AVAILABLE:
+       profiler.stop()
+   else:
+       profiler.disable()
+   if elapsed * 1000 < app.config['PROFILE_SLOW_REQUEST_MS']:
+       return
+   os.makedirs(app.config['PROFILE_DIR'], exist_ok=True)
+   endpoint = request.endpoint or 'unknown'
+   basename = f'{endpoint}_{datetime.now().strftime("%Y%m%d_%H%M%S_%f")}_{int(elapsed * 1000)}ms'
+   if PYINSTRUMENT_AVAILABLE:
+       filepath = os.path.join(app.config['PROFILE_DIR'], basename + '.html')
+       with open(filepath, 'w', encoding='utf-8') as f:
+           f.write(profiler.output_html())
+   else:
+       filepath = os.path.join(app.config['PROFILE_DIR'], basename + '.prof')
+       profiler.dump_stats(filepath)
+   app.logger.warning('慢請求 %s %s 耗時 %.0f ms，剖析檔：%s', request.method, request.path, elapsed * 1000, filepath)
+
+@app.before_request
+def metrics_before_request():
+   """開始記錄請求"""
+   if not app.config['ENABLE_METRICS'] and not app.config['PROFILE_SLOW_REQUEST_MS']:
+       return
+   if request.endpoint in ('static', 'build_asset'):
+       return
+   g.request_metrics = {
+       'start': time.perf_counter(),
+       'db_queries': 0,
+       'db_seconds': 0.0,
+       'rows_loaded': 0,
+       'template_seconds': 0.0
+   }
+   if app.config['PROFILE_SLOW_REQUEST_MS']:
+       g.request_profiler = start_request_profiler()
+
+@app.after_request
+def metrics_after_request(response):
+   """彙整請求的監測資料"""
+   metrics = g.pop('request_metrics', None)
+   if metrics is None:
+       return response
+   elapsed = time.perf_counter() - metrics['start']
+
+   profiler = g.pop('request_profiler', None)
+   if profiler is not None:
+       stop_request_profiler(profiler, elapsed)
+
+   if app.config['ENABLE_METRICS']:
+       endpoint = request.endpoint or 'unknown'
+       with route_metrics_lock:
+           stats = route_metrics.setdefault(endpoint, new_route_metrics())
+           key = (request.method, response.status_code)
+           stats['requests'][key] = stats['requests'].get(key, 0) + 1
+           for index, bucket in enumerate(REQUEST_DURATION_BUCKETS):
+               if elapsed <= bucket:
+                   stats['duration_buckets'][index] += 1
+           stats['duration_sum'] += elapsed
+           stats['duration_count'] += 1
+           stats['db_queries'] += metrics['db_queries']
+           stats['db_seconds'] += metrics['db_seconds']
+           stats['db_queries_max'] = max(stats['db_queries_max'], metrics['db_queries'])
+           stats['rows_loaded'] += metrics['rows_loaded']
+           stats['template_seconds'] += metrics['template_seconds']
+   return response
+
+def render_prometheus_metrics():
+   """輸出 Prometheus 文字格式"""
+   lines = []
+   with route_metrics_lock:
+       snapshot = {endpoint: dict(stats, requests=dict(stats['requests']), duration_buckets=list(stats['duration_buckets']))
+                   for endpoint, stats in route_metrics.items()}
+
+   lines.append('# HELP app_requests_total Total HTTP requests by endpoint, method and status.')
+   lines.append('# TYPE app_requests_total counter')
+   for endpoint, stats in sorted(snapshot.items()):
+       for (method, status), count in sorted(stats['requests'].items()):
+           lines.append(f'app_requests_total{{endpoint="{endpoint}",method="{method}",status="{status}"}} {count}')
+
+   lines.append('# HELP app_request_duration_seconds Request wall time by endpoint.')
+   lines.append('# TYPE app_request_duration_seconds histogram')
+   for endpoint, stats in sorted(snapshot.items()):
+       for bucket, count in zip(REQUEST_DURATION_BUCKETS, stats['duration_buckets']):
+           lines.append(f'app_request_duration_seconds_bucket{{endpoint="{endpoint}",le="{bucket}"}} {count}')
+       lines.append(f'app_request_duration_seconds_bucket{{endpoint="{endpoint}",le="+Inf"}} {stats["duration_count"]}')
+       lines.append(f'app_request_duration_seconds_sum{{endpoint="{endpoint}"}} {stats["duration_sum"]:.6f}')
+       lines.append(f'app_request_duration_seconds_count{{endpoint="{endpoint}"}} {stats["duration_count"]}')
+
+   metric_fields = [
+       ('app_db_queries_total', 'counter', 'SQL statements executed while serving the endpoint.', 'db_queries', '{}'),
+       ('app_db_query_seconds_total', 'counter', 'Time spent in SQL statements.', 'db_seconds', '{:.6f}'),
+       ('app_db_queries_per_request_max', 'gauge', 'Largest number of SQL statements seen in one request.', 'db_queries_max', '{}'),
+       ('app_orm_rows_loaded_total', 'counter', 'ORM instances hydrated from query results.', 'rows_loaded', '{}'),
+       ('app_template_render_seconds_total', 'counter', 'Time spent rendering Jinja templates.', 'template_seconds', '{:.6f}')
+   ]
+   for name, metric_type, help_text, field, value_format in metric_fields:
+       lines.append(f'# HELP {name} {help_text}')
+       lines.append(f'# TYPE {name} {metric_type}')
+       for endpoint, stats in sorted(snapshot.items()):
+           lines.append(f'{name}{{endpoint="{endpoint}"}} {value_format.format(stats[field])}')
+
+   with route_metrics_lock:
+       backends = {backend: list(values) for backend, values in inference_backend_metrics.items()}
+   lines.append('# HELP app_client_inference_sessions_total Study sessions started per client TF.js backend.')
+   lines.append('# TYPE app_client_inference_sessions_total counter')
+   for backend, (count, _) in sorted(backends.items()):
+       lines.append(f'app_client_inference_sessions_total{{backend="{backend}"}} {count}')
+   lines.append('# HELP app_client_inference_ms_sum Sum of reported per-inference milliseconds per backend.')
+   lines.append('# TYPE app_client_inference_ms_sum counter')
+   for backend, (_, total_ms) in sorted(backends.items()):
+       lines.append(f'app_client_inference_ms_sum{{backend="{backend}"}} {total_ms:.3f}')
+
+   with route_metrics_lock:
+       pages = {page: dict(stats) for page, stats in page_load_metrics.items()}
+   page_fields = [
+       ('app_page_views_total', 'counter', 'Page views reported by the browser.', 'views', '{}'),
+       ('app_page_first_contentful_paint_seconds_sum', 'counter', 'Sum of first contentful paint times.',
+        'fcp_sum', '{:.3f}'),
+       ('app_page_first_contentful_paint_seconds_count', 'counter', 'Page views with a first contentful paint entry.',
+        'fcp_count', '{}'),
+       ('app_page_load_seconds_sum', 'counter', 'Sum of times until the load event finished.', 'load_sum', '{:.3f}'),
+       ('app_page_load_seconds_count', 'counter', 'Page views with a load event time.', 'load_count', '{}'),
+       ('app_page_module_load_seconds_sum', 'counter', 'Sum of page module import times.', 'module_sum', '{:.3f}'),
+       ('app_page_module_load_seconds_count', 'counter', 'Page views that imported a page module.',
+        'module_count', '{}'),
+       ('app_page_transfer_bytes_sum', 'counter', 'Bytes transferred for the document and its resources.',
+        'transfer_bytes', '{}')
+   ]
+   for name, metric_type, help_text, field, value_format in page_fields:
+       lines.append(f'# HELP {name} {help_text}')
+       lines.append(f'# TYPE {name} {metric_type}')
+       for page, stats in sorted(pages.items()):
+           lines.append(f'{name}{{page="{page}"}} {value_format.format(stats[field])}')
+
+   return '\n'.join(lines) + '\n'
+
+@app.route('/metrics')
+def metrics():
+   """效能監測數據（Prometheus 文字格式）"""
+   if not app.config['ENABLE_METRICS']:
+       return Response('metrics disabled\n', status=404, mimetype='text/plain')
+   return Response(render_prometheus_metrics(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/page_metrics', methods=['POST'])
+def record_page_metrics():
+   """接收前端回報的頁面載入時間與傳輸量（navigator.sendBeacon）"""
+   if not app.config['ENABLE_METRICS']:
+       return Response(status=404)
+   data = request.get_json(force=True, silent=True) or {}
+   page = data.get('page')
+   if page not in app.view_functions:
+       return Response(status=204)
+
+   transfer_bytes = data.get('transfer_bytes')
+   with route_metrics_lock:
+       stats = page_load_metrics.setdefault(page, new_page_load_metrics())
+       stats['views'] += 1
+       for key, field in PAGE_TIMING_FIELDS:
+           value = data.get(key)
+           if isinstance(value, (int, float)) and 0 <= value < 600000:
+               stats[f'{field}_sum'] += value / 1000
+               stats[f'{field}_count'] += 1
+       if isinstance(transfer_bytes, int) and transfer_bytes >= 0:
+           stats['transfer_bytes'] += transfer_bytes
+   return Response(status=204)
+
+@app.route('/benchmark/emotion')
+def emotion_benchmark():
+   """情緒分類效能測試頁（每畫面耗時與張量數），與 /metrics 一同開關"""
+   if not app.config['ENABLE_METRICS']:
+       return Response('benchmark disabled\n', status=404, mimetype='text/plain')
+   return render_template('emotion_benchmark.html')
+
+def add_missing_columns(model, names, existing_columns):
+    """以 ALTER TABLE 補上舊資料庫缺少的欄位，型別與預設值由模型定義編譯為目前資料庫的語法"""
+    dialect = db.engine.dialect
+    for name in names:
+        if name in existing_columns:
+            continue
+        column = model.__table__.c[name]
+        ddl = f'ALTER TABLE {model.__tablename__} ADD COLUMN {name} {column.type.compile(dialect=dialect)}'
+        if column.default is not None and column.default.is_scalar:
+            ddl += f' DEFAULT {column.default.arg!r}'
+        db.session.execute(text(ddl))
+
 def upgrade_database():
-    """升級資料庫結構"""
+    """升級資料庫結構（以 SQLAlchemy 的 inspector 檢查，不限定資料庫種類）"""
     try:
         # 檢查是否需要升級
         with app.app_context():
-            # 嘗試查詢現有表結構
-            result = db.engine.execute("PRAGMA table_info(study_session)")
-            columns = [row[1] for row in result]
+            # 查詢現有表結構
+            inspector = db.inspect(db.engine)
+            columns = {column['name'] for column in inspector.get_columns('study_session')}
+            emotion_columns = {column['name'] for column in inspector.get_columns('emotion_data')}
             
             # 如果沒有 best_subject_of_day 欄位，則不需要做任何事情
             # 因為我們已經從模型中移除了這個欄位
+            
+            # 自適應取樣的權重、離線佇列的序號、模型輸出的機率與裝置時間
+            add_missing_columns(EmotionData, ('sample_weight', 'seq', 'probabilities', 'client_ts'), emotion_columns)
+            
+            # 前端推論後端回報欄位
+            add_missing_columns(StudySession, ('inference_backend', 'inference_ms'), columns)
+            
+            # 閒置自動結束的標記
+            add_missing_columns(StudySession, ('reaped',), columns)
+            
+            # 舊資料庫缺少外鍵索引與序號的唯一索引（去除重送的資料），補上以加速查詢與批次刪除
+            connection = db.session.connection()
+            for model in (Child, StudySession, EmotionData):
+                for index in model.__table__.indexes:
+                    index.create(connection, checkfirst=True)
+            
+            # 清除舊版重置學習歷程時遺留的孤立情緒資料
+            db.session.execute(delete(EmotionData).where(EmotionData.session_id.not_in(select(StudySession.id)))
+                               .execution_options(synchronize_session=False))
+            db.session.commit()
             print("資料庫結構檢查完成")
             
     except Exception as e:
@@ -163,7 +750,10 @@ def register():
            return jsonify({'success': False, 'message': '電子郵件已註冊'})
        
        # 建立新使用者
-       password_hash = bcrypt.generate_password_hash(password).decode('utf-8')
+       try:
+           password_hash = hash_password(password)
+       except PasswordHashBusy:
+           return password_busy_response()
        user = User(username=username, email=email, password_hash=password_hash)
        db.session.add(user)
        db.session.commit()
@@ -182,7 +772,16 @@ def login():
        
        user = User.query.filter_by(username=username).first()
        
-       if user and bcrypt.check_password_hash(user.password_hash, password):
+       try:
+           valid = user and not is_user_pending_deletion(user.id) and check_password(user.password_hash, password)
+           # rounds 設定變更後，於登入成功時以新設定重新雜湊
+           if valid and password_needs_rehash(user.password_hash):
+               user.password_hash = hash_password(password)
+               db.session.commit()
+       except PasswordHashBusy:
+           return password_busy_response()
+       
+       if valid:
            session['user_id'] = user.id
            session['username'] = user.username
            return jsonify({'success': True, 'message': '登入成功'})
@@ -198,7 +797,7 @@ def child_selection():
        return redirect(url_for('login'))
    
    user_id = session['user_id']
-   children = Child.query.filter_by(user_id=user_id).all()
+   children = visible_children(user_id).all()
    
    return render_template('child_selection.html', children=children)
 
@@ -223,7 +822,7 @@ def create_child():
        return jsonify({'success': False, 'message': '請輸入有效的年齡'})
    
    # 檢查是否已達到4個小孩的限制
-   existing_children = Child.query.filter_by(user_id=session['user_id']).count()
+   existing_children = visible_children(session['user_id']).count()
    if existing_children >= 4:
        return jsonify({'success': False, 'message': '最多只能創建4個小孩檔案'})
    
@@ -246,7 +845,7 @@ def select_child(child_id):
    if 'user_id' not in session:
        return redirect(url_for('login'))
    
-   child = Child.query.filter_by(id=child_id, user_id=session['user_id']).first()
+   child = visible_children(session['user_id']).filter(Child.id == child_id).first()
    if not child:
        return redirect(url_for('child_selection'))
    
@@ -262,7 +861,7 @@ def dashboard():
        return redirect(url_for('child_selection'))
    
    child_id = session['child_id']
-   child = Child.query.filter_by(id=child_id, user_id=session['user_id']).first()
+   child = visible_children(session['user_id']).filter(Child.id == child_id).first()
    
    if not child:
        return redirect(url_for('child_selection'))
@@ -291,7 +890,46 @@ def dashboard():
    return render_template('dashboard.html', 
                         subjects=SUBJECTS, 
                         stats=subject_stats,
-                        child=child)
+                        child=child,
+                        live_sessions=live_session_summaries(session['user_id']))
+
+def live_session_summaries(user_id):
+   """帳號底下目前學習中的學習階段（由登錄表取得），依開始時間排序
+
+   程序記憶體中的登錄表不會得知其他程序結束的學習，以主鍵確認資料庫中仍未結束，已結束的項目移出登錄表
+   """
+   live_sessions = sorted(live_registry.list(user_id), key=lambda live: live.started_at)
+   if not live_sessions:
+       return []
+   nicknames = dict(db.session.execute(
+       select(StudySession.id, Child.nickname).join(Child, Child.id == StudySession.child_id)
+       .where(StudySession.id.in_([live.id for live in live_sessions]), StudySession.end_time.is_(None))
+   ).all())
+   for live in live_sessions:
+       if live.id not in nicknames:
+           live_registry.close(live.id)
+   live_sessions = [live for live in live_sessions if live.id in nicknames]
+   now = time.time()
+   return [{
+       'session_id': live.id,
+       'child_id': live.child_id,
+       'child_nickname': nicknames[live.id],
+       'subject': live.subject,
+       'subject_name': SUBJECTS.get(live.subject, live.subject),
+       'start_time': live.start_time.isoformat(),
+       'elapsed_minutes': int((now - live.started_at) / 60),
+       'idle_seconds': int(max(0, now - live.last_seen)),
+       'sample_count': live.sample_count,
+       'avg_attention': live.average_attention,
+       'last_emotion': live.last_emotion
+   } for live in live_sessions]
+
+@app.route('/live_sessions')
+def live_sessions():
+   """目前學習中的學習階段"""
+   if 'user_id' not in session:
+       return jsonify({'success': False, 'message': '請先登入'}), 401
+   return jsonify({'success': True, 'sessions': live_session_summaries(session['user_id'])})
 
 @app.route('/study/<subject>')
 def study_session(subject):
@@ -302,7 +940,7 @@ def study_session(subject):
    if subject not in SUBJECTS:
        return redirect(url_for('dashboard'))
    
-   child = Child.query.filter_by(id=session['child_id'], user_id=session['user_id']).first()
+   child = visible_children(session['user_id']).filter(Child.id == session['child_id']).first()
    
    if not child:
        return redirect(url_for('child_selection'))
@@ -317,88 +955,679 @@ def start_session():
    """開始學習階段"""
    if 'user_id' not in session or 'child_id' not in session:
        return jsonify({'success': False, 'message': '請先登入並選擇小孩'})
+   wait = rate_limit_wait((f"start:{session['user_id']}", app.config['START_SESSION_RATE'],
+                           app.config['START_SESSION_BURST']))
+   if wait:
+       return too_many_requests_response(wait)
    
    data = request.get_json()
    subject = data.get('subject')
    duration = data.get('duration', 30)
+   inference_backend, inference_ms = parse_inference_backend(data)
    
    # 建立新的學習階段記錄
    new_study_session = StudySession(
        child_id=session['child_id'],
        subject=subject,
        duration_minutes=duration,
-       start_time=datetime.utcnow()
+       start_time=datetime.utcnow(),
+       inference_backend=inference_backend,
+       inference_ms=inference_ms
    )
-   db.session.add(new_study_session)
-   db.session.commit()
+   try:
+       with ingest_write_slot():
+           db.session.add(new_study_session)
+           db.session.commit()
+   except IngestOverloaded:
+       return overloaded_response()
+   invalidate_analytics(new_study_session.child_id)
+   record_inference_backend(inference_backend, inference_ms)
    
    session['current_session_id'] = new_study_session.id
    session['session_start_time'] = datetime.utcnow().isoformat()
+   register_live_session(new_study_session, session['user_id'], seed=False)
    
-   return jsonify({'success': True, 'session_id': new_study_session.id})
+   return jsonify({'success': True, 'session_id': new_study_session.id,
+                   'min_sample_interval_ms': current_min_sample_interval_ms(),
+                   'emotion_window_seconds': app.config['EMOTION_WINDOW_SECONDS']})
+
+def parse_inference_backend(data):
+   """驗證前端回報的 TF.js 後端名稱與推論耗時"""
+   backend = data.get('inference_backend')
+   if not isinstance(backend, str) or not re.fullmatch(r'[a-z0-9-]{1,30}', backend):
+       return None, None
+   try:
+       inference_ms = float(data.get('inference_ms'))
+   except (TypeError, ValueError):
+       return backend, None
+   if inference_ms != inference_ms or inference_ms < 0:
+       return backend, None
+   return backend, inference_ms
+
+def record_inference_backend(backend, inference_ms):
+   """累計各後端的學習次數與推論耗時，供 /metrics 查看"""
+   if backend is None or inference_ms is None:
+       return
+   with route_metrics_lock:
+       stats = inference_backend_metrics.setdefault(backend, [0, 0.0])
+       stats[0] += 1
+       stats[1] += inference_ms
+
+class IngestOverloaded(Exception):
+   """寫入名額已滿"""
+
+# 上傳的准入控制（每個程序各自計算）
+ingest_write_slots = None
+ingest_overload = {'level': 0, 'changed': 0.0}
+ingest_admission_lock = threading.Lock()
+
+def get_ingest_write_slots():
+   """建立或取得寫入名額"""
+   global ingest_write_slots
+   with ingest_admission_lock:
+       if ingest_write_slots is None:
+           ingest_write_slots = threading.BoundedSemaphore(app.config['INGEST_MAX_WRITERS'])
+       return ingest_write_slots
+
+def ingest_overload_level():
+   """目前的過載等級：每次等待寫入名額逾時升一級，之後每隔 INGEST_OVERLOAD_DECAY_SECONDS 降一級"""
+   decay_seconds = app.config['INGEST_OVERLOAD_DECAY_SECONDS']
+   with ingest_admission_lock:
+       if ingest_overload['level'] and decay_seconds > 0:
+           steps = int((time.monotonic() - ingest_overload['changed']) / decay_seconds)
+           if steps:
+               ingest_overload['level'] = max(0, ingest_overload['level'] - steps)
+               ingest_overload['changed'] += steps * decay_seconds
+       return ingest_overload['level']
+
+@contextmanager
+def ingest_write_slot():
+   """取得寫入名額，資料庫寫入排隊過長時不再等待：逾時則提高過載等級並拋出 IngestOverloaded"""
+   if app.config['INGEST_MAX_WRITERS'] <= 0:
+       yield
+       return
+   slots = get_ingest_write_slots()
+   if not slots.acquire(timeout=app.config['INGEST_WRITE_WAIT_SECONDS']):
+       with ingest_admission_lock:
+           ingest_overload['level'] = min(ingest_overload['level'] + 1, app.config['INGEST_OVERLOAD_MAX_LEVEL'])
+           ingest_overload['changed'] = time.monotonic()
+       raise IngestOverloaded()
+   try:
+       yield
+   finally:
+       slots.release()
+
+def current_min_sample_interval_ms():
+   """目前允許的最短取樣間隔（毫秒），前端以此為取樣頻率上限；過載時逐級加倍，進行中的學習降頻而不是逾時"""
+   return app.config['MIN_SAMPLE_INTERVAL_MS'] * 2 ** ingest_overload_level()
+
+def rate_limit_wait(*limits):
+   """依序取用權杖桶（鍵, 每秒速率, 突發量），回傳需要等待的秒數，0 表示允許"""
+   for key, rate, burst in limits:
+       wait = rate_limiter.take(key, rate, burst)
+       if wait:
+           return wait
+   return 0
+
+def ingest_user_limit():
+   """上傳端點每個帳號一個權杖桶，在確認學習階段的歸屬之前取用"""
+   return f"user:{session['user_id']}", app.config['INGEST_USER_RATE'], app.config['INGEST_USER_BURST']
+
+def ingest_session_limit(study_session):
+   """每個學習階段一個權杖桶；只對 ingest_study_session 確認歸屬後的階段取用，其他帳號無法以他人的 session_id 耗用"""
+   return f'session:{study_session.id}', app.config['INGEST_SESSION_RATE'], app.config['INGEST_SESSION_BURST']
+
+def too_many_requests_response(retry_after_seconds):
+   """限流或過載時的回應，附上 Retry-After 與建議的取樣間隔，學習頁面據此降頻並延後重送"""
+   retry_after = max(1, math.ceil(retry_after_seconds))
+   response = jsonify({'success': False, 'message': f'系統忙碌中，請於 {retry_after} 秒後再試',
+                       'retry_after_ms': retry_after * 1000,
+                       'min_sample_interval_ms': current_min_sample_interval_ms()})
+   response.status_code = 429
+   response.headers['Retry-After'] = str(retry_after)
+   return response
+
+def overloaded_response():
+   """寫入名額已滿時的回應，等待時間隨過載等級加倍"""
+   return too_many_requests_response(2 ** ingest_overload_level())
+
+def parse_sample_weight(value):
+   """驗證取樣權重，缺少或無效時視為 1 秒"""
+   try:
+       weight = float(value)
+   except (TypeError, ValueError):
+       return 1.0
+   if weight != weight or weight <= 0:
+       return 1.0
+   return min(weight, app.config['MAX_SAMPLE_WEIGHT'])
+
+def session_weighted_sums(session_id):
+   """單次學習的加權累計值（合併逐筆資料與時間窗摘要），回傳 (專注度總和, 信心度總和, 權重總和, 資料筆數)"""
+   weight = db.func.coalesce(EmotionData.sample_weight, 1.0)
+   sample_sums = db.session.query(
+       db.func.sum(EmotionData.attention_level * weight),
+       db.func.sum(EmotionData.confidence * weight),
+       db.func.sum(weight),
+       db.func.count(EmotionData.id)
+   ).filter(EmotionData.session_id == session_id, EmotionData.attention_level.isnot(None)).one()
+   window_sums = db.session.query(
+       db.func.sum(EmotionWindow.avg_attention * EmotionWindow.weight),
+       db.func.sum(EmotionWindow.avg_confidence * EmotionWindow.weight),
+       db.func.sum(EmotionWindow.weight),
+       db.func.sum(EmotionWindow.sample_count)
+   ).filter(EmotionWindow.session_id == session_id).one()
+   return tuple((sample or 0) + (window or 0) for sample, window in zip(sample_sums, window_sums))
+
+def session_weighted_averages(session_id):
+   """以取樣權重計算單次學習的平均專注度與情緒分數（合併逐筆資料與時間窗摘要）"""
+   attention_sum, confidence_sum, weight_sum, _ = session_weighted_sums(session_id)
+   if not weight_sum:
+       return None, None
+   return attention_sum / weight_sum, confidence_sum / weight_sum
+
+# 二進位批次的信心度量化為 1/255，重算結果在此差距內視為與前端相同
+RESMOOTH_CONFIDENCE_TOLERANCE = 1 / 255
+
+def resmooth_session_samples(session_id):
+   """依序號重播附有機率的逐筆資料，只更新平滑結果與已儲存的值不同的資料列；於結束學習時執行一次
+
+   前端顯示與上傳的值已經過相同的平滑（emotion_smoothing），並以相同的裝置時間（client_ts）重播，
+   一般情況下不需更新；這裡修正亂序產生或舊版前端的資料。沒有裝置時間的舊資料改用伺服器時間
+   """
+   rows = db.session.execute(
+       select(EmotionData.id, EmotionData.client_ts, EmotionData.timestamp, EmotionData.probabilities,
+              EmotionData.emotion, EmotionData.confidence, EmotionData.attention_level)
+       .where(EmotionData.session_id == session_id, EmotionData.probabilities.isnot(None))
+       .order_by(EmotionData.seq)
+   ).all()
+   smoother = EmotionSmoother()
+   updates = []
+   for row_id, client_ts, timestamp, probabilities, emotion, confidence, attention_level in rows:
+       timestamp_ms = client_ts if client_ts is not None else to_epoch(timestamp) * 1000
+       state = smoother.update(unpack_probabilities(probabilities), timestamp_ms)
+       if state['emotion'] != emotion or state['attention'] != attention_level or confidence is None \
+               or abs(state['confidence'] - confidence) > RESMOOTH_CONFIDENCE_TOLERANCE:
+           updates.append({'id': row_id, 'emotion': state['emotion'], 'confidence': state['confidence'],
+                           'attention_level': state['attention']})
+   if updates:
+       db.session.execute(update(EmotionData), updates)
 
 @app.route('/record_emotion', methods=['POST'])
 def record_emotion():
    """記錄情緒檢測數據"""
-   if 'current_session_id' not in session:
+   data = request.get_json(silent=True) or {}
+   if 'user_id' not in session:
        return jsonify({'success': False, 'message': '沒有活躍的學習階段'})
-   
-   data = request.get_json()
-   emotion = data.get('emotion')
-   attention_level = data.get('attention_level')
-   confidence = data.get('confidence')
+   # 多個分頁同時學習時由前端指定學習階段，否則使用登入狀態中的目前階段
+   session_id = data.get('session_id', session.get('current_session_id'))
+   wait = rate_limit_wait(ingest_user_limit())
+   if wait:
+       return too_many_requests_response(wait)
+   study_session = ingest_study_session(session_id)
+   if study_session is None:
+       return jsonify({'success': False, 'message': '沒有活躍的學習階段'})
+   wait = rate_limit_wait(ingest_session_limit(study_session))
+   if wait:
+       return too_many_requests_response(wait)
+   
+   # 附有序號時可安全重送：同一序號只會寫入一次
+   if data.get('seq') is not None:
+       seq, row = parse_batch_sample(data, study_session)
+       if row is None:
+           return jsonify({'success': False, 'message': '資料格式錯誤'}), 400
+       try:
+           with ingest_write_slot():
+               inserted = insert_new_rows(EmotionData, {seq: row})
+               record_ingestion(study_session, [row], [], inserted)
+       except IngestOverloaded:
+           return overloaded_response()
+       return jsonify({'success': True, 'duplicate': not inserted,
+                       'min_sample_interval_ms': current_min_sample_interval_ms()})
    
    # 儲存情緒數據
-   emotion_data = EmotionData(
-       session_id=session['current_session_id'],
-       emotion=emotion,
-       attention_level=attention_level,
-       confidence=confidence,
-       timestamp=datetime.utcnow()
+   row = {
+       'session_id': study_session.id,
+       'emotion': data.get('emotion'),
+       'attention_level': data.get('attention_level'),
+       'confidence': data.get('confidence'),
+       'sample_weight': parse_sample_weight(data.get('sample_weight')),
+       'timestamp': parse_client_time(data.get('client_ts'), study_session)
+   }
+   try:
+       with ingest_write_slot():
+           db.session.add(EmotionData(**row))
+           db.session.commit()
+           valid = row['attention_level'] in (1, 2, 3) and isinstance(row['confidence'], (int, float))
+           record_ingestion(study_session, [row] if valid else [], [], 1)
+   except IngestOverloaded:
+       return overloaded_response()
+   
+   return jsonify({'success': True, 'min_sample_interval_ms': current_min_sample_interval_ms()})
+
+def register_live_session(study_session, user_id, seed=True):
+   """將進行中的學習階段加入登錄表；seed 時由資料庫重新計算累計值（程序重新啟動或其他程序建立的學習階段）"""
+   attention_sum, confidence_sum, weight_sum, sample_count = \
+       session_weighted_sums(study_session.id) if seed else (0, 0, 0, 0)
+   live = LiveSession(
+       id=study_session.id,
+       user_id=user_id,
+       child_id=study_session.child_id,
+       subject=study_session.subject,
+       started_at=to_epoch(study_session.start_time),
+       last_seen=time.time(),
+       sample_count=sample_count,
+       weight_sum=weight_sum,
+       attention_sum=attention_sum,
+       confidence_sum=confidence_sum
+   )
+   live_registry.open(live)
+   return live
+
+def ingest_study_session(session_id):
+   """上傳資料的目標學習階段：進行中的階段由登錄表驗證歸屬，不必查詢資料庫
+
+   不在登錄表中時查詢資料庫；仍在進行中的階段重新登錄，已結束的階段回傳 StudySession 供離線資料補傳
+   """
+   if not isinstance(session_id, int) or isinstance(session_id, bool):
+       return None
+   live = live_registry.get(session_id)
+   if live is not None:
+       return live if live.user_id == session['user_id'] else None
+   study_session = owned_study_session(session_id)
+   if study_session is not None and study_session.end_time is None:
+       return register_live_session(study_session, session['user_id'])
+   return study_session
+
+def record_ingestion(target, sample_rows, window_rows, inserted):
+   """寫入上傳資料後更新累計值
+
+   進行中的階段更新登錄表的累計值與最後活動時間；同一批有部分資料先前已寫入時無法得知哪些是新的，
+   改由資料庫重新計算。已結束的階段收到補傳的資料時重新計算學習記錄的平均值
+   """
+   if not isinstance(target, LiveSession):
+       if inserted:
+           update_session_averages(target)
+           db.session.commit()
+           invalidate_analytics(target.child_id)
+       return
+   if inserted and inserted < len(sample_rows) + len(window_rows):
+       register_live_session(target, target.user_id)
+       return
+   if not inserted:
+       sample_rows = window_rows = []
+   last_sample = max(sample_rows, key=lambda row: row.get('seq') or 0) if sample_rows else {}
+   live_registry.record(
+       target.id,
+       len(sample_rows) + sum(row['sample_count'] for row in window_rows),
+       sum(row['sample_weight'] for row in sample_rows) + sum(row['weight'] for row in window_rows),
+       sum((row['attention_level'] or 0) * row['sample_weight'] for row in sample_rows)
+       + sum(row['avg_attention'] * row['weight'] for row in window_rows),
+       sum((row['confidence'] or 0) * row['sample_weight'] for row in sample_rows)
+       + sum(row['avg_confidence'] * row['weight'] for row in window_rows),
+       last_sample.get('emotion'),
+       last_sample.get('attention_level'),
+       time.time()
    )
-   db.session.add(emotion_data)
+
+def owned_study_session(session_id):
+   """目前帳號底下的學習階段；離線補傳時由前端帶入 session_id，不能只依賴登入狀態中的目前階段"""
+   if not isinstance(session_id, int) or isinstance(session_id, bool):
+       return None
+   return StudySession.query.join(Child).filter(
+       StudySession.id == session_id,
+       Child.user_id == session['user_id']
+   ).first()
+
+def client_clock_offset():
+   """裝置時鐘與伺服器的差距：前端送出請求時以 X-Client-Time 標頭帶入裝置時間（epoch 毫秒）
+
+   資料在佇列中停留多久都不影響差距的計算；缺少、無效或差距在容許範圍內時為 0，同一請求只計算一次
+   """
+   if 'client_clock_offset' not in g:
+       offset = timedelta(0)
+       try:
+           sent_at = datetime.utcfromtimestamp(float(request.headers.get('X-Client-Time')) / 1000)
+       except (TypeError, ValueError, OverflowError, OSError):
+           sent_at = None
+       if sent_at is not None:
+           skew = datetime.utcnow() - sent_at
+           if abs(skew) > timedelta(milliseconds=app.config['CLOCK_SKEW_TOLERANCE_MS']):
+               offset = skew
+       g.client_clock_offset = offset
+   return g.client_clock_offset
+
+def parse_client_time(value, study_session):
+   """前端記錄的時間（epoch 毫秒），校正裝置時鐘的誤差後限制在學習開始到現在之間；缺少或無效時使用伺服器時間"""
+   now = datetime.utcnow()
+   try:
+       client_time = datetime.utcfromtimestamp(float(value) / 1000) + client_clock_offset()
+   except (TypeError, ValueError, OverflowError, OSError):
+       return now
+   return min(max(client_time, study_session.start_time), now)
+
+def parse_device_time(value):
+   """前端記錄的裝置時間原值（epoch 毫秒，不校正、不限制範圍），無效時回傳 None"""
+   if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+       return None
+   return float(value)
+
+def parse_batch_sample(item, study_session):
+   """驗證批次中的單筆資料，回傳 (序號, 資料列)；序號無效時回傳 (None, None)，其餘欄位無效時資料列為 None"""
+   if not isinstance(item, dict):
+       return None, None
+   seq = item.get('seq')
+   if not isinstance(seq, int) or isinstance(seq, bool) or seq < 0:
+       return None, None
+   emotion = item.get('emotion')
+   attention_level = item.get('attention_level')
+   confidence = item.get('confidence')
+   if not isinstance(emotion, str) or attention_level not in (1, 2, 3) or not isinstance(confidence, (int, float)):
+       return seq, None
+   return seq, {
+       'session_id': study_session.id,
+       'seq': seq,
+       'emotion': emotion[:20],
+       'attention_level': attention_level,
+       'confidence': float(confidence),
+       'sample_weight': parse_sample_weight(item.get('sample_weight')),
+       'probabilities': pack_probabilities(item.get('probabilities')),
+       'client_ts': parse_device_time(item.get('client_ts')),
+       'timestamp': parse_client_time(item.get('client_ts'), study_session)
+   }
+
+def parse_batch_window(item, study_session):
+   """驗證批次中的時間窗摘要，回傳值與 parse_batch_sample 相同"""
+   if not isinstance(item, dict):
+       return None, None
+   seq = item.get('seq')
+   if not isinstance(seq, int) or isinstance(seq, bool) or seq < 0:
+       return None, None
+   try:
+       sample_count = int(item['sample_count'])
+       weight = float(item['weight'])
+       avg_attention = float(item['avg_attention'])
+       avg_confidence = float(item['avg_confidence'])
+       max_confidence = float(item['max_confidence'])
+       duration_seconds = float(item.get('duration_ms') or 0) / 1000
+   except (KeyError, TypeError, ValueError):
+       return seq, None
+   if sample_count <= 0 or not 0 < weight <= sample_count * app.config['MAX_SAMPLE_WEIGHT'] \
+           or not 1 <= avg_attention <= 3 or not 0 <= avg_confidence <= max_confidence <= 1:
+       return seq, None
+   counts = item.get('emotion_counts')
+   if not isinstance(counts, dict):
+       counts = {}
+   counts = {str(emotion)[:20]: float(count) for emotion, count in counts.items()
+             if isinstance(count, (int, float)) and not isinstance(count, bool) and count > 0}
+   return seq, {
+       'session_id': study_session.id,
+       'seq': seq,
+       'start_time': parse_client_time(item.get('start_ts'), study_session),
+       'duration_seconds': max(duration_seconds, 0.0),
+       'sample_count': sample_count,
+       'weight': weight,
+       'avg_attention': avg_attention,
+       'avg_confidence': avg_confidence,
+       'max_confidence': max_confidence,
+       'emotion_counts': json.dumps(counts)
+   }
+
+def parse_binary_sample(sample, study_session):
+   """二進位批次（sample_codec）解出的單筆資料，回傳值與 parse_batch_sample 相同；機率已是保存用的 bytes"""
+   seq = sample['seq']
+   if sample['emotion'] is None or sample['attention_level'] not in (1, 2, 3):
+       return seq, None
+   return seq, {
+       'session_id': study_session.id,
+       'seq': seq,
+       'emotion': sample['emotion'],
+       'attention_level': sample['attention_level'],
+       'confidence': sample['confidence'],
+       'sample_weight': parse_sample_weight(sample['sample_weight']),
+       'probabilities': sample['probabilities'],
+       'client_ts': sample['client_ts'],
+       'timestamp': parse_client_time(sample['client_ts'], study_session)
+   }
+
+def insert_new_rows(model, rows):
+   """依序號寫入同一學習階段的資料列並回傳實際寫入的筆數，(session_id, seq) 已存在的資料略過
+
+   SQLite 與 PostgreSQL 由唯一索引略過（INSERT ... ON CONFLICT DO NOTHING），重送或同一批同時送達兩次都不需要先查詢；
+   其他資料庫改由 insert_missing_rows 先查詢已存在的序號
+   """
+   ordered = [rows[seq] for seq in sorted(rows)]
+   dialect = db.session.get_bind().dialect.name
+   # 以 Core 執行（ORM 的批次 insert 不回傳 rowcount）
+   if dialect == 'sqlite':
+       statement = sqlite_insert(model.__table__).on_conflict_do_nothing(index_elements=['session_id', 'seq'])
+       inserted = db.session.connection().execute(statement, ordered).rowcount
+   elif dialect == 'postgresql':
+       # 批次執行時 rowcount 不一定可靠，改計算 RETURNING 回傳的列數
+       statement = postgresql_insert(model.__table__).on_conflict_do_nothing(index_elements=['session_id', 'seq']) \
+           .returning(model.__table__.c.seq)
+       inserted = len(db.session.connection().execute(statement, ordered).all())
+   else:
+       inserted = insert_missing_rows(model, ordered)
    db.session.commit()
-   
-   return jsonify({'success': True})
+   return inserted
+
+def insert_missing_rows(model, rows, attempts=3):
+   """不支援 ON CONFLICT 的資料庫：只寫入序號尚未存在的資料列；同時寫入而違反唯一索引時重新查詢後重試"""
+   for attempt in range(attempts):
+       existing = set(db.session.execute(
+           select(model.seq).where(model.session_id == rows[0]['session_id'],
+                                   model.seq.in_([row['seq'] for row in rows]))
+       ).scalars())
+       new_rows = [row for row in rows if row['seq'] not in existing]
+       try:
+           if new_rows:
+               db.session.connection().execute(insert(model.__table__), new_rows)
+           return len(new_rows)
+       except IntegrityError:
+           db.session.rollback()
+           if attempt == attempts - 1:
+               raise
+
+@app.route('/record_emotion_batch', methods=['POST'])
+def record_emotion_batch():
+   """離線佇列的批次上傳（逐筆資料 samples 與時間窗摘要 windows）：以 (session_id, seq) 去除重複，重送同一批資料不會重複寫入
+
+   回傳已確認的序號（含先前已寫入與格式錯誤而捨棄的資料），前端只刪除已確認的部分，其餘下次重送
+   Content-Type 為 sample_codec.CONTENT_TYPE 時請求內容為二進位格式（只含逐筆資料），其餘以 JSON 解析
+   """
+   if 'user_id' not in session:
+       return jsonify({'success': False, 'message': '請先登入'}), 401
+   if request.mimetype == SAMPLE_BATCH_CONTENT_TYPE:
+       try:
+           session_id, samples = decode_sample_batch(request.get_data())
+       except ValueError:
+           return jsonify({'success': False, 'message': '批次資料格式錯誤'}), 400
+       windows = []
+       parse_sample = parse_binary_sample
+   else:
+       data = request.get_json(silent=True) or {}
+       session_id = data.get('session_id')
+       samples = data.get('samples', [])
+       windows = data.get('windows', [])
+       parse_sample = parse_batch_sample
+   wait = rate_limit_wait(ingest_user_limit())
+   if wait:
+       return too_many_requests_response(wait)
+   study_session = ingest_study_session(session_id)
+   if study_session is None:
+       return jsonify({'success': False, 'message': '找不到學習階段'}), 404
+   wait = rate_limit_wait(ingest_session_limit(study_session))
+   if wait:
+       return too_many_requests_response(wait)
+   if not isinstance(samples, list) or not isinstance(windows, list) \
+           or len(samples) + len(windows) > app.config['MAX_INGEST_BATCH']:
+       return jsonify({'success': False, 'message': '批次資料格式錯誤'}), 400
+
+   acked = set()
+   inserted = 0
+   new_rows = {}
+   for model, items, parse in ((EmotionData, samples, parse_sample), (EmotionWindow, windows, parse_batch_window)):
+       rows = new_rows[model] = {}
+       for item in items:
+           seq, row = parse(item, study_session)
+           if seq is None:
+               continue
+           acked.add(seq)
+           if row is not None:
+               rows.setdefault(seq, row)
+   try:
+       with ingest_write_slot():
+           for model, rows in new_rows.items():
+               if rows:
+                   inserted += insert_new_rows(model, rows)
+           record_ingestion(study_session, list(new_rows[EmotionData].values()),
+                            list(new_rows[EmotionWindow].values()), inserted)
+   except IngestOverloaded:
+       return overloaded_response()
+
+   return jsonify({'success': True, 'acked': sorted(acked), 'inserted': inserted,
+                   'min_sample_interval_ms': current_min_sample_interval_ms()})
 
 @app.route('/end_session', methods=['POST'])
 def end_session():
-   """結束學習階段"""
-   if 'current_session_id' not in session:
+   """結束學習階段；離線佇列可能重送，已結束的階段直接回傳成功"""
+   data = request.get_json(silent=True) or {}
+   if 'user_id' in session:
+       wait = rate_limit_wait(ingest_user_limit())
+       if wait:
+           return too_many_requests_response(wait)
+   if data.get('session_id') is not None and 'user_id' in session:
+       current_study_session = owned_study_session(data.get('session_id'))
+   elif 'current_session_id' in session:
+       current_study_session = db.session.get(StudySession, session['current_session_id'])
+   else:
        return jsonify({'success': False, 'message': '沒有活躍的學習階段'})
    
-   session_id = session['current_session_id']
-   current_study_session = StudySession.query.get(session_id)
-   
    if current_study_session:
-       current_study_session.end_time = datetime.utcnow()
-       
-       # 計算實際學習時間（分鐘整數）
-       if 'session_start_time' in session:
-           start_time = datetime.fromisoformat(session['session_start_time'])
-           actual_duration = (datetime.utcnow() - start_time).total_seconds() / 60
-           current_study_session.duration_minutes = int(actual_duration)
-       
-       # 計算平均專注度和情緒分數
-       emotion_records = EmotionData.query.filter_by(session_id=session_id).all()
-       
-       if emotion_records:
-           avg_attention = sum(record.attention_level for record in emotion_records) / len(emotion_records)
-           avg_emotion = sum(record.confidence for record in emotion_records) / len(emotion_records)
-           
-           current_study_session.avg_attention = avg_attention
-           current_study_session.avg_emotion_score = avg_emotion
-       
-       db.session.commit()
+       session_id = current_study_session.id
+       if session.get('current_session_id') == session_id:
+           # 清除當前階段
+           session.pop('current_session_id', None)
+           session.pop('session_start_time', None)
+       # 離線時以前端按下結束的時間為準
+       end_time = parse_client_time(data.get('ended_at'), current_study_session)
+       if current_study_session.end_time is not None:
+           # 離線超過閒置時間而被自動結束的階段，前端補送的結束時間較晚時以其為準重新結算
+           late_end = current_study_session.reaped and parse_device_time(data.get('ended_at')) is not None \
+               and end_time > current_study_session.end_time
+           if not late_end:
+               live_registry.close(session_id)
+               return jsonify({'success': True, 'session_id': session_id})
        
-       # 清除當前階段
-       session.pop('current_session_id', None)
-       session.pop('session_start_time', None)
+       try:
+           with ingest_write_slot():
+               finalize_study_session(current_study_session, end_time)
+               db.session.commit()
+       except IngestOverloaded:
+           return overloaded_response()
+       invalidate_analytics(current_study_session.child_id)
        
        return jsonify({'success': True, 'session_id': session_id})
    
    return jsonify({'success': False, 'message': '找不到學習階段'})
 
+def update_session_averages(study_session):
+   """計算平均專注度和情緒分數（依取樣權重加權，降頻期間的資料不會被低估）"""
+   avg_attention, avg_emotion = session_weighted_averages(study_session.id)
+   if avg_attention is not None:
+       study_session.avg_attention = avg_attention
+       study_session.avg_emotion_score = avg_emotion
+
+def finalize_study_session(study_session, end_time):
+   """記錄結束時間與實際學習時間（分鐘整數），以前端的平滑演算法重算一次逐筆資料後更新平均值，
+   同時移出登錄表並清除閒置自動結束的標記；由呼叫端提交（結束後補傳的資料只重新計算平均值）"""
+   study_session.end_time = end_time
+   study_session.reaped = False
+   actual_duration = (end_time - study_session.start_time).total_seconds() / 60
+   study_session.duration_minutes = int(actual_duration)
+   resmooth_session_samples(study_session.id)
+   update_session_averages(study_session)
+   live_registry.close(study_session.id)
+
+def session_last_activity():
+   """各學習階段最後一筆資料的時間（相關子查詢，可用於以 StudySession 為主的查詢與 UPDATE），沒有資料時為開始時間"""
+   last_sample = select(db.func.max(EmotionData.timestamp)) \
+       .where(EmotionData.session_id == StudySession.id).scalar_subquery()
+   last_window = select(db.func.max(EmotionWindow.start_time)) \
+       .where(EmotionWindow.session_id == StudySession.id).scalar_subquery()
+   last_sample = db.func.coalesce(last_sample, StudySession.start_time, type_=db.DateTime)
+   last_window = db.func.coalesce(last_window, StudySession.start_time, type_=db.DateTime)
+   # 以 CASE 取兩者較大值（各資料庫的逐列最大值函式不同：SQLite 為 max()，其他為 GREATEST()）
+   return db.case((last_sample >= last_window, last_sample), else_=last_window)
+
+def session_weighted_sum_subqueries():
+   """與 session_weighted_sums 相同的加權累計值，以相關子查詢表示，回傳 (專注度總和, 信心度總和, 權重總和)"""
+   weight = db.func.coalesce(EmotionData.sample_weight, 1.0)
+
+   def sample_sum(value):
+       return select(db.func.coalesce(db.func.sum(value), 0)).where(
+           EmotionData.session_id == StudySession.id, EmotionData.attention_level.isnot(None)).scalar_subquery()
+
+   def window_sum(value):
+       return select(db.func.coalesce(db.func.sum(value), 0)).where(
+           EmotionWindow.session_id == StudySession.id).scalar_subquery()
+
+   return (
+       sample_sum(EmotionData.attention_level * weight) + window_sum(EmotionWindow.avg_attention * EmotionWindow.weight),
+       sample_sum(EmotionData.confidence * weight) + window_sum(EmotionWindow.avg_confidence * EmotionWindow.weight),
+       sample_sum(weight) + window_sum(EmotionWindow.weight)
+   )
+
+def reap_abandoned_sessions(idle_minutes=None):
+   """以集合式 SQL 結束超過閒置時間沒有資料、也未呼叫結束學習的學習階段（例如直接關閉分頁），回傳結束的數量
+
+   結束時間為最後一筆資料的時間，加權平均值由已記錄的資料計算；不重算平滑（逐筆資料已是前端平滑後的值）。
+   學習時間由查詢到的結束時間在 Python 中計算，以 CASE 帶入同一個 UPDATE，不依賴特定資料庫的日期函式
+   """
+   if idle_minutes is None:
+       idle_minutes = app.config['SESSION_IDLE_MINUTES']
+   if idle_minutes <= 0:
+       return 0
+   cutoff = datetime.utcnow() - timedelta(minutes=idle_minutes)
+   last_activity = session_last_activity()
+   idle_sessions = db.session.execute(
+       select(StudySession.id, StudySession.child_id, StudySession.start_time, last_activity.label('last_activity'))
+       .where(StudySession.end_time.is_(None), last_activity < cutoff)
+   ).all()
+   session_ids = [row.id for row in idle_sessions]
+
+   reaped = 0
+   if session_ids:
+       attention_sum, confidence_sum, weight_sum = session_weighted_sum_subqueries()
+       weight_sum = db.func.nullif(weight_sum, 0)
+       end_times = {row.id: row.last_activity for row in idle_sessions}
+       durations = {row.id: int((row.last_activity - row.start_time).total_seconds() / 60) for row in idle_sessions}
+       result = db.session.execute(
+           update(StudySession)
+           .where(StudySession.id.in_(session_ids), StudySession.end_time.is_(None))
+           .values(
+               end_time=db.case(end_times, value=StudySession.id),
+               duration_minutes=db.case(durations, value=StudySession.id),
+               reaped=True,
+               avg_attention=db.func.coalesce(attention_sum / weight_sum, StudySession.avg_attention),
+               avg_emotion_score=db.func.coalesce(confidence_sum / weight_sum, StudySession.avg_emotion_score)
+           )
+           .execution_options(synchronize_session=False)
+       )
+       db.session.commit()
+       reaped = result.rowcount
+       invalidate_analytics(*(row.child_id for row in idle_sessions))
+
+   # 移出登錄表：本次結束的，以及已由其他程序結束或刪除的
+   idle_ids = {live.id for live in live_registry.idle(time.time() - idle_minutes * 60)}
+   if idle_ids:
+       idle_ids -= set(db.session.execute(
+           select(StudySession.id).where(StudySession.id.in_(idle_ids), StudySession.end_time.is_(None))
+       ).scalars())
+   for session_id in idle_ids.union(session_ids):
+       live_registry.close(session_id)
+   return reaped
+
 def get_best_subject_for_date(child_id, date):
    """獲取指定日期的最佳科目"""
    # 獲取該日期的所有學習記錄
@@ -415,6 +1644,262 @@ def get_best_subject_for_date(child_id, date):
    best_session = max(sessions, key=lambda x: x.avg_attention)
    return best_session.subject
 
+def delete_in_chunks(model, id_query, pause=0):
+   """依主鍵子查詢分批刪除，記憶體用量固定且每批都會提交
+
+   pause > 0 時每批之間暫停，讓即時寫入（record_emotion）優先取得寫入鎖
+   """
+   total = 0
+   while True:
+       chunk_ids = id_query.limit(DELETE_CHUNK_SIZE).scalar_subquery()
+       result = db.session.execute(
+           delete(model).where(model.id.in_(chunk_ids)).execution_options(synchronize_session=False))
+       db.session.commit()
+       total += result.rowcount
+       if result.rowcount < DELETE_CHUNK_SIZE:
+           return total
+       if pause:
+           time.sleep(pause)
+
+def delete_study_sessions(session_condition, pause=0):
+   """以集合式 SQL 刪除符合條件的學習記錄及其情緒資料"""
+   session_ids = select(StudySession.id).where(session_condition)
+   for session_id in db.session.execute(session_ids.where(StudySession.end_time.is_(None))).scalars():
+       live_registry.close(session_id)
+   child_ids = db.session.execute(select(StudySession.child_id).where(session_condition).distinct()).scalars().all()
+   delete_in_chunks(EmotionData, select(EmotionData.id).where(EmotionData.session_id.in_(session_ids)), pause)
+   delete_in_chunks(EmotionWindow, select(EmotionWindow.id).where(EmotionWindow.session_id.in_(session_ids)), pause)
+   deleted = delete_in_chunks(StudySession, select(StudySession.id).where(session_condition), pause)
+   invalidate_analytics(*child_ids)
+   return deleted
+
+def delete_child_data(child_id, pause=0):
+   """刪除小孩檔案及其所有學習記錄"""
+   delete_study_sessions(StudySession.child_id == child_id, pause)
+   db.session.execute(delete(Child).where(Child.id == child_id).execution_options(synchronize_session=False))
+   db.session.commit()
+
+def delete_user_data(user_id, pause=0):
+   """刪除帳號及其所有小孩與學習記錄"""
+   child_ids = select(Child.id).where(Child.user_id == user_id)
+   delete_study_sessions(StudySession.child_id.in_(child_ids), pause)
+   db.session.execute(delete(Child).where(Child.user_id == user_id).execution_options(synchronize_session=False))
+   db.session.execute(delete(User).where(User.id == user_id).execution_options(synchronize_session=False))
+   db.session.commit()
+
+# 背景工作
+ACTIVE_JOB_STATUSES = ('pending', 'running')
+# 刪除工作失敗後資料可能只刪了一部分，對象仍視為等待刪除（隱藏且不可登入），並定期重新排入
+DELETION_JOB_TYPES = ('delete_user', 'delete_child')
+DELETION_JOB_STATUSES = ACTIVE_JOB_STATUSES + ('failed',)
+job_worker_thread = None
+job_worker_lock = threading.Lock()
+last_idle_sweep = float('-inf')
+
+def enqueue_job(job_type, target_id=None, **payload):
+   """新增背景工作，同一對象已有未完成的同類工作時直接沿用"""
+   if target_id is not None:
+       existing = BackgroundJob.query.filter(
+           BackgroundJob.job_type == job_type,
+           BackgroundJob.target_id == target_id,
+           BackgroundJob.status.in_(ACTIVE_JOB_STATUSES)
+       ).first()
+       if existing:
+           return existing
+   job = BackgroundJob(job_type=job_type, target_id=target_id, payload=json.dumps(payload))
+   db.session.add(job)
+   db.session.commit()
+   ensure_job_worker()
+   return job
+
+def pending_job_targets(job_type):
+   """尚未完成的工作對象 id 子查詢（用於隱藏等待刪除的資料）"""
+   return select(BackgroundJob.target_id).where(
+       BackgroundJob.job_type == job_type,
+       BackgroundJob.status.in_(DELETION_JOB_STATUSES)
+   )
+
+def visible_children(user_id):
+   """帳號底下未排入刪除的小孩"""
+   return Child.query.filter(Child.user_id == user_id, Child.id.notin_(pending_job_targets('delete_child')))
+
+def is_user_pending_deletion(user_id):
+   """帳號是否已排入刪除"""
+   return db.session.execute(
+       select(BackgroundJob.id).where(BackgroundJob.target_id == user_id,
+                                      BackgroundJob.job_type == 'delete_user',
+                                      BackgroundJob.status.in_(DELETION_JOB_STATUSES)).limit(1)
+   ).first() is not None
+
+def job_delete_user(job, payload):
+   """刪除帳號（分批並讓出寫入鎖）"""
+   delete_user_data(job.target_id, app.config['JOB_CHUNK_PAUSE_SECONDS'])
+
+def job_delete_child(job, payload):
+   """刪除小孩檔案（分批並讓出寫入鎖）"""
+   delete_child_data(job.target_id, app.config['JOB_CHUNK_PAUSE_SECONDS'])
+
+def job_prune_emotion_data(job, payload):
+   """刪除超過保留天數的逐筆情緒資料與時間窗摘要（學習記錄的平均值仍保留）"""
+   retention_days = payload.get('retention_days') or app.config['EMOTION_RETENTION_DAYS']
+   if retention_days <= 0:
+       return
+   cutoff = datetime.utcnow() - timedelta(days=retention_days)
+   delete_in_chunks(EmotionData, select(EmotionData.id).where(EmotionData.timestamp < cutoff),
+                    app.config['JOB_CHUNK_PAUSE_SECONDS'])
+   delete_in_chunks(EmotionWindow, select(EmotionWindow.id).where(EmotionWindow.start_time < cutoff),
+                    app.config['JOB_CHUNK_PAUSE_SECONDS'])
+
+def job_optimize_database(job, payload):
+   """更新查詢統計資訊，必要時重整資料庫檔案"""
+   with db.engine.connect() as connection:
+       connection = connection.execution_options(isolation_level='AUTOCOMMIT')
+       connection.execute(text('ANALYZE'))
+       if payload.get('vacuum'):
+           connection.execute(text('VACUUM'))
+
+def job_cleanup_reports(job, payload):
+   """刪除過期的 PDF 報告與圖表檔（存在 Redis 時由 TTL 自動刪除）"""
+   cutoff = time.time() - payload.get('retention_hours', app.config['REPORT_RETENTION_HOURS']) * 3600
+   report_store.cleanup(cutoff)
+
+JOB_HANDLERS = {
+   'delete_user': job_delete_user,
+   'delete_child': job_delete_child,
+   'prune_emotion_data': job_prune_emotion_data,
+   'optimize_database': job_optimize_database,
+   'cleanup_reports': job_cleanup_reports
+}
+
+# 定期維護工作（類型、參數、間隔設定）
+PERIODIC_JOBS = [
+   ('prune_emotion_data', {}, 'MAINTENANCE_INTERVAL_HOURS'),
+   ('optimize_database', {}, 'MAINTENANCE_INTERVAL_HOURS'),
+   ('optimize_database', {'vacuum': True}, 'VACUUM_INTERVAL_HOURS'),
+   ('cleanup_reports', {}, 'MAINTENANCE_INTERVAL_HOURS')
+]
+
+def claim_next_job():
+   """以條件式 UPDATE 領取下一個待處理工作，多個執行緒或程序同時執行也不會重複領取"""
+   while True:
+       job_id = db.session.execute(
+           select(BackgroundJob.id).where(BackgroundJob.status == 'pending').order_by(BackgroundJob.id).limit(1)
+       ).scalar()
+       if job_id is None:
+           return None
+       result = db.session.execute(
+           update(BackgroundJob)
+           .where(BackgroundJob.id == job_id, BackgroundJob.status == 'pending')
+           .values(status='running', started_at=datetime.utcnow(), attempts=BackgroundJob.attempts + 1)
+       )
+       db.session.commit()
+       if result.rowcount == 1:
+           return db.session.get(BackgroundJob, job_id)
+
+def run_job(job):
+   """執行單一工作並記錄結果，失敗時在重試次數內重新排入"""
+   handler = JOB_HANDLERS.get(job.job_type)
+   try:
+       if handler is None:
+           raise ValueError(f'未知的工作類型: {job.job_type}')
+       handler(job, json.loads(job.payload or '{}'))
+       job.status = 'done'
+       job.error = None
+   except Exception as e:
+       db.session.rollback()
+       job.error = str(e)
+       job.status = 'pending' if job.attempts < app.config['JOB_MAX_ATTEMPTS'] else 'failed'
+       app.logger.exception('背景工作 %s (%s) 執行失敗', job.id, job.job_type)
+   job.finished_at = datetime.utcnow()
+   db.session.commit()
+
+def run_pending_jobs():
+   """執行所有待處理工作，回傳執行數量"""
+   count = 0
+   while True:
+       job = claim_next_job()
+       if job is None:
+           return count
+       run_job(job)
+       count += 1
+
+def enqueue_periodic_jobs():
+   """依各自的間隔排入定期工作（同類型不同參數分開計算，例如 ANALYZE 與較少執行的 VACUUM）"""
+   now = datetime.utcnow()
+   for job_type, payload, interval_key in PERIODIC_JOBS:
+       if app.config[interval_key] <= 0:
+           continue
+       recent = BackgroundJob.query.filter(BackgroundJob.job_type == job_type,
+                                           BackgroundJob.payload == json.dumps(payload),
+                                           BackgroundJob.created_at >= now - timedelta(hours=app.config[interval_key])).first()
+       if not recent:
+           db.session.add(BackgroundJob(job_type=job_type, payload=json.dumps(payload)))
+   db.session.commit()
+
+def requeue_failed_deletions():
+   """超過重試次數的刪除工作於維護間隔後重新排入，直到資料刪除完成"""
+   cutoff = datetime.utcnow() - timedelta(hours=app.config['MAINTENANCE_INTERVAL_HOURS'])
+   db.session.execute(update(BackgroundJob)
+                      .where(BackgroundJob.job_type.in_(DELETION_JOB_TYPES),
+                             BackgroundJob.status == 'failed', BackgroundJob.finished_at < cutoff)
+                      .values(status='pending', attempts=0))
+   db.session.commit()
+
+def requeue_stale_jobs(max_age_hours=1):
+   """程序中斷時遺留的執行中工作重新排入"""
+   cutoff = datetime.utcnow() - timedelta(hours=max_age_hours)
+   db.session.execute(update(BackgroundJob)
+                      .where(BackgroundJob.status == 'running', BackgroundJob.started_at < cutoff)
+                      .values(status='pending'))
+   db.session.commit()
+
+def job_worker_loop(stop_event=None):
+   """背景工作主迴圈"""
+   with app.app_context():
+       requeue_stale_jobs()
+       while stop_event is None or not stop_event.is_set():
+           try:
+               enqueue_periodic_jobs()
+               requeue_failed_deletions()
+               run_pending_jobs()
+               sweep_idle_sessions()
+           except Exception as e:
+               db.session.rollback()
+               print(f"背景工作執行緒發生錯誤: {e}")
+           finally:
+               db.session.remove()
+           time.sleep(app.config['JOB_POLL_SECONDS'])
+
+def sweep_idle_sessions():
+   """依間隔自動結束閒置的學習階段；判斷依據為資料庫中的資料，多個程序同時執行也只會結束一次"""
+   global last_idle_sweep
+   if time.monotonic() - last_idle_sweep < app.config['IDLE_SWEEP_SECONDS']:
+       return
+   last_idle_sweep = time.monotonic()
+   reaped = reap_abandoned_sessions()
+   if reaped:
+       app.logger.info('自動結束 %s 個閒置的學習階段', reaped)
+
+def ensure_job_worker():
+   """啟動背景工作執行緒（每個程序一個）"""
+   global job_worker_thread
+   if not app.config['JOB_WORKER_ENABLED'] or (job_worker_thread is not None and job_worker_thread.is_alive()):
+       return
+   with job_worker_lock:
+       if job_worker_thread is None or not job_worker_thread.is_alive():
+           job_worker_thread = threading.Thread(target=job_worker_loop, name='job-worker', daemon=True)
+           job_worker_thread.start()
+
+@app.before_request
+def start_job_worker():
+   """gunicorn 等 WSGI 伺服器不會執行 __main__，於各程序處理第一個請求時啟動背景工作執行緒（含自動結束閒置的學習階段）"""
+   ensure_job_worker()
+
+@app.cli.command('run-jobs')
+def run_jobs_command():
+   """以獨立程序執行背景工作"""
+   job_worker_loop()
+
 @app.route('/delete_session/<int:session_id>', methods=['POST'])
 def delete_session(session_id):
    """刪除單次學習記錄"""
@@ -428,8 +1913,7 @@ def delete_session(session_id):
    ).first()
    
    if study_session:
-       db.session.delete(study_session)
-       db.session.commit()
+       delete_study_sessions(StudySession.id == study_session.id)
        return jsonify({'success': True})
    
    return jsonify({'success': False, 'message': '找不到該學習記錄'})
@@ -502,26 +1986,71 @@ def get_calendar_data():
    
    return jsonify({'success': True, 'data': calendar_data})
 
+def analytics_cache_key(child_id, name):
+   """分析快取的鍵，含小孩的資料版本號；版本遞增後舊的內容不再被讀取，到期後自動清除"""
+   version = analytics_cache.get(f'analytics_version:{child_id}') or 0
+   return f'analytics:{child_id}:{version}:{name}'
+
+def cached_analytics(child_id, name, compute):
+   """小孩的分析結果（須可轉為 JSON），存在共用快取中，各主機共用同一份計算結果"""
+   ttl = app.config['ANALYTICS_CACHE_SECONDS']
+   if ttl <= 0:
+       return compute()
+   key = analytics_cache_key(child_id, name)
+   value = analytics_cache.get(key)
+   if value is None:
+       value = compute()
+       analytics_cache.set(key, value, ttl)
+   return value
+
+def study_session_summary(study_session):
+   """數據分析頁面列出的學習記錄欄位，轉為可存入快取的 JSON"""
+   return {
+       'id': study_session.id,
+       'subject': study_session.subject,
+       'start_time': study_session.start_time.isoformat(),
+       'end_time': study_session.end_time.isoformat() if study_session.end_time else None,
+       'duration_minutes': study_session.duration_minutes,
+       'avg_attention': study_session.avg_attention
+   }
+
+def load_study_session_summary(row):
+   """快取中的學習記錄還原時間欄位，模板以與 StudySession 相同的方式使用"""
+   return dict(row,
+               start_time=datetime.fromisoformat(row['start_time']),
+               end_time=datetime.fromisoformat(row['end_time']) if row['end_time'] else None)
+
+def invalidate_analytics(*child_ids):
+   """學習記錄或小孩資料提交後呼叫，遞增版本號使各主機的分析快取同時失效"""
+   for child_id in set(child_ids):
+       analytics_cache.incr(f'analytics_version:{child_id}')
+
 @app.route('/data_analysis')
 def data_analysis():
    """數據分析頁面"""
    if 'user_id' not in session or 'child_id' not in session:
        return redirect(url_for('child_selection'))
    
-   child = Child.query.filter_by(id=session['child_id'], user_id=session['user_id']).first()
+   child = visible_children(session['user_id']).filter(Child.id == session['child_id']).first()
    
    if not child:
        return redirect(url_for('child_selection'))
    
-   study_sessions = StudySession.query.filter_by(child_id=child.id).order_by(StudySession.start_time.desc()).all()
+   def compute_analysis():
+       study_sessions = StudySession.query.filter_by(child_id=child.id).order_by(StudySession.start_time.desc()).all()
+       # 學習記錄列表與圖表數據
+       return {
+           'study_sessions': [study_session_summary(study_session) for study_session in study_sessions],
+           'chart_data': prepare_chart_data(study_sessions)
+       }
    
-   # 準備圖表數據
-   chart_data = prepare_chart_data(study_sessions)
+   # 快取命中時不必讀取學習記錄
+   analysis = cached_analytics(child.id, 'analysis', compute_analysis)
    
    return render_template('data_analysis.html', 
                         child=child, 
-                        study_sessions=study_sessions,
-                        chart_data=chart_data)
+                        study_sessions=[load_study_session_summary(row) for row in analysis['study_sessions']],
+                        chart_data=analysis['chart_data'])
 
 @app.route('/smart_suggestions')
 def smart_suggestions():
@@ -529,23 +2058,26 @@ def smart_suggestions():
    if 'user_id' not in session or 'child_id' not in session:
        return redirect(url_for('child_selection'))
    
-   child = Child.query.filter_by(id=session['child_id'], user_id=session['user_id']).first()
+   child = visible_children(session['user_id']).filter(Child.id == session['child_id']).first()
    
    if not child:
        return redirect(url_for('child_selection'))
    
-   study_sessions = StudySession.query.filter_by(child_id=child.id).order_by(StudySession.start_time.asc()).all()
-   
-   # 生成個人化建議
-   suggestions = generate_comprehensive_suggestions(child, study_sessions)
+   def compute_suggestions():
+       study_sessions = StudySession.query.filter_by(child_id=child.id).order_by(StudySession.start_time.asc()).all()
+       # 生成個人化建議與視覺化數據
+       return {
+           'suggestions': generate_comprehensive_suggestions(child, study_sessions),
+           'performance_data': prepare_performance_data(study_sessions)
+       }
    
-   # 準備視覺化數據
-   performance_data = prepare_performance_data(study_sessions)
+   # 快取命中時不必讀取學習記錄
+   analytics = cached_analytics(child.id, 'suggestions', compute_suggestions)
    
    return render_template('smart_suggestions.html',
                         child=child,
-                        suggestions=suggestions,
-                        performance_data=performance_data)
+                        suggestions=analytics['suggestions'],
+                        performance_data=analytics['performance_data'])
 
 @app.route('/generate_report/<int:child_id>')
 def generate_report(child_id):
@@ -553,17 +2085,39 @@ def generate_report(child_id):
    if 'user_id' not in session:
        return redirect(url_for('login'))
    
-   child = Child.query.filter_by(id=child_id, user_id=session['user_id']).first()
+   child = visible_children(session['user_id']).filter(Child.id == child_id).first()
    if not child:
        return redirect(url_for('dashboard'))
    
    # 獲取所有學習記錄
    study_sessions = StudySession.query.filter_by(child_id=child.id).all()
    
-   # 生成PDF報告
-   pdf_path = create_comprehensive_report(child, study_sessions)
+   # 生成PDF報告，存入共用的報告儲存區後轉到下載網址，負載平衡將下載請求送到任何一台主機都能取得
+   pdf_data = create_comprehensive_report(child, study_sessions)
+   name = f'report_{child.id}_{datetime.now().strftime("%Y%m%d_%H%M%S")}_{secrets.token_hex(4)}.pdf'
+   report_store.save(name, pdf_data, app.config['REPORT_RETENTION_HOURS'] * 3600)
    
-   return send_file(pdf_path, as_attachment=True, 
+   return redirect(url_for('download_report', name=name))
+
+# 報告檔名：report_{小孩}_{日期}_{時間}_{隨機碼}.pdf
+REPORT_NAME_PATTERN = re.compile(r'report_(\d+)_\d{8}_\d{6}_[0-9a-f]{8}\.pdf')
+
+@app.route('/reports/<name>')
+def download_report(name):
+   """下載已產生的PDF報告；報告已過期時重新產生"""
+   if 'user_id' not in session:
+       return redirect(url_for('login'))
+   
+   match = REPORT_NAME_PATTERN.fullmatch(name)
+   child = match and visible_children(session['user_id']).filter(Child.id == int(match.group(1))).first()
+   if not child:
+       return redirect(url_for('dashboard'))
+   
+   pdf_data = report_store.load(name)
+   if pdf_data is None:
+       return redirect(url_for('generate_report', child_id=child.id))
+   
+   return send_file(BytesIO(pdf_data), mimetype='application/pdf', as_attachment=True,
                    download_name=f'學習報告_{child.nickname}_{datetime.now().strftime("%Y%m%d")}.pdf')
 
 @app.route('/delete_child/<int:child_id>', methods=['POST'])
@@ -574,15 +2128,15 @@ def delete_child(child_id):
    
    child = Child.query.filter_by(id=child_id, user_id=session['user_id']).first()
    if child:
-       db.session.delete(child)
-       db.session.commit()
+       # 大量資料改由背景工作分批刪除，排入後即不再顯示
+       job = enqueue_job('delete_child', target_id=child.id)
        
        # 如果刪除的是當前選中的小孩，清除session
        if session.get('child_id') == child_id:
            session.pop('child_id', None)
            session.pop('child_nickname', None)
        
-       return jsonify({'success': True})
+       return jsonify({'success': True, 'job_id': job.id})
    
    return jsonify({'success': False, 'message': '找不到該小孩檔案'})
 
@@ -592,11 +2146,10 @@ def reset_learning_history(child_id):
    if 'user_id' not in session:
        return jsonify({'success': False, 'message': '請先登入'})
    
-   child = Child.query.filter_by(id=child_id, user_id=session['user_id']).first()
+   child = visible_children(session['user_id']).filter(Child.id == child_id).first()
    if child:
-       # 刪除所有學習記錄
-       StudySession.query.filter_by(child_id=child_id).delete()
-       db.session.commit()
+       # 刪除所有學習記錄（含情緒資料，避免遺留孤立資料）
+       delete_study_sessions(StudySession.child_id == child_id)
        
        return jsonify({'success': True})
    
@@ -610,11 +2163,11 @@ def delete_account():
    
    user = User.query.get(session['user_id'])
    if user:
-       db.session.delete(user)
-       db.session.commit()
+       # 大量資料改由背景工作分批刪除，排入後即無法登入
+       job = enqueue_job('delete_user', target_id=user.id)
        session.clear()
        
-       return jsonify({'success': True})
+       return jsonify({'success': True, 'job_id': job.id})
    
    return jsonify({'success': False, 'message': '找不到該帳號'})
 
@@ -649,7 +2202,11 @@ def update_user_profile():
        user.email = new_email
        
        if new_password:
-           user.password_hash = bcrypt.generate_password_hash(new_password).decode('utf-8')
+           try:
+               user.password_hash = hash_password(new_password)
+           except PasswordHashBusy:
+               db.session.rollback()
+               return password_busy_response()
        
        db.session.commit()
        session['username'] = new_username
@@ -666,7 +2223,7 @@ def update_child_profile():
    
    data = request.get_json()
    child_id = data.get('child_id')
-   child = Child.query.filter_by(id=child_id, user_id=session['user_id']).first()
+   child = visible_children(session['user_id']).filter(Child.id == child_id).first()
    
    if child:
        age = data.get('age')
@@ -685,6 +2242,7 @@ def update_child_profile():
        child.education_stage = data.get('education_stage')
        
        db.session.commit()
+       invalidate_analytics(child.id)
        
        # 如果更新的是當前選中的小孩，更新session
        if session.get('child_id') == child_id:
@@ -883,14 +2441,9 @@ def generate_comprehensive_suggestions(child, study_sessions):
    return suggestions
 
 def create_comprehensive_report(child, study_sessions):
-   """創建包含數據分析和智慧建議的完整PDF報告"""
-   filename = f'report_{child.id}_{datetime.now().strftime("%Y%m%d_%H%M%S")}.pdf'
-   filepath = os.path.join('reports', filename)
-   
-   # 確保reports目錄存在
-   os.makedirs('reports', exist_ok=True)
-   
-   doc = SimpleDocTemplate(filepath, pagesize=A4)
+   """創建包含數據分析和智慧建議的完整PDF報告，回傳 PDF 內容（由呼叫端存入報告儲存區）"""
+   buffer = BytesIO()
+   doc = SimpleDocTemplate(buffer, pagesize=A4)
    story = []
    
    # 設定樣式
@@ -1115,7 +2668,7 @@ def create_comprehensive_report(child, study_sessions):
    
    # 生成報告
    doc.build(story)
-   return filepath
+   return buffer.getvalue()
 
 @app.route('/logout')
 def logout():
@@ -1128,4 +2681,5 @@ if __name__ == '__main__':
        db.create_all()
        # 執行資料庫升級檢查
        upgrade_database()
+   ensure_job_worker()
    app.run(debug=False, host='0.0.0.0', port=int(os.environ.get('PORT', 5000)))
\ No newline at end of file
@@ -0,0 +1,82 @@
+"""前端資源定義
+
+列出自行提供的第三方套件（固定版本）與各頁面的資源組合，供 build_assets.py 建置，
+也供 app.py 在尚未建置時改用 CDN 與 static/ 下的原始檔案。
+
+資源名稱：
+    npm:<套件>/<路徑>   第三方套件中的檔案，例如 npm:chart.js/dist/chart.umd.js
+    其餘                 static/ 下的檔案，例如 script.js
+"""
+import posixpath
+
+NPM_PREFIX = 'npm:'
+CDN_BASE = 'https://cdn.jsdelivr.net/npm/'
+
+# 套件: (版本, 要自行提供的檔案)
+VENDOR_PACKAGES = {
+    'bootstrap': ('5.3.0', ['dist/css/bootstrap.min.css', 'dist/js/bootstrap.bundle.min.js']),
+    '@fortawesome/fontawesome-free': ('6.4.0', ['css/all.min.css', 'webfonts/*']),
+    'chart.js': ('4.4.0', ['dist/chart.umd.js']),
+    '@tensorflow/tfjs': ('4.10.0', ['dist/tf.min.js']),
+    '@tensorflow/tfjs-backend-wasm': ('4.10.0', ['dist/tf-backend-wasm.min.js', 'dist/*.wasm']),
+    '@mediapipe/face_detection': ('0.4.1646425229', ['*.js', '*.wasm', '*.data', '*.binarypb', '*.tflite'])
+}
+
+# 各頁面的資源組合，建置後合併為 static/build/bundles/<名稱>（檔名含雜湊）
+BUNDLES = {
+    'common.css': [
+        'npm:bootstrap/dist/css/bootstrap.min.css',
+        'npm:@fortawesome/fontawesome-free/css/all.min.css',
+        'style.css'
+    ],
+    'common.js': [
+        'npm:bootstrap/dist/js/bootstrap.bundle.min.js',
+        'script.js'
+    ],
+    'study.js': [
+        'npm:chart.js/dist/chart.umd.js',
+        'face_tracker.js',
+        'emotion_classifier.js',
+        'emotion_smoothing.js',
+        'sample_codec.js',
+        'sample_queue.js',
+        'session_stats.js'
+    ],
+    'analysis.js': [
+        'npm:chart.js/dist/chart.umd.js'
+    ],
+    'detection_worker.js': [
+        'face_tracker.js',
+        'emotion_classifier.js',
+        'detection_worker.js'
+    ]
+}
+
+# 各頁面的 ES 模組（static/pages/），由 script.js 以 import() 在需要的頁面載入，建置後檔名含雜湊
+PAGE_MODULES = [
+    'pages/auth.js',
+    'pages/study.js',
+    'pages/analysis.js'
+]
+
+
+def split_npm_name(name):
+    """npm:<套件>/<路徑> 拆成 (套件, 路徑)，套件可含 @scope"""
+    parts = name[len(NPM_PREFIX):].split('/')
+    size = 2 if parts[0].startswith('@') else 1
+    return '/'.join(parts[:size]), '/'.join(parts[size:])
+
+
+def cdn_url(name):
+    """第三方檔案在 CDN 上的固定版本網址"""
+    package, path = split_npm_name(name)
+    return f'{CDN_BASE}{package}@{VENDOR_PACKAGES[package][0]}/{path}'
+
+
+def cdn_package_bases():
+    """各套件在 CDN 上的根目錄，供前端在尚未建置時組出網址"""
+    return {package: f'{CDN_BASE}{package}@{version}/' for package, (version, _) in VENDOR_PACKAGES.items()}
+
+
+def bundle_name(bundle):
+    return posixpath.join('bundles', bundle)
@@ -0,0 +1,382 @@
+"""靜態資源建置工具
+
+將前端資源輸出到 static/build/，檔名加上內容雜湊，並寫出 static/build/manifest.json
+供 Flask 的 asset_url() / asset_tags() 與前端查詢。雜湊檔名的內容不會改變，伺服器以 immutable
+快取標頭提供，並依瀏覽器的 Accept-Encoding 直接送出預先壓縮的 .br / .gz 版本。
+
+    vendor    下載 asset_bundles.VENDOR_PACKAGES 中固定版本的第三方套件（Bootstrap、Font Awesome、
+              Chart.js、TF.js、MediaPipe Face Detection），取代執行時的 CDN
+    models    情緒分類模型（static/models/emotion_model.json 與權重檔，由 convert_model.py --ship 產生）
+    bundles   依 asset_bundles.BUNDLES 合併並壓縮各頁面的 JS / CSS，並壓縮 asset_bundles.PAGE_MODULES 的頁面模組
+    all       依序執行以上三個步驟
+
+brotli 為選用套件（pip install brotli），未安裝時只產生 gzip 版本。
+
+使用方式：
+    python build_assets.py all
+    python build_assets.py models
+"""
+import argparse
+import fnmatch
+import gzip
+import hashlib
+import io
+import json
+import os
+import posixpath
+import re
+import shutil
+import sys
+import tarfile
+import urllib.request
+
+from asset_bundles import BUNDLES, NPM_PREFIX, PAGE_MODULES, VENDOR_PACKAGES, bundle_name, split_npm_name
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+STATIC_DIR = 'static'
+BUILD_DIR = os.path.join(STATIC_DIR, 'build')
+MANIFEST_PATH = os.path.join(BUILD_DIR, 'manifest.json')
+DOWNLOAD_DIR = os.path.join('build', 'downloads')
+HASH_LENGTH = 10
+
+EMOTION_MODEL_JSON = os.path.join(STATIC_DIR, 'models', 'emotion_model.json')
+NPM_REGISTRY = 'https://registry.npmjs.org/'
+
+# 預先壓縮的檔案類型（woff2 等已壓縮格式不再處理）
+COMPRESSIBLE_EXTENSIONS = {'.js', '.css', '.json', '.svg', '.ttf', '.wasm', '.data', '.binarypb', '.tflite', '.bin'}
+MIN_COMPRESSION_SAVING = 0.1
+
+CSS_URL_PATTERN = re.compile(r'url\(\s*([\'"]?)([^\'")]+)\1\s*\)')
+CSS_STRING_PATTERN = re.compile(r'("(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\')')
+# 出現在這些符號或關鍵字之後的 / 為正規表示式的開頭，其餘視為除法
+JS_REGEX_PRECEDERS = set('(,=:[!&|?{};+-*%<>~^') | {
+    'return', 'typeof', 'instanceof', 'in', 'of', 'new', 'delete', 'void', 'throw', 'case', 'do', 'else',
+    'yield', 'await'}
+
+
+def parse_args(argv=None):
+    """解析命令列參數"""
+    parser = argparse.ArgumentParser(description='建置含內容雜湊檔名的靜態資源')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('vendor', help='下載並自行提供第三方套件')
+    models_parser = subparsers.add_parser('models', help='情緒分類模型')
+    subparsers.add_parser('bundles', help='合併並壓縮各頁面的 JS / CSS 與頁面模組')
+    all_parser = subparsers.add_parser('all', help='執行所有步驟')
+    for command_parser in (models_parser, all_parser):
+        command_parser.add_argument('--model-json', default=EMOTION_MODEL_JSON, help='TF.js layers 模型的 model.json')
+    return parser.parse_args(argv)
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+
+
+def write_precompressed(path, data):
+    """產生 .gz 與 .br，壓縮效果不明顯時略過"""
+    variants = [('.gz', gzip.compress(data, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        variants.append(('.br', brotli.compress(data, quality=11)))
+    for suffix, compressed in variants:
+        if len(compressed) <= len(data) * (1 - MIN_COMPRESSION_SAVING):
+            with open(path + suffix, 'wb') as f:
+                f.write(compressed)
+
+
+def write_asset(directory, name, data):
+    """寫入 static/build/<directory>/ 並回傳 (含雜湊的檔名, 雜湊)"""
+    digest = content_hash(data)
+    stem, ext = os.path.splitext(name)
+    hashed_name = f'{stem}.{digest}{ext}'
+    target_dir = os.path.join(BUILD_DIR, *directory.split('/'))
+    os.makedirs(target_dir, exist_ok=True)
+    path = os.path.join(target_dir, hashed_name)
+    with open(path, 'wb') as f:
+        f.write(data)
+    if ext in COMPRESSIBLE_EXTENSIONS:
+        write_precompressed(path, data)
+    return hashed_name, digest
+
+
+def add_to_manifest(manifest, logical_name, directory, hashed_name, digest):
+    manifest[logical_name] = {'path': f'build/{directory}/{hashed_name}', 'hash': digest}
+
+
+def load_manifest():
+    if not os.path.exists(MANIFEST_PATH):
+        return {}
+    with open(MANIFEST_PATH, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_manifest(manifest):
+    os.makedirs(BUILD_DIR, exist_ok=True)
+    with open(MANIFEST_PATH, 'w', encoding='utf-8') as f:
+        json.dump(dict(sorted(manifest.items())), f, indent=2)
+
+
+def reset_step(manifest, directory, key_prefix):
+    """清除某個建置步驟先前的輸出與清單項目"""
+    shutil.rmtree(os.path.join(BUILD_DIR, *directory.split('/')), ignore_errors=True)
+    for name in [name for name in manifest if name.startswith(key_prefix)]:
+        del manifest[name]
+
+
+def download(url):
+    """下載並快取在 build/downloads，重複建置時不必重新下載"""
+    os.makedirs(DOWNLOAD_DIR, exist_ok=True)
+    cached = os.path.join(DOWNLOAD_DIR, url.rsplit('/', 1)[-1])
+    if not os.path.exists(cached):
+        print(f'下載 {url}')
+        with urllib.request.urlopen(url) as response, open(cached + '.part', 'wb') as f:
+            shutil.copyfileobj(response, f)
+        os.replace(cached + '.part', cached)
+    with open(cached, 'rb') as f:
+        return f.read()
+
+
+def package_files(package):
+    """讀取 npm 套件中列在 VENDOR_PACKAGES 的檔案，回傳 {套件內路徑: 內容}"""
+    version, patterns = VENDOR_PACKAGES[package]
+    tarball = f'{NPM_REGISTRY}{package}/-/{package.split("/")[-1]}-{version}.tgz'
+    files = {}
+    with tarfile.open(fileobj=io.BytesIO(download(tarball)), mode='r:gz') as archive:
+        for member in archive.getmembers():
+            path = member.name.split('/', 1)[-1]
+            if member.isfile() and any(fnmatch.fnmatch(path, pattern) for pattern in patterns):
+                files[path] = archive.extractfile(member).read()
+    return files
+
+
+def rewrite_css_urls(css, source_name, output_directory, manifest):
+    """將 CSS 中的相對 url() 改為建置後含雜湊的檔案，路徑相對於輸出位置"""
+    source_dir = posixpath.dirname(source_name)
+
+    def replace(match):
+        url = match.group(2).strip()
+        if url.startswith(('data:', 'http:', 'https:', '//', '#', '/')):
+            return match.group(0)
+        path, suffix = re.match(r'([^?#]*)(.*)', url).groups()
+        entry = manifest.get(posixpath.normpath(posixpath.join(source_dir, path)))
+        if entry is None:
+            print(f'警告：{source_name} 引用的 {url} 不在建置結果中')
+            return match.group(0)
+        return f'url({posixpath.relpath(entry["path"], posixpath.join("build", output_directory))}{suffix})'
+
+    return CSS_URL_PATTERN.sub(replace, css)
+
+
+def js_line_states(source):
+    """逐字掃描 JS 原始碼，回傳每一行 (開頭是否在程式碼中, 結尾是否在程式碼中)
+
+    追蹤字串、樣板字串（含巢狀 ${}）、註解與正規表示式，位於其中的反引號、引號或 // 不影響判斷。
+    / 依前一個符號判斷為除法或正規表示式的開頭。
+    """
+    states = []
+    line_start = True
+    state = 'code'     # code / line_comment / block_comment / quote / template / regex
+    quote = None
+    in_class = False   # 正規表示式的 [...] 內
+    braces = []        # 各層樣板字串 ${ 內尚未關閉的大括號數
+    prev = ''          # 前一個符號
+    i, n = 0, len(source)
+    while i < n:
+        c = source[i]
+        if c == '\n':
+            states.append((line_start, state in ('code', 'line_comment')))
+            if state == 'line_comment':
+                state = 'code'
+            line_start = state == 'code'
+            i += 1
+            continue
+        if state in ('quote', 'template', 'regex') and c == '\\':
+            if source[i + 1:i + 2] == '\n':
+                states.append((line_start, False))
+                line_start = False
+            i += 2
+            continue
+        if state == 'code':
+            if source.startswith('//', i):
+                state = 'line_comment'
+            elif source.startswith('/*', i):
+                state = 'block_comment'
+                i += 1
+            elif c in '\'"':
+                state, quote = 'quote', c
+            elif c == '`':
+                state = 'template'
+            elif c == '/' and (prev == '' or prev in JS_REGEX_PRECEDERS):
+                state, in_class = 'regex', False
+            elif c == '}' and braces and braces[-1] == 0:
+                braces.pop()
+                state = 'template'
+            elif c.isalnum() or c in '_$':
+                start = i
+                while i + 1 < n and (source[i + 1].isalnum() or source[i + 1] in '_$'):
+                    i += 1
+                word = source[start:i + 1]
+                prev = word if word in JS_REGEX_PRECEDERS else 'value'
+            elif not c.isspace():
+                if braces and c in '{}':
+                    braces[-1] += 1 if c == '{' else -1
+                prev = 'value' if c in ')]}' else c
+        elif state == 'block_comment':
+            if source.startswith('*/', i):
+                state = 'code'
+                i += 1
+        elif state == 'quote':
+            if c == quote:
+                state, prev = 'code', 'value'
+        elif state == 'template':
+            if c == '`':
+                state, prev = 'code', 'value'
+            elif source.startswith('${', i):
+                braces.append(0)
+                state, prev = 'code', '{'
+                i += 1
+        elif state == 'regex':
+            if c == '[':
+                in_class = True
+            elif c == ']':
+                in_class = False
+            elif c == '/' and not in_class:
+                state, prev = 'code', 'value'
+        i += 1
+    states.append((line_start, state in ('code', 'line_comment')))
+    return states
+
+
+def minify_js(source):
+    """保守的壓縮：移除縮排、空行與整行註解，保留換行以免影響自動分號
+
+    只處理開頭與結尾都在程式碼中的行；多行樣板字串、註解與以反斜線接續的字串所在的行原樣保留
+    """
+    lines = []
+    for line, (starts_in_code, ends_in_code) in zip(source.split('\n'), js_line_states(source)):
+        line = line.rstrip('\r') if ends_in_code else line
+        if not starts_in_code:
+            lines.append(line)
+            continue
+        stripped = line.lstrip()
+        if ends_in_code:
+            stripped = stripped.rstrip()
+        if stripped and not stripped.startswith('//'):
+            lines.append(stripped)
+    return '\n'.join(lines) + '\n'
+
+
+def minify_css(source):
+    """移除註解並壓縮空白，字串內容不變"""
+    parts = CSS_STRING_PATTERN.split(source)
+    for index in range(0, len(parts), 2):
+        text = re.sub(r'/\*.*?\*/', '', parts[index], flags=re.S)
+        text = re.sub(r'\s+', ' ', text)
+        parts[index] = re.sub(r'\s*([{};,>])\s*', r'\1', text)
+    return ''.join(parts).strip() + '\n'
+
+
+def build_vendor(manifest):
+    """自行提供第三方套件；先處理字型等檔案，再改寫引用它們的 CSS"""
+    reset_step(manifest, 'vendor', NPM_PREFIX)
+    for package, (version, _) in VENDOR_PACKAGES.items():
+        files = package_files(package)
+        for path in sorted(files, key=lambda path: path.endswith('.css')):
+            name = f'{NPM_PREFIX}{package}/{path}'
+            directory = posixpath.join('vendor', package, posixpath.dirname(path)).rstrip('/')
+            data = files[path]
+            if path.endswith('.css'):
+                data = rewrite_css_urls(data.decode('utf-8'), name, directory, manifest).encode('utf-8')
+            hashed_name, digest = write_asset(directory, posixpath.basename(path), data)
+            add_to_manifest(manifest, name, directory, hashed_name, digest)
+        print(f'{package}@{version}：{len(files)} 個檔案')
+
+
+def build_emotion_model(manifest, model_json):
+    """權重檔加上雜湊後改寫 model.json 的 weightsManifest，model.json 的雜湊即為模型版本"""
+    reset_step(manifest, 'models', 'models/')
+    if not os.path.exists(model_json):
+        print(f'找不到 {model_json}，請先執行 python convert_model.py report --ship；略過情緒分類模型')
+        return
+
+    with open(model_json, encoding='utf-8') as f:
+        topology = json.load(f)
+    model_dir = os.path.dirname(model_json)
+    for group in topology['weightsManifest']:
+        hashed_paths = []
+        for name in group['paths']:
+            with open(os.path.join(model_dir, name), 'rb') as f:
+                hashed_paths.append(write_asset('models', name, f.read())[0])
+        group['paths'] = hashed_paths
+
+    data = json.dumps(topology, separators=(',', ':')).encode('utf-8')
+    hashed_name, digest = write_asset('models', 'emotion_model.json', data)
+    add_to_manifest(manifest, 'models/emotion_model.json', 'models', hashed_name, digest)
+    print(f'情緒分類模型版本 {digest}')
+
+
+def read_source(name, vendor_cache):
+    """讀取組合中的原始檔案：第三方檔案取自下載的套件，其餘取自 static/"""
+    if name.startswith(NPM_PREFIX):
+        package, path = split_npm_name(name)
+        if package not in vendor_cache:
+            vendor_cache[package] = package_files(package)
+        return vendor_cache[package][path].decode('utf-8')
+    with open(os.path.join(STATIC_DIR, *name.split('/')), encoding='utf-8') as f:
+        return f.read()
+
+
+def build_bundles(manifest):
+    """合併各頁面的資源；只壓縮本站的原始檔，第三方檔案已是壓縮版本"""
+    if not any(name.startswith(NPM_PREFIX) for name in manifest):
+        sys.exit('請先執行 python build_assets.py vendor')
+    reset_step(manifest, 'bundles', 'bundles/')
+    vendor_cache = {}
+    for bundle, sources in BUNDLES.items():
+        parts = []
+        for source in sources:
+            text = read_source(source, vendor_cache)
+            is_local = not source.startswith(NPM_PREFIX)
+            if bundle.endswith('.css'):
+                text = rewrite_css_urls(text, source, 'bundles', manifest)
+                parts.append(minify_css(text) if is_local else text)
+            else:
+                parts.append(minify_js(text) if is_local else text)
+        separator = '\n' if bundle.endswith('.css') else '\n;\n'
+        data = separator.join(parts).encode('utf-8')
+        hashed_name, digest = write_asset('bundles', bundle, data)
+        add_to_manifest(manifest, bundle_name(bundle), 'bundles', hashed_name, digest)
+        print(f'{bundle}：{len(data) / 1024:.0f} KB')
+
+
+def build_page_modules(manifest):
+    """頁面模組各自輸出（不合併），清單名稱與原始路徑相同，例如 pages/study.js"""
+    reset_step(manifest, 'pages', 'pages/')
+    for name in PAGE_MODULES:
+        data = minify_js(read_source(name, {})).encode('utf-8')
+        hashed_name, digest = write_asset('pages', posixpath.basename(name), data)
+        add_to_manifest(manifest, name, 'pages', hashed_name, digest)
+        print(f'{name}：{len(data) / 1024:.0f} KB')
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    manifest = load_manifest()
+    if args.command in ('vendor', 'all'):
+        build_vendor(manifest)
+    if args.command in ('models', 'all'):
+        build_emotion_model(manifest, args.model_json)
+    if args.command in ('bundles', 'all'):
+        build_bundles(manifest)
+        build_page_modules(manifest)
+    save_manifest(manifest)
+    if brotli is None:
+        print('未安裝 brotli，只產生 gzip 版本')
+    print(f'已更新 {MANIFEST_PATH}（{len(manifest)} 個資源）')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
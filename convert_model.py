@@ -0,0 +1,341 @@
+"""情緒分類模型轉換與量化工具
+
+將 Keras 的 emotion_model.h5（112x112x3 CNN）離線轉換為 TF.js（layers / graph）與 ONNX 格式，
+並各自產生 float32、float16 與 int8 版本；再以樣本集比較各版本相對原始模型的準確率差異、
+檔案大小與推論時間，找出符合準確率要求的最小模型並放到 static/models 供前端載入。
+
+轉換所需套件只在離線轉換時使用，不需安裝在伺服器上：
+    pip install tensorflow tensorflowjs tf2onnx onnx onnxruntime onnxconverter-common
+
+使用方式：
+    python convert_model.py convert --h5 static/models/emotion_model.h5 --out build/models
+    python convert_model.py report --out build/models --samples data/emotion_samples --max-accuracy-drop 0.01
+    python convert_model.py report --out build/models --samples data/emotion_samples --ship
+
+樣本集可以是以情緒標籤命名子資料夾的圖片目錄（data/emotion_samples/happy/*.jpg），
+或包含 x（N x 112 x 112 x 3，0-255）與選用 y（標籤索引）的 .npz 檔。
+"""
+import argparse
+import importlib
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import time
+
+# 與 static/pages/study.js 的 EMOTION_LABELS 相同順序
+EMOTION_LABELS = ['anger', 'disgust', 'fear', 'happy', 'no emotion', 'sad', 'surprise']
+INPUT_SHAPE = (112, 112, 3)
+QUANTIZATIONS = ('float32', 'float16', 'int8')
+TFJS_FORMATS = ('tfjs_layers_model', 'tfjs_graph_model')
+
+# TF.js 的 8 位元量化為 uint8 仿射量化，載入時還原為 float32
+TFJS_QUANTIZE_FLAGS = {
+    'float32': [],
+    'float16': ['--quantize_float16'],
+    'int8': ['--quantize_uint8']
+}
+ONNX_OPSET = 13
+
+# 前端載入的位置（static/script.js 的 EMOTION_MODEL_URL）
+SHIP_DIR = os.path.join('static', 'models')
+SHIP_MODEL_NAME = 'emotion_model.json'
+
+
+def parse_args(argv=None):
+    """解析命令列參數"""
+    parser = argparse.ArgumentParser(description='轉換、量化並評估情緒分類模型')
+    parser.add_argument('--out', default=os.path.join('build', 'models'), help='轉換結果輸出目錄')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    convert_parser = subparsers.add_parser('convert', help='轉換為 TF.js 與 ONNX 並產生量化版本')
+    convert_parser.add_argument('--h5', default=os.path.join(SHIP_DIR, 'emotion_model.h5'), help='Keras 模型檔')
+    convert_parser.add_argument('--quantizations', nargs='+', choices=QUANTIZATIONS, default=list(QUANTIZATIONS),
+                                help='要產生的精度版本')
+
+    report_parser = subparsers.add_parser('report', help='以樣本集比較各版本的準確率、大小與推論時間')
+    report_parser.add_argument('--h5', default=os.path.join(SHIP_DIR, 'emotion_model.h5'), help='作為基準的 Keras 模型檔')
+    report_parser.add_argument('--samples', required=True, help='樣本圖片目錄或 .npz 檔')
+    report_parser.add_argument('--limit', type=int, default=0, help='最多使用的樣本數，0 表示全部')
+    report_parser.add_argument('--latency-runs', type=int, default=50, help='單張推論計時次數')
+    report_parser.add_argument('--max-accuracy-drop', type=float, default=0.01,
+                               help='允許的準確率下降（無標籤時改以與基準模型的一致率判斷）')
+    report_parser.add_argument('--ship', action='store_true',
+                               help=f'將符合條件的最小 TF.js layers 模型複製到 {SHIP_DIR}/{SHIP_MODEL_NAME}')
+    return parser.parse_args(argv)
+
+
+def require(module_name, package):
+    """載入轉換用的選用套件，缺少時提示安裝方式"""
+    try:
+        return importlib.import_module(module_name)
+    except ImportError:
+        sys.exit(f'缺少 {package}，請先執行：pip install {package}')
+
+
+def tfjs_dir(out_dir, output_format, quantization):
+    return os.path.join(out_dir, f'{output_format}_{quantization}')
+
+
+def onnx_path(out_dir, quantization):
+    return os.path.join(out_dir, 'onnx', f'emotion_model_{quantization}.onnx')
+
+
+def artifact_size(path):
+    """模型檔案大小（目錄時加總所有檔案）"""
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    return sum(os.path.getsize(os.path.join(root, name))
+               for root, _, names in os.walk(path) for name in names)
+
+
+def convert_tfjs(h5_path, out_dir, quantizations):
+    """以 tensorflowjs_converter 轉出 layers 與 graph 模型"""
+    require('tensorflowjs', 'tensorflowjs')
+    for quantization in quantizations:
+        for output_format in TFJS_FORMATS:
+            target = tfjs_dir(out_dir, output_format, quantization)
+            shutil.rmtree(target, ignore_errors=True)
+            command = ['tensorflowjs_converter', '--input_format=keras', f'--output_format={output_format}',
+                       *TFJS_QUANTIZE_FLAGS[quantization], h5_path, target]
+            subprocess.run(command, check=True)
+            print(f'{output_format} {quantization}：{artifact_size(target) / 1024:.0f} KB')
+
+
+def convert_onnx(tf, h5_path, out_dir, quantizations):
+    """轉出 ONNX，float16 轉換權重精度，int8 使用 onnxruntime 動態量化"""
+    tf2onnx = require('tf2onnx', 'tf2onnx')
+    os.makedirs(os.path.dirname(onnx_path(out_dir, 'float32')), exist_ok=True)
+
+    model = tf.keras.models.load_model(h5_path, compile=False)
+    signature = (tf.TensorSpec((None, *INPUT_SHAPE), tf.float32, name='input'),)
+    float_path = onnx_path(out_dir, 'float32')
+    tf2onnx.convert.from_keras(model, input_signature=signature, opset=ONNX_OPSET, output_path=float_path)
+
+    if 'float16' in quantizations:
+        onnx = require('onnx', 'onnx')
+        float16 = require('onnxconverter_common.float16', 'onnxconverter-common')
+        model_fp16 = float16.convert_float_to_float16(onnx.load(float_path), keep_io_types=True)
+        onnx.save(model_fp16, onnx_path(out_dir, 'float16'))
+
+    if 'int8' in quantizations:
+        quantization = require('onnxruntime.quantization', 'onnxruntime')
+        quantization.quantize_dynamic(float_path, onnx_path(out_dir, 'int8'),
+                                      weight_type=quantization.QuantType.QInt8)
+
+    for name in quantizations:
+        print(f'onnx {name}：{artifact_size(onnx_path(out_dir, name)) / 1024:.0f} KB')
+
+
+def convert(args):
+    tf = require('tensorflow', 'tensorflow')
+    os.makedirs(args.out, exist_ok=True)
+    convert_tfjs(args.h5, args.out, args.quantizations)
+    convert_onnx(tf, args.h5, args.out, args.quantizations)
+    print(f'轉換完成，輸出於 {args.out}')
+
+
+def load_samples(tf, np, samples, limit):
+    """讀取樣本集，回傳 (影像, 標籤或 None)；影像維持 0-255，正規化由模型的 Rescaling 層處理"""
+    if samples.endswith('.npz'):
+        data = np.load(samples)
+        images = data['x'].astype('float32')
+        labels = data['y'].astype('int64') if 'y' in data else None
+    else:
+        images, labels = [], []
+        for index, label in enumerate(EMOTION_LABELS):
+            label_dir = os.path.join(samples, label)
+            if not os.path.isdir(label_dir):
+                continue
+            for name in sorted(os.listdir(label_dir)):
+                image = tf.keras.utils.load_img(os.path.join(label_dir, name), target_size=INPUT_SHAPE[:2])
+                images.append(tf.keras.utils.img_to_array(image))
+                labels.append(index)
+        if not images:
+            return np.empty((0, *INPUT_SHAPE), dtype='float32'), None
+        images = np.stack(images).astype('float32')
+        labels = np.array(labels, dtype='int64')
+
+    if limit:
+        images = images[:limit]
+        labels = labels[:limit] if labels is not None else None
+    return images, labels
+
+
+def fake_quantize(np, weights, quantization):
+    """模擬 TF.js 載入量化權重後還原的數值，用於在 Python 中評估準確率"""
+    if quantization == 'float16':
+        return weights.astype(np.float16).astype(np.float32)
+    if quantization == 'int8':
+        # 與 tensorflowjs 的 uint8 仿射量化相同：以最小值對齊量化步距
+        low, high = float(weights.min()), float(weights.max())
+        scale = (high - low) / 255
+        if not scale:
+            return weights
+        nudged_low = round(low / scale) * scale
+        quantized = np.round((np.clip(weights, nudged_low, nudged_low + 255 * scale) - nudged_low) / scale)
+        return (quantized * scale + nudged_low).astype(np.float32)
+    return weights
+
+
+def keras_predictor(tf, np, reference, quantization):
+    """建立套用量化權重的 Keras 模型，回傳 (批次預測函式, 單張推論函式)"""
+    model = tf.keras.models.clone_model(reference)
+    model.set_weights([fake_quantize(np, weights, quantization) for weights in reference.get_weights()])
+    return (lambda images: model.predict(images, batch_size=64, verbose=0),
+            lambda image: model(image, training=False).numpy())
+
+
+def onnx_predictor(np, path):
+    """以 onnxruntime（CPU）建立預測函式"""
+    onnxruntime = require('onnxruntime', 'onnxruntime')
+    session = onnxruntime.InferenceSession(path, providers=['CPUExecutionProvider'])
+    input_name = session.get_inputs()[0].name
+
+    def predict(images):
+        return np.concatenate([session.run(None, {input_name: images[start:start + 64]})[0]
+                               for start in range(0, len(images), 64)])
+
+    return predict, lambda image: session.run(None, {input_name: image})[0]
+
+
+def measure_latency(run_single, image, runs):
+    """單張推論耗時（毫秒），先暖機再取中位數與 p95"""
+    for _ in range(3):
+        run_single(image)
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        run_single(image)
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return statistics.median(timings), timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+
+
+def score(np, predictions, reference_predictions, labels):
+    """準確率、與基準模型的一致率與最大機率差"""
+    top1 = predictions.argmax(axis=1)
+    return {
+        'accuracy': float((top1 == labels).mean()) if labels is not None else None,
+        'agreement': float((top1 == reference_predictions.argmax(axis=1)).mean()),
+        'max_prob_delta': float(np.abs(predictions - reference_predictions).max())
+    }
+
+
+def meets_accuracy(row, baseline, max_drop):
+    if row['accuracy'] is not None and baseline['accuracy'] is not None:
+        return baseline['accuracy'] - row['accuracy'] <= max_drop
+    return row['agreement'] >= 1 - max_drop
+
+
+def ship_model(source_dir):
+    """將 layers 模型放到前端載入位置，並清除先前版本的權重檔"""
+    target = os.path.join(SHIP_DIR, SHIP_MODEL_NAME)
+    if os.path.exists(target):
+        with open(target, encoding='utf-8') as f:
+            for group in json.load(f).get('weightsManifest', []):
+                for name in group['paths']:
+                    if os.path.exists(os.path.join(SHIP_DIR, name)):
+                        os.remove(os.path.join(SHIP_DIR, name))
+
+    with open(os.path.join(source_dir, 'model.json'), encoding='utf-8') as f:
+        manifest = json.load(f)
+    for group in manifest['weightsManifest']:
+        for name in group['paths']:
+            shutil.copyfile(os.path.join(source_dir, name), os.path.join(SHIP_DIR, name))
+    shutil.copyfile(os.path.join(source_dir, 'model.json'), target)
+    print(f'已將 {source_dir} 複製到 {target}')
+
+
+def report(args):
+    tf = require('tensorflow', 'tensorflow')
+    np = require('numpy', 'numpy')
+
+    images, labels = load_samples(tf, np, args.samples, args.limit)
+    if not len(images):
+        sys.exit(f'{args.samples} 中沒有樣本')
+    single = images[:1]
+    print(f'樣本數：{len(images)}（{"有" if labels is not None else "無"}標籤）')
+
+    reference = tf.keras.models.load_model(args.h5, compile=False)
+    predict, run_single = keras_predictor(tf, np, reference, 'float32')
+    reference_predictions = predict(images)
+    baseline = score(np, reference_predictions, reference_predictions, labels)
+    baseline.update(format='keras', quantization='float32', size=artifact_size(args.h5),
+                    latency_ms=measure_latency(run_single, single, args.latency_runs))
+
+    rows = [baseline]
+    for quantization in QUANTIZATIONS:
+        # TF.js 無法在 Python 中執行：以相同的權重量化方式評估準確率，推論時間請在 /benchmark/emotion 量測
+        tfjs_predictions = None
+        for output_format in TFJS_FORMATS:
+            path = tfjs_dir(args.out, output_format, quantization)
+            if not os.path.isdir(path):
+                continue
+            if tfjs_predictions is None:
+                tfjs_predictions = keras_predictor(tf, np, reference, quantization)[0](images)
+            row = score(np, tfjs_predictions, reference_predictions, labels)
+            row.update(format=output_format, quantization=quantization, path=path,
+                       size=artifact_size(path), latency_ms=None)
+            rows.append(row)
+
+        path = onnx_path(args.out, quantization)
+        if os.path.isfile(path):
+            predict, run_single = onnx_predictor(np, path)
+            row = score(np, predict(images), reference_predictions, labels)
+            row.update(format='onnx', quantization=quantization, path=path, size=artifact_size(path),
+                       latency_ms=measure_latency(run_single, single, args.latency_runs))
+            rows.append(row)
+
+    if len(rows) == 1:
+        sys.exit(f'{args.out} 中沒有轉換結果，請先執行 convert')
+
+    # 每種格式中符合準確率要求的最小版本
+    recommended = {}
+    for row in rows[1:]:
+        row['accuracy_delta'] = (row['accuracy'] - baseline['accuracy']
+                                 if row['accuracy'] is not None else None)
+        row['meets_accuracy'] = meets_accuracy(row, baseline, args.max_accuracy_drop)
+        best = recommended.get(row['format'])
+        if row['meets_accuracy'] and (best is None or row['size'] < best['size']):
+            recommended[row['format']] = row
+
+    print(f'{"格式":<20}{"精度":<10}{"大小(KB)":>10}{"準確率":>10}{"差異":>10}{"一致率":>10}{"最大機率差":>12}{"推論 ms (中位/p95)":>22}')
+    for row in rows:
+        accuracy = f'{row["accuracy"]:.4f}' if row['accuracy'] is not None else '-'
+        delta = f'{row["accuracy_delta"]:+.4f}' if row.get('accuracy_delta') is not None else '-'
+        latency = f'{row["latency_ms"][0]:.2f} / {row["latency_ms"][1]:.2f}' if row['latency_ms'] else '瀏覽器量測'
+        marker = ' *' if any(row is best for best in recommended.values()) else ''
+        print(f'{row["format"]:<20}{row["quantization"]:<10}{row["size"] / 1024:>10.0f}{accuracy:>10}{delta:>10}'
+              f'{row["agreement"]:>10.4f}{row["max_prob_delta"]:>12.4f}{latency:>22}{marker}')
+    print('* 為各格式中準確率下降不超過 {:.2%} 的最小版本'.format(args.max_accuracy_drop))
+
+    report_path = os.path.join(args.out, 'report.json')
+    with open(report_path, 'w', encoding='utf-8') as f:
+        json.dump({
+            'samples': len(images),
+            'max_accuracy_drop': args.max_accuracy_drop,
+            'results': rows,
+            'recommended': {name: row['path'] for name, row in recommended.items()}
+        }, f, ensure_ascii=False, indent=2)
+    print(f'報告已寫入 {report_path}')
+
+    if args.ship:
+        if 'tfjs_layers_model' not in recommended:
+            sys.exit('沒有符合準確率要求的 TF.js layers 模型，未更新前端模型')
+        ship_model(recommended['tfjs_layers_model']['path'])
+    return 0
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.command == 'convert':
+        convert(args)
+        return 0
+    return report(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
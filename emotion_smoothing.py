@@ -0,0 +1,87 @@
+"""情緒訊號的時間平滑
+
+與 static/emotion_smoothing.js 相同的演算法與常數：七類機率以依取樣間隔調整的指數移動平均（EMA）平滑，
+專注度由平滑後的機率分布求期望值。前端以 JS 版本即時顯示，伺服器結束學習時以此版本依序號重算，
+同一串資料在兩邊得到相同的結果；修改時兩邊必須一起更新。
+"""
+import math
+import struct
+
+# 與 static/pages/study.js 的 EMOTION_LABELS 相同順序
+EMOTION_LABELS = ['anger', 'disgust', 'fear', 'happy', 'no emotion', 'sad', 'surprise']
+
+SMOOTHING_TIME_CONSTANT_MS = 3000
+
+# 各情緒對應的專注度（1-低, 2-中, 3-高）
+ATTENTION_BY_EMOTION = {
+    'anger': 1,
+    'disgust': 1,
+    'fear': 1,
+    'happy': 2,
+    'no emotion': 3,
+    'sad': 1,
+    'surprise': 2
+}
+
+# 逐筆資料保存的原始機率：7 個 float32（28 bytes），與前端 Float32Array 相同精度，重算的結果才會一致
+PROBABILITY_FORMAT = '<7f'
+
+
+def attention_from_distribution(probabilities, labels=EMOTION_LABELS):
+    """平滑後機率分布的專注度期望值，四捨五入為 1-3（與 JS 的 Math.floor(x + 0.5) 相同）"""
+    expected = 0.0
+    total = 0.0
+    for label, probability in zip(labels, probabilities):
+        expected += probability * ATTENTION_BY_EMOTION[label]
+        total += probability
+    if total <= 0:
+        return 2
+    return min(3, max(1, math.floor(expected / total + 0.5)))
+
+
+class EmotionSmoother:
+    def __init__(self, labels=EMOTION_LABELS, time_constant_ms=SMOOTHING_TIME_CONSTANT_MS):
+        self.labels = labels
+        self.time_constant_ms = time_constant_ms
+        self.reset()
+
+    def reset(self):
+        self.state = None
+        self.last_timestamp = None
+
+    def update(self, probabilities, timestamp_ms):
+        """加入一筆機率，回傳平滑後的 {emotion, confidence, attention}"""
+        if self.state is None:
+            self.state = [float(probability) for probability in probabilities]
+        else:
+            elapsed = max(0.0, timestamp_ms - self.last_timestamp)
+            alpha = 1 - math.exp(-elapsed / self.time_constant_ms)
+            for i, probability in enumerate(probabilities):
+                self.state[i] += alpha * (probability - self.state[i])
+        self.last_timestamp = timestamp_ms
+
+        index = 0
+        for i in range(1, len(self.state)):
+            if self.state[i] > self.state[index]:
+                index = i
+        return {
+            'emotion': self.labels[index],
+            'confidence': self.state[index],
+            'attention': attention_from_distribution(self.state, self.labels)
+        }
+
+
+def pack_probabilities(probabilities):
+    """驗證並壓縮前端送來的七類機率，格式不符時回傳 None"""
+    if not isinstance(probabilities, (list, tuple)) or len(probabilities) != len(EMOTION_LABELS):
+        return None
+    values = []
+    for probability in probabilities:
+        if isinstance(probability, bool) or not isinstance(probability, (int, float)) or not 0 <= probability <= 1:
+            return None
+        values.append(float(probability))
+    return struct.pack(PROBABILITY_FORMAT, *values)
+
+
+def unpack_probabilities(data):
+    return list(struct.unpack(PROBABILITY_FORMAT, data))
@@ -0,0 +1,188 @@
+"""進行中學習階段的登錄表
+
+記錄每個進行中學習階段的歸屬、開始與最後活動時間，以及上傳資料的累計值。上傳資料時以此驗證歸屬，
+不必每次查詢資料庫；也供「目前學習中」列表與自動結束閒置的學習階段使用。
+
+預設存在程序記憶體中（每個程序各自一份，重新啟動後由上傳資料時重新登錄）；以多個程序或多台主機執行時，
+改用 RedisRegistry 或 shared_backend.FileRegistry 共用（由 shared_backend.create_shared_backend 依設定建立）。
+時間皆為 UTC epoch 秒。
+"""
+import threading
+from datetime import datetime, timedelta
+
+EPOCH = datetime(1970, 1, 1)
+
+
+def to_epoch(value):
+    """資料庫使用的 naive UTC datetime 轉為 epoch 秒"""
+    return (value - EPOCH).total_seconds()
+
+
+class LiveSession:
+    """登錄表中的一個學習階段
+
+    具有與 StudySession 相同的 id 與 start_time，可直接交給解析上傳資料的函式
+    """
+    FIELDS = {
+        'id': int,
+        'user_id': int,
+        'child_id': int,
+        'subject': str,
+        'started_at': float,
+        'last_seen': float,
+        'sample_count': int,
+        'weight_sum': float,
+        'attention_sum': float,
+        'confidence_sum': float,
+        'last_emotion': str,
+        'last_attention': int
+    }
+
+    def __init__(self, **values):
+        for name, cast in self.FIELDS.items():
+            value = values.get(name)
+            setattr(self, name, cast(value) if value not in (None, '') else None)
+        for name in ('sample_count', 'weight_sum', 'attention_sum', 'confidence_sum'):
+            if getattr(self, name) is None:
+                setattr(self, name, 0)
+
+    @property
+    def start_time(self):
+        return EPOCH + timedelta(seconds=self.started_at)
+
+    @property
+    def average_attention(self):
+        return self.attention_sum / self.weight_sum if self.weight_sum else None
+
+    @property
+    def average_confidence(self):
+        return self.confidence_sum / self.weight_sum if self.weight_sum else None
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.FIELDS}
+
+
+class MemoryRegistry:
+    """存在程序記憶體中的登錄表"""
+
+    def __init__(self):
+        self.sessions = {}
+        self.lock = threading.Lock()
+
+    def open(self, live):
+        with self.lock:
+            self.sessions[live.id] = live
+
+    def get(self, session_id):
+        with self.lock:
+            return self.sessions.get(session_id)
+
+    def record(self, session_id, sample_count, weight, attention_sum, confidence_sum, emotion, attention, now):
+        """累加一批上傳資料並更新最後活動時間，學習階段不在登錄表中時回傳 False"""
+        with self.lock:
+            live = self.sessions.get(session_id)
+            if live is None:
+                return False
+            live.sample_count += sample_count
+            live.weight_sum += weight
+            live.attention_sum += attention_sum
+            live.confidence_sum += confidence_sum
+            if emotion is not None:
+                live.last_emotion = emotion
+                live.last_attention = attention
+            live.last_seen = max(live.last_seen, now)
+            return True
+
+    def close(self, session_id):
+        with self.lock:
+            self.sessions.pop(session_id, None)
+
+    def list(self, user_id=None):
+        with self.lock:
+            return [live for live in self.sessions.values() if user_id is None or live.user_id == user_id]
+
+    def idle(self, cutoff):
+        """最後活動時間早於 cutoff 的學習階段"""
+        with self.lock:
+            return [live for live in self.sessions.values() if live.last_seen < cutoff]
+
+
+# 原子地累加並更新最後活動時間；學習階段已結束（鍵不存在）時不建立殘缺的資料
+REDIS_RECORD_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return 0
+end
+redis.call('HINCRBY', KEYS[1], 'sample_count', ARGV[1])
+redis.call('HINCRBYFLOAT', KEYS[1], 'weight_sum', ARGV[2])
+redis.call('HINCRBYFLOAT', KEYS[1], 'attention_sum', ARGV[3])
+redis.call('HINCRBYFLOAT', KEYS[1], 'confidence_sum', ARGV[4])
+if ARGV[5] ~= '' then
+    redis.call('HSET', KEYS[1], 'last_emotion', ARGV[5], 'last_attention', ARGV[6])
+end
+local last_seen = math.max(tonumber(redis.call('HGET', KEYS[1], 'last_seen') or 0), tonumber(ARGV[7]))
+redis.call('HSET', KEYS[1], 'last_seen', last_seen)
+redis.call('ZADD', KEYS[2], last_seen, ARGV[8])
+return 1
+"""
+
+
+class RedisRegistry:
+    """存在 Redis 中的登錄表，多個程序共用
+
+    每個學習階段一個 hash，另以 sorted set 依最後活動時間排序，並以 set 記錄各帳號的學習階段
+    """
+
+    def __init__(self, client, prefix='live_session'):
+        self.client = client
+        self.prefix = prefix
+        self.last_seen_key = f'{prefix}:last_seen'
+        self.record_script = client.register_script(REDIS_RECORD_SCRIPT)
+
+    def key(self, session_id):
+        return f'{self.prefix}:{session_id}'
+
+    def user_key(self, user_id):
+        return f'{self.prefix}:user:{user_id}'
+
+    def open(self, live):
+        values = {name: value for name, value in live.to_dict().items() if value is not None}
+        pipeline = self.client.pipeline()
+        pipeline.delete(self.key(live.id))
+        pipeline.hset(self.key(live.id), mapping=values)
+        pipeline.zadd(self.last_seen_key, {live.id: live.last_seen})
+        pipeline.sadd(self.user_key(live.user_id), live.id)
+        pipeline.execute()
+
+    def get(self, session_id):
+        values = self.client.hgetall(self.key(session_id))
+        return LiveSession(**values) if values.get('user_id') else None
+
+    def record(self, session_id, sample_count, weight, attention_sum, confidence_sum, emotion, attention, now):
+        return bool(self.record_script(
+            keys=[self.key(session_id), self.last_seen_key],
+            args=[sample_count, weight, attention_sum, confidence_sum,
+                  emotion or '', attention or '', now, session_id]))
+
+    def close(self, session_id):
+        user_id = self.client.hget(self.key(session_id), 'user_id')
+        pipeline = self.client.pipeline()
+        pipeline.delete(self.key(session_id))
+        pipeline.zrem(self.last_seen_key, session_id)
+        if user_id:
+            pipeline.srem(self.user_key(user_id), session_id)
+        pipeline.execute()
+
+    def get_many(self, session_ids):
+        pipeline = self.client.pipeline()
+        for session_id in session_ids:
+            pipeline.hgetall(self.key(session_id))
+        return [LiveSession(**values) for values in pipeline.execute() if values.get('user_id')]
+
+    def list(self, user_id=None):
+        if user_id is None:
+            return self.get_many(self.client.zrange(self.last_seen_key, 0, -1))
+        return self.get_many(self.client.smembers(self.user_key(user_id)))
+
+    def idle(self, cutoff):
+        return self.get_many(self.client.zrangebyscore(self.last_seen_key, '-inf', f'({cutoff}'))
+
@@ -0,0 +1,228 @@
+"""多台主機的本機測試工具
+
+在本機以不同連接埠啟動多個 app.py 程序，共用同一個資料庫、SECRET_KEY 與 SHARED_BACKEND_URL，模擬負載平衡後
+不固定主機的多台主機，再將每個請求輪流送到不同主機，檢查：
+
+    登入狀態     在一台主機登入後，其他主機都能辨識（簽章 cookie）
+    登錄表       一台主機開始的學習階段，其他主機可上傳資料，「目前學習中」列表在任何主機都看得到
+    分析快取     一台主機的學習記錄變更後，其他主機的分析頁面立即反映
+    報告         一台主機產生的 PDF 報告由另一台主機提供下載
+    限流         權杖桶由所有主機共用，分散到多台主機的請求合計受限
+
+未指定 --backend 時在暫存目錄中使用共用目錄（file:///...）；指定 redis://localhost:6379/0 時需本機有 Redis
+或相容的伺服器。資料庫預設為暫存目錄中的 SQLite 檔，只適用於同一台主機上的程序。
+
+使用方式：
+    python multi_node.py --nodes 3
+    python multi_node.py --nodes 2 --backend redis://localhost:6379/0
+    python multi_node.py --nodes 3 --serve    # 只啟動主機，按 Ctrl+C 結束
+"""
+import argparse
+import json
+import os
+import re
+import secrets
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from http.cookiejar import CookieJar
+from pathlib import Path
+from urllib.error import HTTPError, URLError
+from urllib.request import HTTPCookieProcessor, HTTPRedirectHandler, Request, build_opener, urlopen
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+START_TIMEOUT_SECONDS = 30
+START_SESSION_BURST = 5
+
+
+def start_nodes(count, base_port, env, log_dir):
+    """依序啟動各主機（第一台建立資料表後再啟動其餘主機，避免同時建立），回傳 [(網址, 程序)]"""
+    nodes = []
+    for index in range(count):
+        port = base_port + index
+        log = open(os.path.join(log_dir, f'node{index}.log'), 'wb')
+        process = subprocess.Popen([sys.executable, 'app.py'], cwd=APP_DIR, env=dict(env, PORT=str(port)),
+                                   stdout=log, stderr=subprocess.STDOUT)
+        url = f'http://127.0.0.1:{port}'
+        nodes.append((url, process))
+        wait_until_ready(url, process, log.name)
+        print(f'主機 {index}：{url}（記錄檔 {log.name}）')
+    return nodes
+
+
+def wait_until_ready(url, process, log_path):
+    deadline = time.monotonic() + START_TIMEOUT_SECONDS
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'{url} 啟動失敗，請查看 {log_path}')
+        try:
+            urlopen(url + '/login', timeout=2).close()
+            return
+        except (URLError, ConnectionError):
+            time.sleep(0.2)
+    raise RuntimeError(f'{url} 未在 {START_TIMEOUT_SECONDS} 秒內啟動，請查看 {log_path}')
+
+
+def stop_nodes(nodes):
+    for _, process in nodes:
+        process.terminate()
+    for _, process in nodes:
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+class NoRedirect(HTTPRedirectHandler):
+    """不自動跟隨轉址，由測試決定下一個請求送到哪台主機"""
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+class Client:
+    """模擬一個瀏覽器：共用 cookie，每個請求輪流送到下一台主機"""
+
+    def __init__(self, urls):
+        self.urls = urls
+        self.turn = 0
+        self.opener = build_opener(HTTPCookieProcessor(CookieJar()), NoRedirect())
+
+    def request(self, method, path, payload=None):
+        """回傳 (主機編號, 狀態碼, 標頭, 內容)"""
+        node = self.turn % len(self.urls)
+        self.turn += 1
+        body = json.dumps(payload).encode('utf-8') if payload is not None else None
+        request = Request(self.urls[node] + path, data=body, method=method,
+                          headers={'Content-Type': 'application/json'} if body is not None else {})
+        try:
+            with self.opener.open(request, timeout=60) as response:
+                return node, response.status, response.headers, response.read()
+        except HTTPError as error:
+            return node, error.code, error.headers, error.read()
+
+    def json(self, method, path, payload=None):
+        node, status, _, content = self.request(method, path, payload)
+        return node, status, json.loads(content) if content else None
+
+
+def total_sessions(content):
+    """智慧建議頁面上的學習次數（第一個統計數字）"""
+    match = re.search(r'<h5 class="mb-0">(\d+)</h5>', content.decode('utf-8'))
+    return int(match.group(1)) if match else None
+
+
+def run_checks(urls):
+    client = Client(urls)
+    results = []
+
+    def check(name, passed, detail=''):
+        results.append(passed)
+        print(f"{'PASS' if passed else 'FAIL'}  {name}" + (f'：{detail}' if detail else ''))
+
+    username = 'node_test_' + secrets.token_hex(4)
+    client.json('POST', '/register', {'username': username, 'email': username + '@example.com', 'password': 'password'})
+    node, _, result = client.json('POST', '/login', {'username': username, 'password': 'password'})
+    check('登入', bool(result and result.get('success')), f'主機 {node}')
+
+    node, _, result = client.json('POST', '/create_child', {
+        'nickname': '測試', 'gender': 'female', 'age': 10, 'education_stage': 'elementary'})
+    child_id = result and result.get('child_id')
+    check('其他主機辨識登入狀態', bool(child_id), f'主機 {node} 建立小孩檔案')
+    if not child_id:
+        return results
+    client.request('GET', f'/select_child/{child_id}')
+
+    node, status, _, content = client.request('GET', '/smart_suggestions')
+    check('分析頁面（填入快取）', status == 200 and total_sessions(content) == 0, f'主機 {node}')
+
+    node, _, result = client.json('POST', '/start_session', {'subject': 'math', 'duration': 25})
+    session_id = result and result.get('session_id')
+    check('開始學習', bool(session_id), f'主機 {node}')
+    if not session_id:
+        return results
+
+    now_ms = time.time() * 1000
+    samples = [{'seq': seq, 'client_ts': now_ms + seq * 1000, 'emotion': 'happy', 'attention_level': 3,
+                'confidence': 0.9, 'sample_weight': 1} for seq in range(1, 6)]
+    node, status, result = client.json('POST', '/record_emotion_batch', {'session_id': session_id, 'samples': samples})
+    check('其他主機接受上傳', status == 200 and result.get('inserted') == len(samples), f'主機 {node}')
+
+    node, _, result = client.json('GET', '/live_sessions')
+    live = [item for item in (result or {}).get('sessions', []) if item['session_id'] == session_id]
+    check('目前學習中列表', bool(live) and live[0]['sample_count'] == len(samples),
+          f"主機 {node} 看到 {live[0]['sample_count'] if live else 0} 筆資料")
+
+    node, status, _, content = client.request('GET', '/smart_suggestions')
+    check('分析快取跨主機失效', status == 200 and total_sessions(content) == 1, f'主機 {node}')
+
+    node, status, headers, _ = client.request('GET', f'/generate_report/{child_id}')
+    location = headers.get('Location', '')
+    check('產生報告', status in (301, 302, 303) and '/reports/' in location, f'主機 {node}')
+    node, status, headers, content = client.request('GET', location[location.find('/reports/'):])
+    check('其他主機下載報告', status == 200 and content.startswith(b'%PDF'),
+          f"主機 {node}，{headers.get('Content-Type')}，{len(content)} bytes")
+
+    node, _, result = client.json('POST', '/end_session', {'session_id': session_id})
+    check('其他主機結束學習', bool(result and result.get('success')), f'主機 {node}')
+    node, _, result = client.json('GET', '/live_sessions')
+    check('結束後移出登錄表', not any(item['session_id'] == session_id for item in result['sessions']), f'主機 {node}')
+
+    # 已開始 1 次；共用的權杖桶合計只允許 burst 次（加上測試期間補充的權杖），各主機各自計算時會多出數倍
+    started = 1
+    for _ in range(START_SESSION_BURST * len(urls)):
+        node, status, _ = client.json('POST', '/start_session', {'subject': 'math', 'duration': 25})
+        if status == 429:
+            break
+        started += 1
+    check('限流由所有主機共用', started <= START_SESSION_BURST + 1,
+          f'第 {started + 1} 次開始學習時回傳 429（burst {START_SESSION_BURST}）')
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='在本機啟動多台主機並檢查共用後端')
+    parser.add_argument('--nodes', type=int, default=3)
+    parser.add_argument('--port', type=int, default=5101, help='第一台主機的連接埠，其餘依序遞增')
+    parser.add_argument('--backend', default='', help='SHARED_BACKEND_URL，預設為暫存目錄中的共用目錄')
+    parser.add_argument('--database', default='', help='DATABASE_URL，預設為暫存目錄中的 SQLite 檔')
+    parser.add_argument('--serve', action='store_true', help='只啟動主機，不執行檢查')
+    parser.add_argument('--keep', action='store_true', help='保留暫存目錄（資料庫、共用目錄與記錄檔）')
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix='multi_node_')
+    env = dict(os.environ)
+    env.update({
+        'SECRET_KEY': secrets.token_hex(16),
+        'DATABASE_URL': args.database or 'sqlite:///' + os.path.join(work_dir, 'multi_node.db'),
+        'SHARED_BACKEND_URL': args.backend or Path(work_dir, 'shared').as_uri(),
+        'START_SESSION_BURST': str(START_SESSION_BURST)
+    })
+    env.setdefault('BCRYPT_LOG_ROUNDS', '4')
+    print(f"共用後端：{env['SHARED_BACKEND_URL']}")
+
+    nodes = []
+    try:
+        nodes = start_nodes(args.nodes, args.port, env, work_dir)
+        if args.serve:
+            print('按 Ctrl+C 結束')
+            while all(process.poll() is None for _, process in nodes):
+                time.sleep(1)
+            return 1
+        results = run_checks([url for url, _ in nodes])
+        print(f'{sum(results)}/{len(results)} 項通過')
+        return 0 if results and all(results) else 1
+    except KeyboardInterrupt:
+        return 0
+    finally:
+        stop_nodes(nodes)
+        if args.keep:
+            print(f'暫存目錄：{work_dir}')
+        else:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
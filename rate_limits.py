@@ -0,0 +1,79 @@
+"""權杖桶（token bucket）限流
+
+每個鍵一個桶，以固定速率補充權杖、最多累積 burst 個；每個請求取走 cost 個，權杖不足時不取走，
+回傳需要等待的秒數。預設存在程序記憶體中（每個程序各自計算）；多個程序或多台主機執行時改用 RedisRateLimiter
+或 shared_backend.FileRateLimiter，所有程序共用同一組桶。
+"""
+import threading
+import time
+
+# 超過此時間沒有使用的桶已補滿，可以移除（速率低於 burst / 此值的桶移除後會提早補滿）
+BUCKET_IDLE_SECONDS = 600
+PRUNE_INTERVAL_SECONDS = 60
+
+
+class MemoryRateLimiter:
+    def __init__(self):
+        self.buckets = {}    # 鍵: (剩餘權杖, 更新時間)
+        self.lock = threading.Lock()
+        self.last_prune = time.monotonic()
+
+    def take(self, key, rate, burst, cost=1):
+        """取走 cost 個權杖並回傳 0；權杖不足時回傳需要等待的秒數。rate <= 0 表示不限制"""
+        if rate <= 0:
+            return 0.0
+        cost = min(cost, burst)
+        now = time.monotonic()
+        with self.lock:
+            tokens, updated = self.buckets.get(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated) * rate)
+            if tokens >= cost:
+                tokens -= cost
+                wait = 0.0
+            else:
+                wait = (cost - tokens) / rate
+            self.buckets[key] = (tokens, now)
+            if now - self.last_prune >= PRUNE_INTERVAL_SECONDS:
+                self.prune(now)
+            return wait
+
+    def prune(self, now):
+        self.last_prune = now
+        for key in [key for key, (_, updated) in self.buckets.items() if now - updated > BUCKET_IDLE_SECONDS]:
+            del self.buckets[key]
+
+
+# 以 Redis 伺服器的時間計算補充量，各主機的時鐘誤差不影響結果；回傳字串以保留小數
+REDIS_TAKE_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(bucket[1]) or burst
+local updated = tonumber(bucket[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+local wait = 0
+if tokens >= cost then
+    tokens = tokens - cost
+else
+    wait = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return tostring(wait)
+"""
+
+
+class RedisRateLimiter:
+    """存在 Redis 中的權杖桶，多個程序共用；桶補滿後由 Redis 自動過期"""
+
+    def __init__(self, client, prefix='rate_limit'):
+        self.prefix = prefix
+        self.take_script = client.register_script(REDIS_TAKE_SCRIPT)
+
+    def take(self, key, rate, burst, cost=1):
+        if rate <= 0:
+            return 0.0
+        return float(self.take_script(keys=[f'{self.prefix}:{key}'], args=[rate, burst, min(cost, burst)]))
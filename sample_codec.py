@@ -0,0 +1,104 @@
+"""情緒資料批次的二進位格式
+
+與 static/sample_codec.js 對應。/record_emotion_batch 的請求 Content-Type 為 CONTENT_TYPE 時使用此格式，
+其餘仍以 JSON 處理。所有數值皆為 little-endian：
+
+    標頭（20 bytes）  magic 'EMS1'、uint32 學習階段、uint32 基準序號、float64 基準時間（epoch 毫秒）
+    每筆（37 bytes）  uint16 序號差、uint16 與前一筆的時間差（毫秒）、uint8 情緒代碼（EMOTION_LABELS 的索引）、
+                      uint8 專注度、uint8 信心度（0-255 對應 0-1）、uint16 取樣權重（毫秒）、
+                      7 個 float32 機率（NaN 表示沒有機率）
+
+安裝 numpy 時以 numpy.frombuffer 直接解讀請求內容，否則改用 struct 逐筆解析，結果相同。
+"""
+import math
+import struct
+
+from emotion_smoothing import EMOTION_LABELS, PROBABILITY_FORMAT
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+CONTENT_TYPE = 'application/x-emotion-samples'
+MAGIC = b'EMS1'
+HEADER_FORMAT = '<4sIId'
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+RECORD_FORMAT = '<HHBBBH7f'
+RECORD_SIZE = struct.calcsize(RECORD_FORMAT)
+PROBABILITY_OFFSET = struct.calcsize('<HHBBBH')
+PROBABILITY_SIZE = struct.calcsize(PROBABILITY_FORMAT)
+
+if np is not None:
+    RECORD_DTYPE = np.dtype([
+        ('seq_delta', '<u2'),
+        ('time_delta', '<u2'),
+        ('emotion', 'u1'),
+        ('attention', 'u1'),
+        ('confidence', 'u1'),
+        ('weight', '<u2'),
+        ('probabilities', '<f4', (len(EMOTION_LABELS),))
+    ])
+    assert RECORD_DTYPE.itemsize == RECORD_SIZE
+
+
+def decode_sample_batch(body):
+    """解析二進位批次，回傳 (學習階段, 資料清單)；格式錯誤時拋出 ValueError
+
+    每筆資料的欄位與 JSON 批次相同，但 emotion 為 None 表示代碼無效，
+    probabilities 已是 emotion_smoothing.PROBABILITY_FORMAT 的 bytes（直接取自請求內容），無效時為 None
+    """
+    if len(body) < HEADER_SIZE or (len(body) - HEADER_SIZE) % RECORD_SIZE:
+        raise ValueError('批次長度錯誤')
+    magic, session_id, base_seq, base_ts = struct.unpack_from(HEADER_FORMAT, body)
+    if magic != MAGIC or not math.isfinite(base_ts):
+        raise ValueError('不支援的批次格式')
+    count = (len(body) - HEADER_SIZE) // RECORD_SIZE
+    if np is not None:
+        columns = _decode_columns_numpy(body, count, base_seq, base_ts)
+    else:
+        columns = _decode_columns(body, base_seq, base_ts)
+
+    view = memoryview(body)
+    samples = []
+    for i, (seq, client_ts, code, attention, confidence, weight, valid) in enumerate(zip(*columns)):
+        offset = HEADER_SIZE + i * RECORD_SIZE + PROBABILITY_OFFSET
+        samples.append({
+            'seq': seq,
+            'client_ts': client_ts,
+            'emotion': EMOTION_LABELS[code] if code < len(EMOTION_LABELS) else None,
+            'attention_level': attention,
+            'confidence': confidence / 255,
+            'sample_weight': weight / 1000,
+            'probabilities': bytes(view[offset:offset + PROBABILITY_SIZE]) if valid else None
+        })
+    return session_id, samples
+
+
+def _decode_columns_numpy(body, count, base_seq, base_ts):
+    records = np.frombuffer(body, dtype=RECORD_DTYPE, count=count, offset=HEADER_SIZE)
+    probabilities = records['probabilities']
+    # NaN 與超出範圍的值比較結果皆為 False，視為沒有機率
+    valid = ((probabilities >= 0) & (probabilities <= 1)).all(axis=1)
+    return (
+        (records['seq_delta'].astype(np.int64) + base_seq).tolist(),
+        (np.cumsum(records['time_delta'], dtype=np.float64) + base_ts).tolist(),
+        records['emotion'].tolist(),
+        records['attention'].tolist(),
+        records['confidence'].tolist(),
+        records['weight'].tolist(),
+        valid.tolist()
+    )
+
+
+def _decode_columns(body, base_seq, base_ts):
+    columns = ([], [], [], [], [], [], [])
+    client_ts = base_ts
+    for seq_delta, time_delta, code, attention, confidence, weight, *probabilities in \
+            struct.iter_unpack(RECORD_FORMAT, memoryview(body)[HEADER_SIZE:]):
+        client_ts += time_delta
+        values = (base_seq + seq_delta, client_ts, code, attention, confidence, weight,
+                  all(0 <= probability <= 1 for probability in probabilities))
+        for column, value in zip(columns, values):
+            column.append(value)
+    return columns
@@ -0,0 +1,360 @@
+"""大量測試資料產生工具
+
+用於重現大量學習歷程下的效能問題：為指定數量的家長帳號與小孩產生
+數萬筆 StudySession 與數百萬筆 EmotionData，並可對主要頁面與報告進行計時。
+
+使用方式：
+    python seed_data.py seed --database sqlite:///bench.db --users 5 --sessions-per-child 10000
+    python seed_data.py bench --database sqlite:///bench.db --repeat 5
+    python seed_data.py bench-login --database sqlite:///bench.db --concurrency 30 --requests 120
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+
+# 各科目預設的選擇權重（會再依每個小孩的偏好隨機調整）
+SUBJECT_WEIGHTS = {
+    'math': 0.25,
+    'science': 0.18,
+    'language': 0.22,
+    'social': 0.12,
+    'art': 0.10,
+    'cs': 0.13
+}
+
+# 一天中各時段的學習機率（平日以放學後為主，假日分散於白天）
+WEEKDAY_HOURS = {6: 1, 7: 2, 16: 6, 17: 8, 18: 6, 19: 10, 20: 9, 21: 5, 22: 1}
+WEEKEND_HOURS = {8: 3, 9: 6, 10: 7, 11: 5, 14: 6, 15: 6, 16: 5, 19: 4, 20: 4, 21: 2}
+
+# 專注度對應可能出現的情緒（與前端 calculateAttentionFromEmotion 對應）
+ATTENTION_EMOTIONS = {
+    3: (['no emotion', 'happy'], [0.85, 0.15]),
+    2: (['happy', 'surprise', 'no emotion'], [0.45, 0.35, 0.20]),
+    1: (['anger', 'sad', 'fear', 'disgust'], [0.25, 0.30, 0.25, 0.20])
+}
+
+DURATION_CHOICES = [15, 20, 25, 30, 45, 60]
+EDUCATION_BY_AGE = [(12, 'elementary'), (15, 'middle'), (18, 'high')]
+
+
+def parse_args(argv=None):
+    """解析命令列參數"""
+    parser = argparse.ArgumentParser(description='產生大量學習歷程測試資料並進行頁面計時')
+    parser.add_argument('--database', default=os.environ.get('DATABASE_URL', 'sqlite:///bench.db'),
+                        help='目標資料庫 URI（預設 sqlite:///bench.db，避免寫入正式資料庫）')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    seed_parser = subparsers.add_parser('seed', help='產生測試資料')
+    seed_parser.add_argument('--users', type=int, default=2, help='家長帳號數量')
+    seed_parser.add_argument('--children-per-user', type=int, default=4, help='每個帳號的小孩數量（最多4個）')
+    seed_parser.add_argument('--sessions-per-child', type=int, default=1000, help='每個小孩的學習次數')
+    seed_parser.add_argument('--days', type=int, default=730, help='學習歷程涵蓋的天數')
+    seed_parser.add_argument('--sample-interval', type=int, default=1, help='情緒取樣間隔（秒），1 表示每秒一筆')
+    seed_parser.add_argument('--max-samples-per-session', type=int, default=0,
+                             help='每次學習最多產生的情緒資料筆數，0 表示不限制')
+    seed_parser.add_argument('--unfinished-ratio', type=float, default=0.02,
+                             help='未正常結束（end_time 為空）的學習比例')
+    seed_parser.add_argument('--batch-size', type=int, default=50000, help='每批寫入的資料筆數')
+    seed_parser.add_argument('--seed', type=int, default=42, help='亂數種子，便於重現相同資料')
+
+    bench_parser = subparsers.add_parser('bench', help='對主要頁面與報告進行計時')
+    bench_parser.add_argument('--child-id', type=int, default=0, help='指定小孩，預設選擇學習次數最多者')
+    bench_parser.add_argument('--repeat', type=int, default=3, help='每個頁面重複次數')
+    bench_parser.add_argument('--skip-report', action='store_true', help='不對 PDF 報告進行計時')
+
+    login_parser = subparsers.add_parser('bench-login', help='測量同時登入的吞吐量')
+    login_parser.add_argument('--concurrency', type=int, default=30, help='同時登入的使用者數')
+    login_parser.add_argument('--requests', type=int, default=120, help='登入請求總數')
+
+    return parser.parse_args(argv)
+
+
+def load_app(database_uri):
+    """依指定資料庫載入應用程式（需在匯入 app 前設定環境變數）
+
+    關閉背景工作與閒置學習回收：計時期間不應有 ANALYZE、資料清理或結束種子資料中未完成的學習
+    """
+    os.environ['DATABASE_URL'] = database_uri
+    os.environ['JOB_WORKER_ENABLED'] = '0'
+    os.environ['SESSION_IDLE_MINUTES'] = '0'
+    import app as app_module
+    return app_module
+
+
+def weighted_choice(rng, weights):
+    """依權重字典隨機選擇"""
+    keys = list(weights.keys())
+    return rng.choices(keys, weights=[weights[k] for k in keys])[0]
+
+
+def make_child_profile(rng):
+    """產生單一小孩的學習特性（基礎專注度、科目偏好、最佳時段）"""
+    subject_bias = {subject: rng.gauss(0, 0.3) for subject in SUBJECT_WEIGHTS}
+    subject_weights = {subject: weight * rng.uniform(0.5, 1.5) for subject, weight in SUBJECT_WEIGHTS.items()}
+    return {
+        'base_attention': rng.uniform(1.6, 2.6),
+        'subject_bias': subject_bias,
+        'subject_weights': subject_weights,
+        'best_hour': rng.choice([8, 10, 16, 19, 20]),
+        'stickiness': rng.uniform(0.85, 0.97)
+    }
+
+
+def session_mean_attention(rng, profile, subject, hour):
+    """計算單次學習的平均專注度（受科目偏好與時段影響）"""
+    hour_effect = 0.25 if abs(hour - profile['best_hour']) <= 1 else -0.05 * min(abs(hour - profile['best_hour']), 6)
+    mean = profile['base_attention'] + profile['subject_bias'][subject] + hour_effect + rng.gauss(0, 0.2)
+    return min(3.0, max(1.0, mean))
+
+
+def generate_samples(rng, profile, session_id, start_time, sample_count, interval, mean_attention):
+    """以馬可夫鏈產生一次學習的逐筆情緒資料，回傳資料列與平均值"""
+    rows = []
+    attention_sum = 0
+    confidence_sum = 0
+    # 以平均專注度決定各等級出現機率
+    high = max(0.0, mean_attention - 2)
+    low = max(0.0, 2 - mean_attention)
+    level_weights = [low, 1 - high - low, high]
+    attention = rng.choices([1, 2, 3], weights=level_weights)[0]
+
+    for index in range(sample_count):
+        if rng.random() > profile['stickiness']:
+            attention = rng.choices([1, 2, 3], weights=level_weights)[0]
+        emotions, emotion_weights = ATTENTION_EMOTIONS[attention]
+        emotion = rng.choices(emotions, weights=emotion_weights)[0]
+        confidence = round(0.6 + rng.random() * 0.35, 4)
+        attention_sum += attention
+        confidence_sum += confidence
+        rows.append({
+            'session_id': session_id,
+            'timestamp': start_time + timedelta(seconds=index * interval),
+            'emotion': emotion,
+            'attention_level': attention,
+            'confidence': confidence
+        })
+
+    if sample_count:
+        return rows, attention_sum / sample_count, confidence_sum / sample_count
+    return rows, None, None
+
+
+def flush(db, table, rows):
+    """以 Core executemany 批次寫入並清空暫存"""
+    if rows:
+        db.session.execute(table.insert(), rows)
+        db.session.commit()
+        rows.clear()
+
+
+def seed(app_module, args):
+    """產生測試資料"""
+    app, db = app_module.app, app_module.db
+    User, Child = app_module.User, app_module.Child
+    StudySession, EmotionData = app_module.StudySession, app_module.EmotionData
+    rng = random.Random(args.seed)
+    children_per_user = max(1, min(args.children_per_user, 4))
+    now = datetime.utcnow()
+    started = time.perf_counter()
+    session_total = 0
+    emotion_total = 0
+
+    with app.app_context():
+        db.create_all()
+        password_hash = app_module.hash_password_sync('password', app.config['BCRYPT_LOG_ROUNDS'])
+        run_tag = now.strftime('%Y%m%d%H%M%S')
+
+        # 預先取得最大 id，直接指定主鍵以避免逐筆回傳
+        next_session_id = (db.session.query(db.func.max(StudySession.id)).scalar() or 0) + 1
+        session_rows = []
+        emotion_rows = []
+
+        for user_index in range(args.users):
+            user = User(username=f'bench_{run_tag}_{user_index}',
+                        email=f'bench_{run_tag}_{user_index}@example.com',
+                        password_hash=password_hash)
+            db.session.add(user)
+            db.session.flush()
+
+            children = []
+            for child_index in range(children_per_user):
+                age = rng.randint(6, 18)
+                stage = next(stage for limit, stage in EDUCATION_BY_AGE if age <= limit)
+                child = Child(user_id=user.id, nickname=f'小孩{user_index}-{child_index}',
+                              gender=rng.choice(['male', 'female']), age=age, education_stage=stage)
+                db.session.add(child)
+                children.append(child)
+            db.session.commit()
+
+            for child in children:
+                profile = make_child_profile(rng)
+                for _ in range(args.sessions_per_child):
+                    day = now - timedelta(days=rng.randint(0, max(args.days - 1, 0)))
+                    hours = WEEKEND_HOURS if day.weekday() >= 5 else WEEKDAY_HOURS
+                    hour = weighted_choice(rng, hours)
+                    start_time = day.replace(hour=hour, minute=rng.randint(0, 59), second=rng.randint(0, 59), microsecond=0)
+                    subject = weighted_choice(rng, profile['subject_weights'])
+                    planned = rng.choice(DURATION_CHOICES)
+                    unfinished = rng.random() < args.unfinished_ratio
+
+                    # 實際學習時間在預定時間附近浮動，未完成者則提早中斷
+                    actual = max(1, int(planned * (rng.uniform(0.1, 0.6) if unfinished else rng.uniform(0.8, 1.0))))
+                    sample_count = actual * 60 // max(args.sample_interval, 1)
+                    if args.max_samples_per_session:
+                        sample_count = min(sample_count, args.max_samples_per_session)
+
+                    mean_attention = session_mean_attention(rng, profile, subject, hour)
+                    samples, avg_attention, avg_emotion = generate_samples(
+                        rng, profile, next_session_id, start_time, sample_count, args.sample_interval, mean_attention)
+
+                    session_rows.append({
+                        'id': next_session_id,
+                        'child_id': child.id,
+                        'subject': subject,
+                        'duration_minutes': planned if unfinished else actual,
+                        'start_time': start_time,
+                        'end_time': None if unfinished else start_time + timedelta(minutes=actual),
+                        'avg_attention': None if unfinished else avg_attention,
+                        'avg_emotion_score': None if unfinished else avg_emotion
+                    })
+                    emotion_rows.extend(samples)
+                    next_session_id += 1
+                    session_total += 1
+                    emotion_total += len(samples)
+
+                    # 學習記錄須先寫入，情緒資料才能參照
+                    if len(emotion_rows) >= args.batch_size or len(session_rows) >= args.batch_size:
+                        flush(db, StudySession.__table__, session_rows)
+                        flush(db, EmotionData.__table__, emotion_rows)
+
+            flush(db, StudySession.__table__, session_rows)
+            flush(db, EmotionData.__table__, emotion_rows)
+            print(f'帳號 {user.username} 完成：累計 {session_total} 次學習、{emotion_total} 筆情緒資料')
+
+    elapsed = time.perf_counter() - started
+    rate = emotion_total / elapsed if elapsed else 0
+    print(f'共產生 {args.users} 個帳號、{session_total} 次學習、{emotion_total} 筆情緒資料，'
+          f'耗時 {elapsed:.1f} 秒（{rate:,.0f} 筆/秒）')
+    print('所有測試帳號的密碼皆為 password')
+
+
+def bench(app_module, args):
+    """以測試用戶端對主要頁面與報告計時"""
+    app, db = app_module.app, app_module.db
+    Child, StudySession = app_module.Child, app_module.StudySession
+
+    with app.app_context():
+        if args.child_id:
+            child = db.session.get(Child, args.child_id)
+        else:
+            child_id = db.session.query(StudySession.child_id).group_by(StudySession.child_id) \
+                .order_by(db.func.count(StudySession.id).desc()).limit(1).scalar()
+            child = db.session.get(Child, child_id) if child_id else None
+        if not child:
+            print('找不到可供計時的小孩，請先執行 seed')
+            return 1
+        session_count = StudySession.query.filter_by(child_id=child.id).count()
+        user_id, child_id, nickname = child.user_id, child.id, child.nickname
+
+    now = datetime.utcnow()
+    routes = [
+        '/dashboard',
+        '/data_analysis',
+        '/smart_suggestions',
+        f'/get_calendar_data?year={now.year}&month={now.month}'
+    ]
+    if not args.skip_report:
+        routes.append(f'/generate_report/{child_id}')
+
+    reports_before = set(os.listdir('reports')) if os.path.isdir('reports') else set()
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['user_id'] = user_id
+        sess['child_id'] = child_id
+        sess['child_nickname'] = nickname
+
+    print(f'計時對象：小孩 {child_id}（{session_count} 次學習），每個頁面重複 {args.repeat} 次')
+    for route in routes:
+        timings = []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            response = client.get(route)
+            response.get_data()
+            timings.append((time.perf_counter() - started) * 1000)
+            response.close()
+        print(f'{route:<45} 狀態 {response.status_code}  中位數 {statistics.median(timings):9.1f} ms  '
+              f'最大 {max(timings):9.1f} ms')
+
+    # 清除計時過程產生的報告檔
+    if os.path.isdir('reports'):
+        for filename in set(os.listdir('reports')) - reports_before:
+            os.remove(os.path.join('reports', filename))
+    return 0
+
+
+def bench_login(app_module, args):
+    """以多個執行緒同時登入，模擬早上的登入尖峰"""
+    app, db, User = app_module.app, app_module.db, app_module.User
+    username = f'bench_login_{datetime.utcnow().strftime("%Y%m%d%H%M%S")}'
+
+    with app.app_context():
+        db.create_all()
+        db.session.add(User(username=username, email=f'{username}@example.com',
+                            password_hash=app_module.hash_password_sync('password', app.config['BCRYPT_LOG_ROUNDS'])))
+        db.session.commit()
+
+    latencies = []
+    statuses = {}
+    lock = threading.Lock()
+    per_thread = [args.requests // args.concurrency + (1 if i < args.requests % args.concurrency else 0)
+                  for i in range(args.concurrency)]
+
+    def worker(count):
+        client = app.test_client()
+        for _ in range(count):
+            started = time.perf_counter()
+            response = client.post('/login', json={'username': username, 'password': 'password'})
+            elapsed = (time.perf_counter() - started) * 1000
+            with lock:
+                latencies.append(elapsed)
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    threads = [threading.Thread(target=worker, args=(count,)) for count in per_thread]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    print(f'rounds={app.config["BCRYPT_LOG_ROUNDS"]} workers={app.config["PASSWORD_HASH_WORKERS"]} '
+          f'concurrency={args.concurrency}：{len(latencies)} 次登入耗時 {elapsed:.2f} 秒，'
+          f'{len(latencies) / elapsed:.1f} 次/秒，中位數 {statistics.median(latencies):.0f} ms，p95 {p95:.0f} ms，'
+          f'狀態 {statuses}')
+
+    with app.app_context():
+        User.query.filter_by(username=username).delete()
+        db.session.commit()
+    return 0
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    app_module = load_app(args.database)
+    if args.command == 'seed':
+        seed(app_module, args)
+        return 0
+    if args.command == 'bench-login':
+        return bench_login(app_module, args)
+    return bench(app_module, args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,362 @@
+"""多個程序或多台主機共用的後端
+
+分析快取、進行中學習階段的登錄表、限流的權杖桶與 PDF 報告在多個程序之間必須共用，由 SHARED_BACKEND_URL 選擇：
+
+    （空白）          程序記憶體與本機 reports/ 目錄，只適用單一程序
+    redis://...       Redis 或相容的伺服器（需安裝 redis 套件，pip install redis）
+    file:///路徑      共用目錄，同一台主機上的多個程序或網路磁碟使用，也作為沒有 Redis 時的本機測試環境
+
+登入狀態存在簽章的 cookie 中，各主機設定相同的 SECRET_KEY 即可共用，不需要額外的 session 儲存。
+"""
+import contextlib
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from urllib.parse import urlparse
+from urllib.request import url2pathname
+
+from live_sessions import LiveSession, MemoryRegistry, RedisRegistry
+from rate_limits import BUCKET_IDLE_SECONDS, PRUNE_INTERVAL_SECONDS, MemoryRateLimiter, RedisRateLimiter
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+# 檔案鎖持有超過此時間視為程序中斷後遺留，直接移除
+FILE_LOCK_STALE_SECONDS = 30
+FILE_LOCK_TIMEOUT_SECONDS = 5
+
+
+class SharedBackend:
+    """依設定建立的一組共用元件"""
+
+    def __init__(self, kind, cache, registry, rate_limiter, reports):
+        self.kind = kind
+        self.cache = cache
+        self.registry = registry
+        self.rate_limiter = rate_limiter
+        self.reports = reports
+
+
+# 共用目錄的檔案操作
+def key_filename(key):
+    """任意字串鍵對應的檔名（雜湊後不受鍵中的 : / 等字元影響）"""
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
+def atomic_write(path, data):
+    """寫入暫存檔後以 os.replace 取代，其他程序不會讀到寫到一半的內容"""
+    directory = os.path.dirname(path)
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(temp_path)
+        raise
+
+
+def read_json(path):
+    """讀取 JSON 檔，不存在時回傳 None"""
+    try:
+        with open(path, 'rb') as f:
+            return json.loads(f.read())
+    except FileNotFoundError:
+        return None
+
+
+@contextlib.contextmanager
+def file_lock(path):
+    """跨程序的互斥鎖：以建立目錄取得（各平台與網路磁碟上 mkdir 都是原子操作）"""
+    lock_path = path + '.lock'
+    deadline = time.monotonic() + FILE_LOCK_TIMEOUT_SECONDS
+    while True:
+        try:
+            os.mkdir(lock_path)
+            break
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(lock_path) > FILE_LOCK_STALE_SECONDS:
+                    os.rmdir(lock_path)
+                    continue
+            except OSError:
+                pass    # 鎖剛好被釋放
+            if time.monotonic() > deadline:
+                raise TimeoutError(f'無法取得檔案鎖 {lock_path}')
+            time.sleep(0.002)
+    try:
+        yield
+    finally:
+        with contextlib.suppress(OSError):
+            os.rmdir(lock_path)
+
+
+def json_files(directory):
+    """目錄中的 JSON 檔內容（讀取時已被刪除的檔案略過）"""
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return []
+    values = []
+    for name in names:
+        if name.endswith('.json'):
+            value = read_json(os.path.join(directory, name))
+            if value is not None:
+                values.append(value)
+    return values
+
+
+# 快取：值皆以 JSON 儲存，取出的是新的物件，修改時不會影響快取內容
+class MemoryCache:
+    def __init__(self):
+        self.entries = {}    # 鍵: (JSON, 到期時間或 None)
+        self.lock = threading.Lock()
+        self.last_prune = time.monotonic()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+        if entry is None or (entry[1] is not None and entry[1] <= time.monotonic()):
+            return None
+        return json.loads(entry[0])
+
+    def set(self, key, value, ttl=None):
+        now = time.monotonic()
+        with self.lock:
+            self.entries[key] = (json.dumps(value), now + ttl if ttl else None)
+            if now - self.last_prune >= PRUNE_INTERVAL_SECONDS:
+                self.last_prune = now
+                for expired in [key for key, (_, expires) in self.entries.items() if expires is not None and expires <= now]:
+                    del self.entries[expired]
+
+    def incr(self, key):
+        with self.lock:
+            value = json.loads(self.entries[key][0]) + 1 if key in self.entries else 1
+            self.entries[key] = (json.dumps(value), None)
+            return value
+
+
+class RedisCache:
+    def __init__(self, client, prefix='cache'):
+        self.client = client
+        self.prefix = prefix
+
+    def get(self, key):
+        value = self.client.get(f'{self.prefix}:{key}')
+        return json.loads(value) if value is not None else None
+
+    def set(self, key, value, ttl=None):
+        self.client.set(f'{self.prefix}:{key}', json.dumps(value), ex=int(ttl) if ttl else None)
+
+    def incr(self, key):
+        return self.client.incr(f'{self.prefix}:{key}')
+
+
+class FileCache:
+    """每個鍵一個 JSON 檔（{'value': 值, 'expires': 到期的 epoch 秒或 None}）"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.last_prune = time.monotonic()
+
+    def path(self, key):
+        return os.path.join(self.directory, key_filename(key) + '.json')
+
+    def get(self, key):
+        entry = read_json(self.path(key))
+        if entry is None or (entry['expires'] is not None and entry['expires'] <= time.time()):
+            return None
+        return entry['value']
+
+    def set(self, key, value, ttl=None):
+        entry = {'value': value, 'expires': time.time() + ttl if ttl else None}
+        atomic_write(self.path(key), json.dumps(entry).encode('utf-8'))
+        if time.monotonic() - self.last_prune >= PRUNE_INTERVAL_SECONDS:
+            self.prune()
+
+    def incr(self, key):
+        path = self.path(key)
+        with file_lock(path):
+            entry = read_json(path)
+            value = entry['value'] + 1 if entry else 1
+            atomic_write(path, json.dumps({'value': value, 'expires': None}).encode('utf-8'))
+        return value
+
+    def prune(self):
+        self.last_prune = time.monotonic()
+        now = time.time()
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            with contextlib.suppress(OSError, ValueError):
+                entry = read_json(path) if name.endswith('.json') else None
+                if entry and entry['expires'] is not None and entry['expires'] <= now:
+                    os.remove(path)
+
+
+class FileRegistry:
+    """進行中學習階段的登錄表，每個學習階段一個 JSON 檔；列表與閒置查詢需讀取所有檔案，適用於測試與小型部署"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, session_id):
+        return os.path.join(self.directory, f'{int(session_id)}.json')
+
+    def write(self, live):
+        atomic_write(self.path(live.id), json.dumps(live.to_dict()).encode('utf-8'))
+
+    def open(self, live):
+        with file_lock(self.path(live.id)):
+            self.write(live)
+
+    def get(self, session_id):
+        values = read_json(self.path(session_id))
+        return LiveSession(**values) if values else None
+
+    def record(self, session_id, sample_count, weight, attention_sum, confidence_sum, emotion, attention, now):
+        path = self.path(session_id)
+        with file_lock(path):
+            values = read_json(path)
+            if values is None:
+                return False
+            live = LiveSession(**values)
+            live.sample_count += sample_count
+            live.weight_sum += weight
+            live.attention_sum += attention_sum
+            live.confidence_sum += confidence_sum
+            if emotion is not None:
+                live.last_emotion = emotion
+                live.last_attention = attention
+            live.last_seen = max(live.last_seen, now)
+            self.write(live)
+            return True
+
+    def close(self, session_id):
+        path = self.path(session_id)
+        with file_lock(path), contextlib.suppress(FileNotFoundError):
+            os.remove(path)
+
+    def list(self, user_id=None):
+        sessions = [LiveSession(**values) for values in json_files(self.directory)]
+        return [live for live in sessions if user_id is None or live.user_id == user_id]
+
+    def idle(self, cutoff):
+        return [live for live in self.list() if live.last_seen < cutoff]
+
+
+class FileRateLimiter:
+    """權杖桶存在共用目錄中，每個鍵一個 JSON 檔；以各主機的時鐘計算補充量，時鐘需同步"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.last_prune = time.monotonic()
+
+    def take(self, key, rate, burst, cost=1):
+        if rate <= 0:
+            return 0.0
+        cost = min(cost, burst)
+        path = os.path.join(self.directory, key_filename(key) + '.json')
+        with file_lock(path):
+            now = time.time()
+            tokens, updated = read_json(path) or (burst, now)
+            tokens = min(burst, tokens + max(0.0, now - updated) * rate)
+            if tokens >= cost:
+                tokens -= cost
+                wait = 0.0
+            else:
+                wait = (cost - tokens) / rate
+            atomic_write(path, json.dumps([tokens, now]).encode('utf-8'))
+        if time.monotonic() - self.last_prune >= PRUNE_INTERVAL_SECONDS:
+            self.prune()
+        return wait
+
+    def prune(self):
+        self.last_prune = time.monotonic()
+        cutoff = time.time() - BUCKET_IDLE_SECONDS
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            with contextlib.suppress(OSError):
+                if name.endswith('.json') and os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+
+
+# 報告：產生報告的主機存入，任何主機都能取出
+class LocalReportStore:
+    """報告存在目錄中（單一主機為 reports/，多個程序時為共用目錄），過期的由背景工作清除"""
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def save(self, name, data, ttl=None):
+        os.makedirs(self.directory, exist_ok=True)
+        atomic_write(os.path.join(self.directory, name), data)
+
+    def load(self, name):
+        try:
+            with open(os.path.join(self.directory, name), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def cleanup(self, cutoff):
+        """刪除修改時間早於 cutoff（epoch 秒）的 PDF 報告與圖表檔"""
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return
+        for name in names:
+            path = os.path.join(self.directory, name)
+            with contextlib.suppress(OSError):
+                if name.endswith(('.pdf', '.png')) and os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+
+
+class RedisReportStore:
+    """報告存在 Redis 中，到期後自動刪除；client 不可設定 decode_responses"""
+
+    def __init__(self, client, prefix='report'):
+        self.client = client
+        self.prefix = prefix
+
+    def save(self, name, data, ttl=None):
+        self.client.set(f'{self.prefix}:{name}', data, ex=int(ttl) if ttl else None)
+
+    def load(self, name):
+        return self.client.get(f'{self.prefix}:{name}')
+
+    def cleanup(self, cutoff):
+        pass    # 由 Redis 依 TTL 刪除
+
+
+def create_shared_backend(url='', report_dir='reports'):
+    """依 SHARED_BACKEND_URL 建立共用元件
+
+    設定的後端無法建立時（例如未安裝 redis 套件）直接拋出 RuntimeError，不改用程序記憶體：
+    否則各主機會在沒有任何錯誤的情況下各自保存快取、登錄表、限流與報告
+    """
+    parsed = urlparse(url)
+    if parsed.scheme in ('redis', 'rediss', 'unix'):
+        if redis is None:
+            raise RuntimeError(f'SHARED_BACKEND_URL 設定為 {url}，但未安裝 redis 套件（pip install redis）')
+        client = redis.Redis.from_url(url, decode_responses=True)
+        return SharedBackend('redis', RedisCache(client), RedisRegistry(client), RedisRateLimiter(client),
+                             RedisReportStore(redis.Redis.from_url(url)))
+    if parsed.scheme == 'file':
+        root = url2pathname(parsed.path)
+        return SharedBackend('file',
+                             FileCache(os.path.join(root, 'cache')),
+                             FileRegistry(os.path.join(root, 'live_sessions')),
+                             FileRateLimiter(os.path.join(root, 'rate_limits')),
+                             LocalReportStore(os.path.join(root, 'reports')))
+    if url:
+        raise ValueError(f'不支援的 SHARED_BACKEND_URL：{url}')
+    return SharedBackend('memory', MemoryCache(), MemoryRegistry(), MemoryRateLimiter(), LocalReportStore(report_dir))
@@ -0,0 +1,153 @@
+// static/detection_worker.js
+// 情緒辨識 Web Worker：在背景執行緒完成臉部偵測、裁切與情緒分類，主執行緒只接收結果
+
+// 建置後的 Worker 已合併這兩個檔案
+if (typeof FaceTracker === 'undefined') {
+    importScripts('face_tracker.js', 'emotion_classifier.js');
+}
+
+let emotionModel = null;
+let faceDetector = null;
+let emotionLabels = [];
+
+// 兩次完整偵測之間的臉部追蹤
+const faceTracker = new FaceTracker();
+let trackingCanvas = null;
+let trackingCtx = null;
+
+self.onmessage = async function(event) {
+    const message = event.data;
+
+    if (message.type === 'init') {
+        await initWorker(message);
+    } else if (message.type === 'detect') {
+        await detectFrame(message);
+    }
+};
+
+// 初始化模型與裁切畫布
+async function initWorker(message) {
+    emotionLabels = message.labels;
+
+    let backend = null;
+    try {
+        importScripts(message.tfUrl);
+        loadWasmBackend(message);
+        emotionModel = await loadEmotionModel(message.modelUrl, message.modelVersion);
+        backend = await selectEmotionBackend(emotionModel, message.backend);
+    } catch (error) {
+        console.warn('Worker 無法載入情緒分類模型:', error);
+        emotionModel = null;
+    }
+
+    // 瀏覽器支援 Shape Detection API 時，臉部偵測也在 Worker 中執行
+    if ('FaceDetector' in self) {
+        try {
+            faceDetector = new FaceDetector({ fastMode: true, maxDetectedFaces: 3 });
+        } catch (error) {
+            faceDetector = null;
+        }
+    }
+
+    trackingCanvas = new OffscreenCanvas(TRACKING_FRAME_WIDTH, TRACKING_FRAME_HEIGHT);
+    trackingCtx = trackingCanvas.getContext('2d', { willReadFrequently: true });
+
+    self.postMessage({
+        type: 'ready',
+        id: message.id,
+        modelLoaded: emotionModel !== null,
+        faceDetector: faceDetector !== null,
+        backend
+    });
+}
+
+// WASM 後端為選用，載入失敗時只比較其餘後端
+function loadWasmBackend(message) {
+    if (!message.wasmUrl) return;
+    try {
+        importScripts(message.wasmUrl);
+        tf.wasm.setWasmPaths(message.wasmPaths);
+    } catch (error) {
+        console.warn('Worker 無法載入 WASM 後端:', error);
+    }
+}
+
+// 取得臉部邊界框（與 MediaPipe 相同的相對座標格式）
+async function getFaceBoxes(bitmap, faces) {
+    if (faceDetector) {
+        const detected = await faceDetector.detect(bitmap);
+        return detected.map(face => ({
+            xCenter: (face.boundingBox.x + face.boundingBox.width / 2) / bitmap.width,
+            yCenter: (face.boundingBox.y + face.boundingBox.height / 2) / bitmap.height,
+            width: face.boundingBox.width / bitmap.width,
+            height: face.boundingBox.height / bitmap.height
+        }));
+    }
+
+    // 主執行緒傳來的 MediaPipe 結果
+    return faces || [];
+}
+
+// 縮小為灰階畫面供追蹤使用
+function captureTrackingFrame(bitmap) {
+    trackingCtx.drawImage(bitmap, 0, 0, TRACKING_FRAME_WIDTH, TRACKING_FRAME_HEIGHT);
+    return FaceTracker.toGray(trackingCtx.getImageData(0, 0, TRACKING_FRAME_WIDTH, TRACKING_FRAME_HEIGHT));
+}
+
+// 處理單一畫面：mode 為 'detect'（完整偵測）或 'track'（沿用上次的臉部位置）
+async function detectFrame(message) {
+    const bitmap = message.bitmap;
+
+    try {
+        const gray = captureTrackingFrame(bitmap);
+        let box = null;
+        let faceCount = 0;
+        let tracked = false;
+
+        if (message.mode === 'track') {
+            box = faceTracker.track(gray);
+            if (box) {
+                faceCount = 1;
+                tracked = true;
+            } else if (!faceDetector) {
+                // 追蹤失敗且 Worker 無法自行偵測，請主執行緒改做完整偵測
+                self.postMessage({ type: 'result', id: message.id, trackLost: true });
+                return;
+            }
+        }
+
+        if (!tracked) {
+            const boxes = await getFaceBoxes(bitmap, message.faces);
+            faceCount = boxes.length;
+            if (faceCount === 1) {
+                box = boxes[0];
+                faceTracker.init(gray, box);
+            } else {
+                faceTracker.reset();
+            }
+        }
+
+        if (faceCount !== 1 || !emotionModel) {
+            self.postMessage({ type: 'result', id: message.id, faceCount, tracked });
+            return;
+        }
+
+        // TensorFlow 情緒預測（裁切縮放在 GPU 上完成）
+        const predictions = await classifyEmotion(emotionModel, bitmap, box);
+        const emotionIndex = argMax(predictions);
+
+        self.postMessage({
+            type: 'result',
+            id: message.id,
+            faceCount: 1,
+            emotion: emotionLabels[emotionIndex],
+            confidence: predictions[emotionIndex],
+            probabilities: Array.from(predictions),
+            tracked
+        });
+    } catch (error) {
+        self.postMessage({ type: 'result', id: message.id, error: error.message });
+    } finally {
+        bitmap.close();
+    }
+}
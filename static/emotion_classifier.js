@@ -0,0 +1,151 @@
+// static/emotion_classifier.js
+// 情緒分類前處理與推論：整段包在 tf.tidy 中，於 GPU 上直接裁切縮放，不經過裁切畫布
+// 同時供主執行緒（<script>）、辨識 Worker（importScripts）與效能測試頁使用
+
+const EMOTION_INPUT_SIZE = 112;
+const MODEL_CACHE_PREFIX = 'indexeddb://emotion-model-';
+
+// 以模型版本（model.json 的內容雜湊）為鍵快取在 IndexedDB，再次開啟時不必重新下載
+// 沒有版本（尚未執行 build_assets.py）時直接由網址載入，避免使用過期的快取
+async function loadEmotionModel(url, version) {
+    if (!version) {
+        return await tf.loadLayersModel(url);
+    }
+
+    const cacheKey = MODEL_CACHE_PREFIX + version;
+    try {
+        const cachedModels = await tf.io.listModels();
+        if (cachedModels[cacheKey]) {
+            return await tf.loadLayersModel(cacheKey);
+        }
+    } catch (error) {
+        console.warn('無法讀取模型快取:', error);
+    }
+
+    const model = await tf.loadLayersModel(url);
+    try {
+        await model.save(cacheKey);
+        // 移除舊版本
+        const cachedModels = await tf.io.listModels();
+        for (const key of Object.keys(cachedModels)) {
+            if (key.startsWith(MODEL_CACHE_PREFIX) && key !== cacheKey) {
+                await tf.io.removeModel(key);
+            }
+        }
+    } catch (error) {
+        console.warn('無法寫入模型快取:', error);
+    }
+    return model;
+}
+
+// 將 MediaPipe 相對座標邊界框轉為 cropAndResize 的 [y1, x1, y2, x2]
+function toCropBox(box) {
+    return [
+        box.yCenter - box.height / 2,
+        box.xCenter - box.width / 2,
+        box.yCenter + box.height / 2,
+        box.xCenter + box.width / 2
+    ];
+}
+
+// 回傳七類情緒機率（Float32Array）；模型已含 Rescaling(1./255)，這裡不再正規化
+async function classifyEmotion(model, source, box) {
+    const output = tf.tidy(() => {
+        const frame = tf.browser.fromPixels(source).expandDims(0).toFloat();
+        const crop = tf.image.cropAndResize(
+            frame,
+            [toCropBox(box)],
+            [0],
+            [EMOTION_INPUT_SIZE, EMOTION_INPUT_SIZE]
+        );
+        return model.predict(crop);
+    });
+
+    try {
+        return await output.data();
+    } finally {
+        output.dispose();
+    }
+}
+
+// 取最大機率的類別，避免建立陣列與展開運算
+function argMax(predictions) {
+    let index = 0;
+    for (let i = 1; i < predictions.length; i++) {
+        if (predictions[i] > predictions[index]) {
+            index = i;
+        }
+    }
+    return index;
+}
+
+// 載入後先推論一次，讓 WebGL 著色器編譯與記憶體配置不落在第一個真實畫面上
+function warmUpEmotionModel(model) {
+    tf.tidy(() => {
+        const frame = tf.zeros([1, EMOTION_INPUT_SIZE * 2, EMOTION_INPUT_SIZE * 2, 3]);
+        const crop = tf.image.cropAndResize(
+            frame,
+            [[0.25, 0.25, 0.75, 0.75]],
+            [0],
+            [EMOTION_INPUT_SIZE, EMOTION_INPUT_SIZE]
+        );
+        model.predict(crop).dataSync();
+    });
+}
+
+// 後端選擇：在可用的後端上各計時數次推論，採用最快的一個
+const BACKEND_CANDIDATES = ['webgl', 'wasm', 'cpu'];
+const BACKEND_PROBE_RUNS = 5;
+
+// 暖機後的推論耗時中位數（毫秒）
+function timeEmotionInference(model) {
+    warmUpEmotionModel(model);
+    const timings = [];
+    for (let i = 0; i < BACKEND_PROBE_RUNS; i++) {
+        const start = performance.now();
+        tf.tidy(() => {
+            model.predict(tf.zeros([1, EMOTION_INPUT_SIZE, EMOTION_INPUT_SIZE, 3])).dataSync();
+        });
+        timings.push(performance.now() - start);
+    }
+    timings.sort((a, b) => a - b);
+    return timings[Math.floor(timings.length / 2)];
+}
+
+// 回報用的後端名稱，WASM 附上 SIMD / 多執行緒支援
+async function describeBackend(name) {
+    if (name !== 'wasm') {
+        return name;
+    }
+    const simd = await tf.env().getAsync('WASM_HAS_SIMD_SUPPORT').catch(() => false);
+    const threads = await tf.env().getAsync('WASM_HAS_MULTITHREAD_SUPPORT').catch(() => false);
+    return name + (simd ? '-simd' : '') + (threads ? '-threads' : '');
+}
+
+// preferred 為先前快取的選擇：仍可用時只計時該後端，否則重新比較所有後端
+async function selectEmotionBackend(model, preferred) {
+    const available = BACKEND_CANDIDATES.filter(name => tf.findBackendFactory(name));
+    const candidates = available.includes(preferred) ? [preferred] : available;
+    let best = null;
+
+    for (const name of candidates) {
+        try {
+            if (!(await tf.setBackend(name))) continue;
+            await tf.ready();
+            const inferenceMs = timeEmotionInference(model);
+            if (!best || inferenceMs < best.inferenceMs) {
+                best = { backend: name, inferenceMs };
+            }
+        } catch (error) {
+            console.warn(`TF.js 後端 ${name} 無法使用:`, error);
+        }
+    }
+
+    if (!best) {
+        return null;
+    }
+    await tf.setBackend(best.backend);
+    best.label = await describeBackend(best.backend);
+    best.probed = candidates.length > 1;
+    return best;
+}
@@ -0,0 +1,70 @@
+// static/emotion_smoothing.js
+// 情緒訊號的時間平滑：七類機率以依取樣間隔調整的指數移動平均（EMA）平滑，
+// 專注度由平滑後的機率分布求期望值，避免單一畫面的雜訊造成燈號閃爍
+// 與伺服器的 emotion_smoothing.py 使用相同的演算法與常數，修改時兩邊必須一起更新
+
+const SMOOTHING_TIME_CONSTANT_MS = 3000;
+
+// 各情緒對應的專注度（1-低, 2-中, 3-高）
+const ATTENTION_BY_EMOTION = {
+    'anger': 1,
+    'disgust': 1,
+    'fear': 1,
+    'happy': 2,
+    'no emotion': 3,
+    'sad': 1,
+    'surprise': 2
+};
+
+// 平滑後機率分布的專注度期望值，四捨五入為 1-3
+function attentionFromDistribution(labels, probabilities) {
+    let expected = 0;
+    let total = 0;
+    for (let i = 0; i < labels.length; i++) {
+        expected += probabilities[i] * ATTENTION_BY_EMOTION[labels[i]];
+        total += probabilities[i];
+    }
+    if (total <= 0) {
+        return 2;
+    }
+    return Math.min(3, Math.max(1, Math.floor(expected / total + 0.5)));
+}
+
+class EmotionSmoother {
+    constructor(labels, timeConstantMs = SMOOTHING_TIME_CONSTANT_MS) {
+        this.labels = labels;
+        this.timeConstantMs = timeConstantMs;
+        this.reset();
+    }
+
+    reset() {
+        this.state = null;
+        this.lastTimestamp = null;
+    }
+
+    // 取樣間隔越長，新資料的權重越高；間隔遠大於時間常數時等同重新開始
+    update(probabilities, timestamp) {
+        if (this.state === null) {
+            this.state = Array.from(probabilities);
+        } else {
+            const elapsed = Math.max(0, timestamp - this.lastTimestamp);
+            const alpha = 1 - Math.exp(-elapsed / this.timeConstantMs);
+            for (let i = 0; i < this.state.length; i++) {
+                this.state[i] += alpha * (probabilities[i] - this.state[i]);
+            }
+        }
+        this.lastTimestamp = timestamp;
+
+        let index = 0;
+        for (let i = 1; i < this.state.length; i++) {
+            if (this.state[i] > this.state[index]) {
+                index = i;
+            }
+        }
+        return {
+            emotion: this.labels[index],
+            confidence: this.state[index],
+            attention: attentionFromDistribution(this.labels, this.state)
+        };
+    }
+}
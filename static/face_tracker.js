@@ -0,0 +1,111 @@
+// static/face_tracker.js
+// 輕量臉部追蹤：在兩次完整臉部偵測之間，以縮小灰階畫面的模板比對（SAD）追蹤邊界框
+// 同時供主執行緒（<script>）與辨識 Worker（importScripts）使用
+
+const TRACKING_FRAME_WIDTH = 80;
+const TRACKING_FRAME_HEIGHT = 60;
+
+class FaceTracker {
+    constructor(options = {}) {
+        this.searchRadius = options.searchRadius || 6;   // 搜尋範圍（縮小畫面的像素）
+        this.maxError = options.maxError || 18;          // 平均灰階差超過此值視為追蹤失敗
+        this.reset();
+    }
+
+    reset() {
+        this.template = null;
+        this.box = null;
+        this.rect = null;
+    }
+
+    get active() {
+        return this.template !== null;
+    }
+
+    // 將 RGBA 像素轉為灰階
+    static toGray(imageData) {
+        const pixels = imageData.data;
+        const gray = new Uint8Array(imageData.width * imageData.height);
+        for (let i = 0, j = 0; j < gray.length; i += 4, j++) {
+            gray[j] = (pixels[i] * 77 + pixels[i + 1] * 150 + pixels[i + 2] * 29) >> 8;
+        }
+        return gray;
+    }
+
+    // box 與 MediaPipe 相同格式：{xCenter, yCenter, width, height}，皆為 0-1 相對座標
+    boxToRect(box) {
+        const width = Math.max(4, Math.round(box.width * TRACKING_FRAME_WIDTH));
+        const height = Math.max(4, Math.round(box.height * TRACKING_FRAME_HEIGHT));
+        const x = Math.round(box.xCenter * TRACKING_FRAME_WIDTH - width / 2);
+        const y = Math.round(box.yCenter * TRACKING_FRAME_HEIGHT - height / 2);
+        return {
+            x: Math.min(Math.max(0, x), TRACKING_FRAME_WIDTH - width),
+            y: Math.min(Math.max(0, y), TRACKING_FRAME_HEIGHT - height),
+            width: Math.min(width, TRACKING_FRAME_WIDTH),
+            height: Math.min(height, TRACKING_FRAME_HEIGHT)
+        };
+    }
+
+    extractPatch(gray, rect) {
+        const patch = new Uint8Array(rect.width * rect.height);
+        for (let row = 0; row < rect.height; row++) {
+            const start = (rect.y + row) * TRACKING_FRAME_WIDTH + rect.x;
+            patch.set(gray.subarray(start, start + rect.width), row * rect.width);
+        }
+        return patch;
+    }
+
+    // 以完整偵測的結果初始化模板
+    init(gray, box) {
+        this.box = { ...box };
+        this.rect = this.boxToRect(box);
+        this.template = this.extractPatch(gray, this.rect);
+    }
+
+    // 在上一個位置附近搜尋最相似的區塊，失敗時回傳 null
+    track(gray) {
+        if (!this.active) return null;
+
+        const { width, height } = this.rect;
+        let bestError = Infinity;
+        let bestX = this.rect.x;
+        let bestY = this.rect.y;
+
+        for (let dy = -this.searchRadius; dy <= this.searchRadius; dy++) {
+            const y = this.rect.y + dy;
+            if (y < 0 || y + height > TRACKING_FRAME_HEIGHT) continue;
+
+            for (let dx = -this.searchRadius; dx <= this.searchRadius; dx++) {
+                const x = this.rect.x + dx;
+                if (x < 0 || x + width > TRACKING_FRAME_WIDTH) continue;
+
+                let error = 0;
+                for (let row = 0; row < height && error < bestError; row++) {
+                    const frameOffset = (y + row) * TRACKING_FRAME_WIDTH + x;
+                    const templateOffset = row * width;
+                    for (let col = 0; col < width; col++) {
+                        error += Math.abs(gray[frameOffset + col] - this.template[templateOffset + col]);
+                    }
+                }
+
+                if (error < bestError) {
+                    bestError = error;
+                    bestX = x;
+                    bestY = y;
+                }
+            }
+        }
+
+        if (bestError / (width * height) > this.maxError) {
+            this.reset();
+            return null;
+        }
+
+        // 以新位置更新模板，跟隨臉部外觀的緩慢變化
+        this.box.xCenter += (bestX - this.rect.x) / TRACKING_FRAME_WIDTH;
+        this.box.yCenter += (bestY - this.rect.y) / TRACKING_FRAME_HEIGHT;
+        this.rect = { x: bestX, y: bestY, width, height };
+        this.template = this.extractPatch(gray, this.rect);
+        return { ...this.box };
+    }
+}
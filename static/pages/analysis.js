@@ -0,0 +1,31 @@
+// static/pages/analysis.js
+// 數據分析頁面的學習記錄管理，由 script.js 以 import() 載入
+
+// 頁面上的刪除按鈕以 onclick 呼叫
+export function init() {
+    window.deleteStudySession = deleteStudySession;
+}
+
+// 刪除學習記錄
+async function deleteStudySession(sessionId) {
+    if (!confirm('確定要刪除這次學習記錄嗎？')) {
+        return;
+    }
+    
+    try {
+        const response = await fetch(`/delete_session/${sessionId}`, {
+            method: 'POST'
+        });
+        
+        const result = await response.json();
+        
+        if (result.success) {
+            // 重新載入頁面以更新資料
+            window.location.reload();
+        } else {
+            alert('刪除失敗：' + result.message);
+        }
+    } catch (error) {
+        alert('刪除失敗，請稍後再試');
+    }
+}
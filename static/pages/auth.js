@@ -0,0 +1,134 @@
+// static/pages/auth.js
+// 註冊與登入頁面的表單處理，由 script.js 以 import() 載入
+
+// 依頁面初始化表單
+export function init(page) {
+    if (page === 'register') {
+        initRegisterPage();
+    } else if (page === 'login') {
+        initLoginPage();
+    }
+}
+
+// 註冊頁面初始化
+function initRegisterPage() {
+    const form = document.getElementById('registerForm');
+    if (form) {
+        form.addEventListener('submit', handleRegister);
+    }
+    
+    // 年齡驗證 - 移除自動修正
+    const ageInput = document.getElementById('age');
+    if (ageInput) {
+        ageInput.addEventListener('blur', function() {
+            const age = parseInt(this.value);
+            if (isNaN(age) || age < 6 || age > 18) {
+                this.setCustomValidity('年齡必須在6-18歲之間');
+            } else {
+                this.setCustomValidity('');
+            }
+        });
+    }
+}
+
+// 登入頁面初始化
+function initLoginPage() {
+    const form = document.getElementById('loginForm');
+    if (form) {
+        form.addEventListener('submit', handleLogin);
+    }
+}
+
+// 處理註冊表單提交
+async function handleRegister(event) {
+    event.preventDefault();
+    
+    const username = document.getElementById('username').value;
+    const email = document.getElementById('email').value;
+    const password = document.getElementById('password').value;
+    const confirmPassword = document.getElementById('confirmPassword').value;
+    const age = parseInt(document.getElementById('age').value);
+    
+    // 驗證年齡
+    if (age < 6 || age > 18) {
+        showMessage('年齡必須在6-18歲之間');
+        return;
+    }
+    
+    if (password !== confirmPassword) {
+        showMessage('密碼確認不一致');
+        return;
+    }
+    
+    try {
+        const response = await fetch('/register', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json'
+            },
+            body: JSON.stringify({
+                username: username,
+                email: email,
+                password: password
+            })
+        });
+        
+        const result = await response.json();
+        
+        if (result.success) {
+            showMessage('註冊成功！即將跳轉到登入頁面...', 'success');
+            setTimeout(() => {
+                window.location.href = '/login';
+            }, 2000);
+        } else {
+            showMessage(result.message);
+        }
+    } catch (error) {
+        showMessage('註冊失敗，請稍後再試');
+    }
+}
+
+// 處理登入表單提交
+async function handleLogin(event) {
+    event.preventDefault();
+    
+    const username = document.getElementById('username').value;
+    const password = document.getElementById('password').value;
+    const loginBtn = document.getElementById('loginBtn');
+    
+    // 禁用按鈕防止重複提交
+    loginBtn.disabled = true;
+    loginBtn.innerHTML = '<i class="fas fa-spinner fa-spin me-2"></i>登入中...';
+    
+    try {
+        const response = await fetch('/login', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json'
+            },
+            body: JSON.stringify({
+                username: username,
+                password: password
+            })
+        });
+        
+        const result = await response.json();
+        
+        if (result.success) {
+            showMessage('登入成功！即將跳轉...', 'success');
+            setTimeout(() => {
+                window.location.href = '/child_selection';
+            }, 1500);
+        } else {
+            showMessage(result.message);
+            // 重新啟用按鈕
+            loginBtn.disabled = false;
+            loginBtn.innerHTML = '<i class="fas fa-sign-in-alt me-2"></i>登入';
+        }
+    } catch (error) {
+        showMessage('登入失敗，請稍後再試');
+        // 重新啟用按鈕
+        loginBtn.disabled = false;
+        loginBtn.innerHTML = '<i class="fas fa-sign-in-alt me-2"></i>登入';
+    }
+}
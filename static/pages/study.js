@@ -0,0 +1,1321 @@
+// static/pages/study.js
+// 學習頁面（/study/<subject>）：攝影機、臉部偵測、情緒分類與學習計時
+// 由 script.js 以 import() 載入；assetUrl、vendorAssetUrl、showMessage 等共用函式來自 script.js，
+// Chart.js、FaceTracker、情緒分類前處理、EmotionSmoother、SampleQueue 與 SessionStats 來自 study.js 資源組合
+
+// 頁面狀態
+let video, canvas, ctx;
+let yoloModel = null;
+let emotionModel = null;
+let isDetecting = false;
+let isPaused = false;
+let currentSessionId = null;
+let studyTimer = null;
+let detectionLoopActive = false;
+let startTime = null;
+let pausedTime = 0;
+let totalDuration = 0;
+let detectionCount = 0;
+let validDetections = 0;
+let noFaceWarningCount = 0;
+let multipleFaceWarningCount = 0;
+let faceDetectionModel = null;
+let emotionChart = null;
+
+// Worker 與 WASM 後端位置
+const DETECTION_WORKER_URL = assetUrl('bundles/detection_worker.js', '/static/detection_worker.js');
+const TFJS_WASM_URL = vendorAssetUrl('@tensorflow/tfjs-backend-wasm', 'dist/tf-backend-wasm.min.js');
+const TFJS_WASM_PATHS = {};
+['tfjs-backend-wasm.wasm', 'tfjs-backend-wasm-simd.wasm', 'tfjs-backend-wasm-threaded-simd.wasm'].forEach(file => {
+    TFJS_WASM_PATHS[file] = vendorAssetUrl('@tensorflow/tfjs-backend-wasm', `dist/${file}`);
+});
+
+// TF.js 後端：首次載入時比較各後端速度，結果依裝置快取在 localStorage
+const TF_BACKEND_CACHE_KEY = 'tfjsBackend';
+let inferenceBackend = null;
+
+// 背景執行緒（Web Worker）辨識
+let detectionWorker = null;
+let workerHasFaceDetector = false;
+let workerRequestId = 0;
+const workerRequests = new Map();
+
+// 檢測排程：跟隨影片畫面觸發，同時只執行一次推論，並依推論耗時調整頻率
+const DETECTION_BASE_INTERVAL_MS = 1000;
+const DETECTION_MAX_INTERVAL_MS = 5000;
+const DETECTION_MAX_DUTY_CYCLE = 0.5;  // 推論時間最多佔用的時間比例
+const FACE_DETECTION_TIMEOUT_MS = 2000;
+let detectionInFlight = false;
+let lastDetectionAt = 0;
+let inferenceLatencyMs = 0;
+let detectionIntervalMs = DETECTION_BASE_INTERVAL_MS;
+let detectionTimer = null;
+let detectionScheduleToken = 0;
+
+// 自適應取樣：情緒穩定時逐步降低頻率，情緒改變、信心度下降或失去人臉時恢復
+const ADAPTIVE_MAX_INTERVAL_MS = 5000;
+const ADAPTIVE_STABLE_STEP = 5;            // 每連續穩定幾次就將間隔加倍
+const ADAPTIVE_CONFIDENCE_DROP = 0.15;     // 信心度下降超過此值視為狀態改變
+const ADAPTIVE_MIN_CONFIDENCE = 0.6;
+let stableSampleCount = 0;
+let lastSampleEmotion = null;
+let lastSampleConfidence = 0;
+let stabilityIntervalMs = DETECTION_BASE_INTERVAL_MS;
+let serverMinIntervalMs = DETECTION_BASE_INTERVAL_MS;  // 伺服器要求的最短取樣間隔
+
+// 臉部追蹤：其間以追蹤器更新邊界框，但至少每隔固定時間做一次完整臉部偵測
+// 追蹤只跟著一張臉，以時間而非次數計算，降頻取樣時也能及時發現畫面中出現的其他人
+const FACE_REDETECT_INTERVAL_MS = 2000;
+let lastFullDetectionAt = 0;
+let faceTrackingActive = false;
+let faceTracker = null;
+let trackingCanvas = null;
+let trackingCtx = null;
+
+// 情緒標籤對應 - 修正為正確的七種情緒
+const EMOTION_LABELS = ['anger', 'disgust', 'fear', 'happy', 'no emotion', 'sad', 'surprise'];
+
+// 即時統計：累計值與近期趨勢的環狀緩衝區，不保留整次學習的逐筆資料
+const sessionStats = new SessionStats(EMOTION_LABELS);
+
+// 情緒與專注度取自平滑後的機率分布；畫面上的燈號只在平滑後的狀態改變時更新
+const emotionSmoother = new EmotionSmoother(EMOTION_LABELS);
+let litEmotion = null;
+let litOpacity = null;
+let shownAttentionLevel = null;
+
+// 時間窗上傳模式（伺服器設定 EMOTION_WINDOW_SECONDS）：每個時間窗只上傳一筆摘要
+let windowAggregator = null;
+
+// 當前主要情緒
+let currentMainEmotion = 'no emotion';
+
+// 情緒圖標對應
+const EMOTION_ICONS = {
+    'anger': { icon: 'fas fa-angry', color: '#E74C3C' },
+    'disgust': { icon: 'fas fa-grimace', color: '#8E44AD' },
+    'fear': { icon: 'fas fa-dizzy', color: '#2C3E50' },
+    'happy': { icon: 'fas fa-smile', color: '#F1C40F' },
+    'no emotion': { icon: 'fas fa-meh', color: '#95A5A6' },
+    'sad': { icon: 'fas fa-sad-tear', color: '#3498DB' },
+    'surprise': { icon: 'fas fa-surprise', color: '#E67E22' }
+};
+
+// 情緒標籤中文對應
+const EMOTION_LABELS_ZH = {
+    'anger': '生氣',
+    'disgust': '厭惡', 
+    'fear': '恐懼',
+    'happy': '開心',
+    'no emotion': '平靜',
+    'sad': '難過',
+    'surprise': '驚訝'
+};
+
+// 載入 MediaPipe 與 TensorFlow.js（WASM 後端需在 TensorFlow.js 之後載入）
+function loadScript(src) {
+    return new Promise((resolve, reject) => {
+        const script = document.createElement('script');
+        script.src = src;
+        script.onload = resolve;
+        script.onerror = () => reject(new Error(`無法載入 ${src}`));
+        document.head.appendChild(script);
+    });
+}
+
+// 任一函式庫載入失敗時 loadModels 改用模擬模式，不中斷頁面初始化
+function loadStudyLibraries() {
+    const mediapipe = loadScript(mediapipeAssetUrl('face_detection.js')).then(() => {
+        console.log('MediaPipe Face Detection 載入完成');
+    });
+    const tensorflow = loadScript(TFJS_URL).then(() => {
+        console.log('TensorFlow.js 載入完成');
+        return loadScript(TFJS_WASM_URL);
+    });
+    return Promise.allSettled([mediapipe, tensorflow]);
+}
+
+// 模組載入時立即開始下載，與攝影機初始化同時進行
+const studyLibraries = loadStudyLibraries();
+
+// 情緒資料先存入 IndexedDB 再分批上傳，網路中斷時不會遺失
+const sampleQueue = new SampleQueue({
+    labels: EMOTION_LABELS,
+    onResponse: result => setServerSampleInterval(result.min_sample_interval_ms)
+});
+
+// 學習頁面初始化
+export async function init() {
+    // 先前中斷而未送出的資料（包含其他學習階段）在背景繼續上傳
+    await sampleQueue.open();
+    sampleQueue.flush();
+    await initCamera();
+    initStudyControls();
+    await loadModels();
+    initEmotionLights();
+}
+
+// 初始化情緒燈光
+function initEmotionLights() {
+    // 創建七個情緒燈光元素
+    const emotionLightsContainer = document.getElementById('emotionLights');
+    if (emotionLightsContainer) {
+        emotionLightsContainer.innerHTML = '';
+        
+        EMOTION_LABELS.forEach(emotion => {
+            const emotionLight = document.createElement('div');
+            emotionLight.className = 'emotion-light-item';
+            emotionLight.id = `emotion-${emotion.replace(' ', '-')}`;
+            
+            const icon = document.createElement('i');
+            icon.className = `${EMOTION_ICONS[emotion].icon} fa-2x`;
+            
+            const label = document.createElement('div');
+            label.className = 'emotion-label';
+            label.textContent = EMOTION_LABELS_ZH[emotion];
+            
+            emotionLight.appendChild(icon);
+            emotionLight.appendChild(label);
+            emotionLightsContainer.appendChild(emotionLight);
+        });
+    }
+}
+
+// 初始化攝影機
+async function initCamera() {
+    try {
+        video = document.getElementById('video');
+        canvas = document.getElementById('canvas');
+        
+        if (!video || !canvas) return;
+        
+        ctx = canvas.getContext('2d');
+        
+        const stream = await navigator.mediaDevices.getUserMedia({
+            video: {
+                width: 640,
+                height: 480,
+                facingMode: 'user'
+            }
+        });
+        
+        video.srcObject = stream;
+        
+        video.addEventListener('loadedmetadata', () => {
+            updateCameraStatus('攝影機已就緒', 'success');
+        });
+        
+    } catch (error) {
+        console.error('攝影機初始化失敗:', error);
+        updateCameraStatus('無法存取攝影機，請檢查權限設定', 'error');
+    }
+}
+
+// 更新攝影機狀態
+function updateCameraStatus(message, type = 'info') {
+    const statusElement = document.getElementById('cameraStatus');
+    if (statusElement) {
+        statusElement.className = `alert alert-${type === 'error' ? 'danger' : type === 'success' ? 'success' : 'info'}`;
+        statusElement.innerHTML = `<i class="fas fa-${type === 'error' ? 'exclamation-circle' : type === 'success' ? 'check-circle' : 'info-circle'} me-2"></i>${message}`;
+    }
+}
+
+// 初始化學習控制項
+function initStudyControls() {
+    const startButton = document.getElementById('startButton');
+    const pauseButton = document.getElementById('pauseButton');
+    const endButton = document.getElementById('endButton');
+    const generateReportBtn = document.getElementById('generateReportBtn');
+    
+    if (startButton) {
+        startButton.addEventListener('click', startStudySession);
+    }
+    
+    if (pauseButton) {
+        pauseButton.addEventListener('click', togglePauseStudySession);
+    }
+    
+    if (endButton) {
+        endButton.addEventListener('click', endStudySession);
+    }
+    
+    if (generateReportBtn) {
+        generateReportBtn.addEventListener('click', generateReport);
+    }
+    
+    // 年齡驗證小孩創建表單 - 修正只驗證範圍，不自動修改
+    const ageInput = document.getElementById('age');
+    if (ageInput) {
+        ageInput.addEventListener('blur', function() {
+            const age = parseInt(this.value);
+            if (isNaN(age) || age < 6 || age > 18) {
+                this.setCustomValidity('年齡必須在6-18歲之間');
+                this.reportValidity();
+            } else {
+                this.setCustomValidity('');
+            }
+        });
+        
+        // 防止輸入非數字
+        ageInput.addEventListener('keypress', function(e) {
+            // 允許退格鍵、刪除鍵等控制鍵
+            if (e.which === 8 || e.which === 0) return;
+            
+            // 只允許數字
+            if (e.which < 48 || e.which > 57) {
+                e.preventDefault();
+            }
+        });
+    }
+}
+
+// MediaPipe 的程式、wasm 與模型檔
+function mediapipeAssetUrl(file) {
+    return vendorAssetUrl('@mediapipe/face_detection', file);
+}
+
+// 載入 AI 模型
+async function loadModels() {
+    try {
+        updateCameraStatus('正在載入 AI 模型...', 'info');
+        await studyLibraries;
+        
+        // 載入 MediaPipe Face Detection
+        if (typeof FaceDetection !== 'undefined') {
+            faceDetectionModel = new FaceDetection({
+                locateFile: (file) => mediapipeAssetUrl(file)
+            });
+            
+            faceDetectionModel.setOptions({
+                model: 'short',
+                minDetectionConfidence: 0.5,
+            });
+            
+            faceDetectionModel.onResults(onFaceDetectionResults);
+            console.log('MediaPipe Face Detection 模型載入成功');
+        }
+        
+        // 優先在 Web Worker 中載入情緒分類模型
+        const workerStatus = await initDetectionWorker();
+        if (workerStatus && workerStatus.modelLoaded) {
+            emotionModel = { loaded: true, worker: true };
+            if (workerStatus.faceDetector) {
+                faceDetectionModel = { loaded: true, worker: true };
+            }
+            console.log('情緒分類模型已於 Web Worker 載入');
+        } else if (typeof tf !== 'undefined') {
+            try {
+                // 嘗試載入情緒分類模型
+                emotionModel = await loadEmotionModel(EMOTION_MODEL_URL, EMOTION_MODEL_VERSION);
+                if (tf.wasm) {
+                    tf.wasm.setWasmPaths(TFJS_WASM_PATHS);
+                }
+                const backend = await selectEmotionBackend(emotionModel, getCachedBackend());
+                if (backend) {
+                    saveInferenceBackend(backend);
+                }
+                console.log('情緒分類模型載入成功');
+            } catch (error) {
+                console.warn('無法載入情緒分類模型，使用模擬模式');
+                emotionModel = { loaded: true, simulated: true };
+            }
+        } else {
+            console.warn('TensorFlow.js 未載入，使用備用方案');
+            emotionModel = { loaded: true, simulated: true };
+        }
+        
+        // 如果無法載入真實模型，使用模擬模式
+        if (!faceDetectionModel) {
+            console.log('使用模擬模式進行臉部檢測');
+            faceDetectionModel = { loaded: true, simulated: true };
+        }
+        
+        if (!emotionModel) {
+            emotionModel = { loaded: true, simulated: true };
+        }
+        
+        updateCameraStatus('AI 模型已就緒，可以開始學習', 'success');
+        
+    } catch (error) {
+        console.error('模型載入失敗:', error);
+        // 使用模擬模式
+        faceDetectionModel = { loaded: true, simulated: true };
+        emotionModel = { loaded: true, simulated: true };
+        updateCameraStatus('使用模擬 AI 模型', 'warning');
+    }
+}
+
+// 建立辨識用 Web Worker，不支援 OffscreenCanvas 的瀏覽器回傳 null
+async function initDetectionWorker() {
+    if (typeof Worker === 'undefined' || typeof OffscreenCanvas === 'undefined' || typeof createImageBitmap !== 'function') {
+        return null;
+    }
+    
+    try {
+        detectionWorker = new Worker(DETECTION_WORKER_URL);
+        detectionWorker.onmessage = onDetectionWorkerMessage;
+        detectionWorker.onerror = (error) => {
+            console.error('辨識 Worker 發生錯誤:', error);
+        };
+        
+        const status = await postToDetectionWorker({
+            type: 'init',
+            tfUrl: TFJS_URL,
+            modelUrl: new URL(EMOTION_MODEL_URL, window.location.origin).href,
+            modelVersion: EMOTION_MODEL_VERSION,
+            labels: EMOTION_LABELS,
+            backend: getCachedBackend(),
+            wasmUrl: TFJS_WASM_URL,
+            wasmPaths: TFJS_WASM_PATHS
+        });
+        
+        if (!status.modelLoaded) {
+            detectionWorker.terminate();
+            detectionWorker = null;
+            return null;
+        }
+        
+        workerHasFaceDetector = status.faceDetector;
+        if (status.backend) {
+            saveInferenceBackend(status.backend);
+        }
+        return status;
+    } catch (error) {
+        console.warn('無法建立辨識 Worker，改用主執行緒:', error);
+        detectionWorker = null;
+        return null;
+    }
+}
+
+// 讀取快取的後端；瀏覽器更新後重新比較
+function getCachedBackend() {
+    try {
+        const cached = JSON.parse(localStorage.getItem(TF_BACKEND_CACHE_KEY));
+        if (cached && cached.userAgent === navigator.userAgent) {
+            return cached.backend;
+        }
+    } catch (error) {
+        // 無法使用 localStorage 時每次重新比較
+    }
+    return null;
+}
+
+// 記錄本次使用的後端與推論耗時，開始學習時一併回報
+function saveInferenceBackend(result) {
+    inferenceBackend = result;
+    console.log(`TF.js 後端：${result.label}（${result.inferenceMs.toFixed(1)} ms）`);
+    try {
+        localStorage.setItem(TF_BACKEND_CACHE_KEY, JSON.stringify({
+            backend: result.backend,
+            userAgent: navigator.userAgent
+        }));
+    } catch (error) {
+        // 忽略無法寫入的情況
+    }
+}
+
+// 傳送訊息給 Worker 並等待對應的回覆，逾時則回傳錯誤
+function postToDetectionWorker(message, transfer = [], timeoutMs = 20000) {
+    return new Promise((resolve) => {
+        const id = ++workerRequestId;
+        const timer = setTimeout(() => {
+            workerRequests.delete(id);
+            resolve({ id, error: 'Worker 回應逾時' });
+        }, timeoutMs);
+        workerRequests.set(id, (data) => {
+            clearTimeout(timer);
+            resolve(data);
+        });
+        detectionWorker.postMessage({ ...message, id }, transfer);
+    });
+}
+
+// Worker 回覆處理
+function onDetectionWorkerMessage(event) {
+    const resolve = workerRequests.get(event.data.id);
+    if (resolve) {
+        workerRequests.delete(event.data.id);
+        resolve(event.data);
+    }
+}
+
+// MediaPipe 人臉檢測結果處理
+let lastFaceDetectionResult = null;
+let faceDetectionResolvers = [];
+
+function onFaceDetectionResults(results) {
+    lastFaceDetectionResult = results;
+    
+    const resolvers = faceDetectionResolvers;
+    faceDetectionResolvers = [];
+    resolvers.forEach(resolve => resolve(results));
+}
+
+// 送出畫面並等待 MediaPipe 的 onResults 回呼，逾時回傳 null
+async function runMediaPipeDetection() {
+    const resultPromise = new Promise(resolve => {
+        faceDetectionResolvers.push(resolve);
+        setTimeout(() => resolve(null), FACE_DETECTION_TIMEOUT_MS);
+    });
+    await faceDetectionModel.send({image: video});
+    return await resultPromise;
+}
+
+// 開始學習階段
+async function startStudySession() {
+    const duration = parseInt(document.getElementById('studyDuration').value);
+    
+    if (!faceDetectionModel || !emotionModel) {
+        showMessage('AI 模型尚未就緒，請稍候');
+        return;
+    }
+    
+    try {
+        const response = await fetch('/start_session', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json'
+            },
+            body: JSON.stringify({
+                subject: SUBJECT,
+                duration: duration,
+                inference_backend: inferenceBackend ? inferenceBackend.label : null,
+                inference_ms: inferenceBackend ? inferenceBackend.inferenceMs : null
+            })
+        });
+        
+        const result = await response.json();
+        
+        if (result.success) {
+            currentSessionId = result.session_id;
+            serverMinIntervalMs = result.min_sample_interval_ms || DETECTION_BASE_INTERVAL_MS;
+            windowAggregator = result.emotion_window_seconds > 0
+                ? new WindowAggregator(EMOTION_LABELS, result.emotion_window_seconds * 1000)
+                : null;
+            totalDuration = duration;
+            startTime = new Date();
+            pausedTime = 0;
+            isPaused = false;
+            
+            // 重置計數器
+            noFaceWarningCount = 0;
+            multipleFaceWarningCount = 0;
+            detectionCount = 0;
+            validDetections = 0;
+            
+            // 重置情緒統計
+            sessionStats.reset();
+            emotionSmoother.reset();
+            currentMainEmotion = 'no emotion';
+            
+            // 重置所有情緒燈光
+            resetEmotionLights();
+            shownAttentionLevel = null;
+            
+            // 隱藏設定卡片，顯示狀態卡片
+            document.getElementById('timeSettingCard').style.display = 'none';
+            document.getElementById('statusCard').style.display = 'block';
+            document.getElementById('statsCard').style.display = 'block';
+            document.getElementById('emotionCard').style.display = 'block';
+            
+            // 開始計時器和檢測
+            startTimer(duration * 60); // 轉換為秒
+            startFaceDetection();
+            
+            isDetecting = true;
+            
+        } else {
+            showMessage(result.message);
+        }
+        
+    } catch (error) {
+        showMessage('開始學習失敗，請稍後再試');
+    }
+}
+
+// 開始計時器
+function startTimer(totalSeconds) {
+    let remainingSeconds = totalSeconds;
+    
+    updateTimerDisplay(remainingSeconds, totalSeconds);
+    
+    studyTimer = setInterval(() => {
+        if (!isPaused) {
+            remainingSeconds--;
+            updateTimerDisplay(remainingSeconds, totalSeconds);
+            
+            if (remainingSeconds <= 0) {
+                endStudySession();
+            }
+        }
+    }, 1000);
+}
+
+// 更新計時器顯示
+function updateTimerDisplay(remainingSeconds, totalSeconds) {
+    const minutes = Math.floor(remainingSeconds / 60);
+    const seconds = remainingSeconds % 60;
+    
+    const timeDisplay = `${minutes.toString().padStart(2, '0')}:${seconds.toString().padStart(2, '0')}`;
+    
+    const remainingTimeElement = document.getElementById('remainingTime');
+    const timeProgressElement = document.getElementById('timeProgress');
+    
+    if (remainingTimeElement) {
+        remainingTimeElement.textContent = timeDisplay;
+    }
+    
+    if (timeProgressElement) {
+        const progress = ((totalSeconds - remainingSeconds) / totalSeconds) * 100;
+        timeProgressElement.style.width = `${progress}%`;
+    }
+}
+
+// 開始人臉檢測
+function startFaceDetection() {
+    detectionLoopActive = true;
+    detectionInFlight = false;
+    lastDetectionAt = 0;
+    inferenceLatencyMs = 0;
+    detectionIntervalMs = DETECTION_BASE_INTERVAL_MS;
+    resetSamplingStability();
+    resetFaceTracking();
+    scheduleNextDetection();
+}
+
+// 停止人臉檢測
+function stopFaceDetection() {
+    detectionLoopActive = false;
+    clearTimeout(detectionTimer);
+}
+
+// 排程下一次檢查：前景時跟隨影片畫面，背景分頁不會觸發畫面回呼，以計時器保底
+function scheduleNextDetection() {
+    if (!detectionLoopActive) return;
+    
+    // 每次排程使用新的代號，較早排程的回呼觸發時直接忽略，確保只有一個檢測迴圈
+    const token = ++detectionScheduleToken;
+    const callback = () => onDetectionFrame(token);
+    const wait = Math.max(0, detectionIntervalMs - (performance.now() - lastDetectionAt));
+    
+    clearTimeout(detectionTimer);
+    detectionTimer = setTimeout(callback, document.hidden ? wait : wait + DETECTION_BASE_INTERVAL_MS);
+    
+    if (!document.hidden) {
+        if (video && typeof video.requestVideoFrameCallback === 'function') {
+            video.requestVideoFrameCallback(callback);
+        } else {
+            requestAnimationFrame(callback);
+        }
+    }
+}
+
+// 每個影片畫面的回呼，只在間隔已到且沒有進行中的推論時執行檢測
+async function onDetectionFrame(token) {
+    if (!detectionLoopActive || token !== detectionScheduleToken) return;
+    
+    const now = performance.now();
+    if (detectionInFlight || !isDetecting || isPaused || !video || !canvas || now - lastDetectionAt < detectionIntervalMs) {
+        scheduleNextDetection();
+        return;
+    }
+    
+    detectionInFlight = true;
+    lastDetectionAt = now;
+    try {
+        await detectFaceAndEmotion();
+    } finally {
+        detectionInFlight = false;
+        scheduleNextDetection();
+    }
+}
+
+// 以推論耗時的移動平均調整檢測間隔，慢速裝置自動降低頻率
+function updateDetectionRate(latencyMs) {
+    if (latencyMs !== undefined) {
+        inferenceLatencyMs = inferenceLatencyMs === 0 ? latencyMs : inferenceLatencyMs * 0.8 + latencyMs * 0.2;
+    }
+    const localInterval = Math.min(
+        DETECTION_MAX_INTERVAL_MS,
+        Math.max(DETECTION_BASE_INTERVAL_MS, inferenceLatencyMs / DETECTION_MAX_DUTY_CYCLE, stabilityIntervalMs)
+    );
+    // 伺服器限制優先
+    detectionIntervalMs = Math.max(localInterval, serverMinIntervalMs);
+}
+
+// 重置取樣穩定度，恢復基本頻率
+function resetSamplingStability() {
+    stableSampleCount = 0;
+    lastSampleEmotion = null;
+    lastSampleConfidence = 0;
+    stabilityIntervalMs = DETECTION_BASE_INTERVAL_MS;
+}
+
+// 依檢測結果更新穩定度：同一情緒且信心度穩定時逐步拉長間隔
+function updateSamplingStability(detectionResult) {
+    const changed = detectionResult.error ||
+        detectionResult.emotion !== lastSampleEmotion ||
+        detectionResult.confidence < ADAPTIVE_MIN_CONFIDENCE ||
+        lastSampleConfidence - detectionResult.confidence > ADAPTIVE_CONFIDENCE_DROP;
+    
+    if (changed) {
+        resetSamplingStability();
+    } else {
+        stableSampleCount++;
+        const steps = Math.floor(stableSampleCount / ADAPTIVE_STABLE_STEP);
+        stabilityIntervalMs = Math.min(ADAPTIVE_MAX_INTERVAL_MS, DETECTION_BASE_INTERVAL_MS * Math.pow(2, steps));
+    }
+    
+    if (!detectionResult.error) {
+        lastSampleEmotion = detectionResult.emotion;
+        lastSampleConfidence = detectionResult.confidence;
+    }
+}
+
+// 套用伺服器回傳的最短取樣間隔
+function setServerSampleInterval(intervalMs) {
+    if (typeof intervalMs === 'number' && intervalMs > 0) {
+        serverMinIntervalMs = intervalMs;
+        updateDetectionRate();
+    }
+}
+
+// 人臉檢測和情緒辨識
+async function detectFaceAndEmotion() {
+    try {
+        detectionCount++;
+        
+        let detectionResult;
+        const inferenceStart = performance.now();
+        
+        // 檢查是否使用真實的人臉檢測
+        if (detectionWorker && emotionModel && emotionModel.worker) {
+            detectionResult = await performWorkerDetection();
+        } else if (faceDetectionModel && !faceDetectionModel.simulated) {
+            detectionResult = await performRealFaceDetection();
+        } else {
+            detectionResult = await performEnhancedSimulation();
+        }
+        
+        updateSamplingStability(detectionResult);
+        updateDetectionRate(performance.now() - inferenceStart);
+        
+        if (detectionResult.error) {
+            showDetectionWarning(detectionResult.error);
+            return;
+        }
+        
+        hideDetectionWarning();
+        validDetections++;
+        
+        // 以平滑後的機率分布決定情緒、信心度與專注度，單一畫面的雜訊不會讓燈號跳動
+        detectionResult.timestamp = Date.now();
+        Object.assign(detectionResult, emotionSmoother.update(detectionResult.probabilities, detectionResult.timestamp));
+        
+        // 更新專注度指示器
+        updateAttentionIndicator(detectionResult.attention);
+        
+        // 此筆資料代表到下一次取樣之間的秒數，讓降頻期間的平均值不失真
+        detectionResult.weight = detectionIntervalMs / DETECTION_BASE_INTERVAL_MS;
+        
+        // 更新情緒統計和燈光
+        updateEmotionCounts(detectionResult);
+        updateEmotionLights(detectionResult.emotion, detectionResult.confidence);
+        
+        // 記錄數據（上傳不阻塞下一次檢測）
+        recordEmotionData(detectionResult);
+        
+        // 更新統計
+        updateStatistics();
+        
+    } catch (error) {
+        console.error('檢測過程發生錯誤:', error);
+    }
+}
+
+// 依人臉數量更新警告計數，達到門檻時回傳錯誤
+function checkFaceCount(faceCount) {
+    if (faceCount === 0) {
+        noFaceWarningCount++;
+        if (noFaceWarningCount >= 2) {
+            return { error: '未檢測到人臉，請確保臉部在攝影機範圍內並面向攝影機' };
+        }
+    }
+    
+    if (faceCount > 1) {
+        multipleFaceWarningCount++;
+        if (multipleFaceWarningCount >= 3) {
+            return { error: '檢測到多人，請確保只有一人在攝影機前' };
+        }
+    }
+    
+    if (faceCount === 1) {
+        // 重置警告計數
+        noFaceWarningCount = 0;
+        multipleFaceWarningCount = 0;
+    }
+    
+    return null;
+}
+
+// 重置臉部追蹤狀態
+function resetFaceTracking() {
+    lastFullDetectionAt = 0;
+    faceTrackingActive = false;
+    if (faceTracker) {
+        faceTracker.reset();
+    }
+}
+
+// 目前畫面是否可以用追蹤取代完整偵測
+function shouldTrackFace() {
+    return faceTrackingActive && performance.now() - lastFullDetectionAt < FACE_REDETECT_INTERVAL_MS;
+}
+
+// 記錄完整偵測的時間；只有單一人臉時才繼續追蹤
+function updateFaceTracking(tracked, faceCount) {
+    if (!tracked) {
+        lastFullDetectionAt = performance.now();
+    }
+    faceTrackingActive = faceCount === 1;
+}
+
+// 將目前畫面送給 Worker：mode 為 'detect'（完整偵測）或 'track'（追蹤）
+async function requestWorkerFrame(mode) {
+    let faces = null;
+    
+    // Worker 不支援臉部偵測時，完整偵測由主執行緒的 MediaPipe 提供邊界框
+    if (mode === 'detect' && !workerHasFaceDetector) {
+        if (!faceDetectionModel || typeof faceDetectionModel.send !== 'function') {
+            return null;
+        }
+        const results = await runMediaPipeDetection();
+        if (!results) {
+            return null;
+        }
+        faces = results.detections.map(face => ({
+            xCenter: face.boundingBox.xCenter,
+            yCenter: face.boundingBox.yCenter,
+            width: face.boundingBox.width,
+            height: face.boundingBox.height
+        }));
+    }
+    
+    // 將影像以 ImageBitmap 轉移給 Worker（不複製）
+    const bitmap = await createImageBitmap(video);
+    return await postToDetectionWorker({ type: 'detect', mode, bitmap, faces }, [bitmap]);
+}
+
+// 在 Web Worker 中執行偵測、裁切與分類
+async function performWorkerDetection() {
+    try {
+        let result = await requestWorkerFrame(shouldTrackFace() ? 'track' : 'detect');
+        
+        // 追蹤失敗時立即改做完整偵測
+        if (result && result.trackLost) {
+            result = await requestWorkerFrame('detect');
+        }
+        
+        if (!result) {
+            return await performEnhancedSimulation();
+        }
+        
+        if (result.error) {
+            throw new Error(result.error);
+        }
+        
+        updateFaceTracking(result.tracked, result.faceCount);
+        
+        const faceError = checkFaceCount(result.faceCount);
+        if (faceError) {
+            return faceError;
+        }
+        
+        if (result.faceCount === 1) {
+            return {
+                emotion: result.emotion,
+                confidence: result.confidence,
+                probabilities: Float32Array.from(result.probabilities)
+            };
+        }
+        
+        return await performEnhancedSimulation();
+        
+    } catch (error) {
+        console.error('Worker 人臉檢測失敗:', error);
+        return await performEnhancedSimulation();
+    }
+}
+
+// 將目前畫面縮小為灰階，供追蹤器使用
+function captureTrackingFrame() {
+    if (!trackingCanvas) {
+        trackingCanvas = document.createElement('canvas');
+        trackingCanvas.width = TRACKING_FRAME_WIDTH;
+        trackingCanvas.height = TRACKING_FRAME_HEIGHT;
+        trackingCtx = trackingCanvas.getContext('2d', { willReadFrequently: true });
+    }
+    trackingCtx.drawImage(video, 0, 0, TRACKING_FRAME_WIDTH, TRACKING_FRAME_HEIGHT);
+    return FaceTracker.toGray(trackingCtx.getImageData(0, 0, TRACKING_FRAME_WIDTH, TRACKING_FRAME_HEIGHT));
+}
+
+// 以追蹤器取得臉部位置並辨識情緒，追蹤失敗時回傳 null
+async function performTrackedDetection() {
+    const box = faceTracker.track(captureTrackingFrame());
+    if (!box) {
+        return null;
+    }
+    
+    updateFaceTracking(true, 1);
+    return await performEmotionDetection({ boundingBox: box });
+}
+
+// 執行真實的人臉檢測
+async function performRealFaceDetection() {
+    try {
+        if (!faceTracker && typeof FaceTracker !== 'undefined') {
+            faceTracker = new FaceTracker();
+        }
+        
+        // 追蹤中：跳過 MediaPipe，直接沿用追蹤到的邊界框
+        if (faceTracker && shouldTrackFace()) {
+            const trackedResult = await performTrackedDetection();
+            if (trackedResult) {
+                return trackedResult;
+            }
+        }
+        
+        // 使用 MediaPipe 進行人臉檢測
+        if (faceDetectionModel && typeof faceDetectionModel.send === 'function') {
+            // 等待檢測結果
+            const results = await runMediaPipeDetection();
+            
+            if (results) {
+                const faces = results.detections;
+                
+                updateFaceTracking(false, faces.length);
+                if (faceTracker) {
+                    if (faces.length === 1) {
+                        faceTracker.init(captureTrackingFrame(), faces[0].boundingBox);
+                    } else {
+                        faceTracker.reset();
+                    }
+                }
+                
+                const faceError = checkFaceCount(faces.length);
+                if (faceError) {
+                    return faceError;
+                }
+                
+                if (faces.length === 1) {
+                    // 執行情緒檢測
+                    return await performEmotionDetection(faces[0]);
+                }
+            }
+        }
+        
+        // 如果無法使用真實檢測，回退到增強模擬
+        return await performEnhancedSimulation();
+        
+    } catch (error) {
+        console.error('真實人臉檢測失敗:', error);
+        return await performEnhancedSimulation();
+    }
+}
+
+// 執行情緒檢測
+async function performEmotionDetection(face) {
+    try {
+        if (emotionModel && !emotionModel.simulated && typeof tf !== 'undefined') {
+            // 前處理與推論都在 tf.tidy 中，裁切縮放在 GPU 上完成
+            const predictions = await classifyEmotion(emotionModel, video, face.boundingBox);
+            const emotionIndex = argMax(predictions);
+            const emotion = EMOTION_LABELS[emotionIndex];
+            const confidence = predictions[emotionIndex];
+            
+            return { emotion, confidence, probabilities: predictions };
+        }
+    } catch (error) {
+        console.error('情緒檢測失敗:', error);
+    }
+    
+    // 回退到模擬情緒檢測
+    return simulateEmotion();
+}
+
+// 增強版模擬檢測（更真實的人臉檢測行為）
+async function performEnhancedSimulation() {
+    // 將影片畫面繪製到 canvas
+    ctx.drawImage(video, 0, 0, canvas.width, canvas.height);
+    
+    // 使用簡單的像素分析來模擬人臉檢測
+    const imageData = ctx.getImageData(0, 0, canvas.width, canvas.height);
+    const pixels = imageData.data;
+    
+    // 計算圖像中心區域的亮度變化（簡單的人臉存在檢測）
+    let centerBrightness = 0;
+    let edgeBrightness = 0;
+    let centerPixels = 0;
+    let edgePixels = 0;
+    
+    const centerX = canvas.width / 2;
+    const centerY = canvas.height / 2;
+    const faceRadius = Math.min(canvas.width, canvas.height) / 6;
+    
+    for (let y = 0; y < canvas.height; y += 4) {
+        for (let x = 0; x < canvas.width; x += 4) {
+            const distance = Math.sqrt((x - centerX) ** 2 + (y - centerY) ** 2);
+            const pixelIndex = (y * canvas.width + x) * 4;
+            const brightness = (pixels[pixelIndex] + pixels[pixelIndex + 1] + pixels[pixelIndex + 2]) / 3;
+            
+            if (distance < faceRadius) {
+                centerBrightness += brightness;
+                centerPixels++;
+            } else if (distance > faceRadius * 2) {
+                edgeBrightness += brightness;
+                edgePixels++;
+            }
+        }
+    }
+    
+    const avgCenterBrightness = centerBrightness / centerPixels;
+    const avgEdgeBrightness = edgeBrightness / edgePixels;
+    const contrast = Math.abs(avgCenterBrightness - avgEdgeBrightness);
+    
+    // 檢測多人的簡單方法：檢查是否有多個亮度區域
+    let brightRegions = 0;
+    for (let y = 0; y < canvas.height; y += 20) {
+        for (let x = 0; x < canvas.width; x += 20) {
+            const pixelIndex = (y * canvas.width + x) * 4;
+            const brightness = (pixels[pixelIndex] + pixels[pixelIndex + 1] + pixels[pixelIndex + 2]) / 3;
+            if (brightness > avgCenterBrightness + 20) {
+                brightRegions++;
+            }
+        }
+    }
+    
+    // 根據圖像分析結果決定檢測結果
+    const rand = Math.random();
+    
+    // 如果對比度太低，可能沒有人臉
+    if (contrast < 15 && rand < 0.3) {
+        noFaceWarningCount++;
+        if (noFaceWarningCount >= 2) {
+            return { error: '未檢測到人臉，請確保臉部在攝影機範圍內並面向攝影機' };
+        }
+    }
+    
+    // 如果有太多亮區域，可能有多人
+    if (brightRegions > 8 && rand < 0.15) {
+        multipleFaceWarningCount++;
+        if (multipleFaceWarningCount >= 1) {
+            return { error: '檢測到多人，請確保只有一人在攝影機前' };
+        }
+    }
+    
+    // 正常情況下的檢測
+    noFaceWarningCount = Math.max(0, noFaceWarningCount - 0.5);
+    multipleFaceWarningCount = Math.max(0, multipleFaceWarningCount - 0.5);
+    
+    return simulateEmotion();
+}
+
+// 模擬情緒檢測
+function simulateEmotion() {
+    // 模擬更真實的情緒分布
+    const emotionWeights = {
+        'no emotion': 0.45,
+        'happy': 0.15,
+        'anger': 0.08,
+        'sad': 0.08,
+        'surprise': 0.08,
+        'fear': 0.08,
+        'disgust': 0.08
+    };
+    
+    let randomValue = Math.random();
+    let emotion = 'no emotion';
+    
+    for (const [emo, weight] of Object.entries(emotionWeights)) {
+        randomValue -= weight;
+        if (randomValue <= 0) {
+            emotion = emo;
+            break;
+        }
+    }
+    
+    const confidence = 0.6 + Math.random() * 0.35;
+    return { emotion, confidence, probabilities: probabilitiesFromEmotion(emotion, confidence) };
+}
+
+// 模擬結果的機率分布：其餘信心度平均分給其他情緒（Float32Array 與模型輸出及伺服器保存的精度相同）
+function probabilitiesFromEmotion(emotion, confidence) {
+    const rest = (1 - confidence) / (EMOTION_LABELS.length - 1);
+    return Float32Array.from(EMOTION_LABELS, label => (label === emotion ? confidence : rest));
+}
+
+// 更新情緒統計
+function updateEmotionCounts(detectionResult) {
+    sessionStats.add(detectionResult);
+    
+    // 更新當前主要情緒
+    updateCurrentMainEmotion();
+}
+
+// 更新當前主要情緒
+function updateCurrentMainEmotion() {
+    let maxCount = 0;
+    let mainEmotion = 'no emotion';
+    
+    for (const [emotion, count] of Object.entries(sessionStats.histogram)) {
+        if (count > maxCount) {
+            maxCount = count;
+            mainEmotion = emotion;
+        }
+    }
+    
+    currentMainEmotion = mainEmotion;
+}
+
+// 重置所有情緒燈光
+function resetEmotionLights() {
+    EMOTION_LABELS.forEach(emotion => {
+        dimEmotionLight(emotion);
+    });
+    litEmotion = null;
+    litOpacity = null;
+}
+
+function emotionLightElement(emotion) {
+    return document.getElementById(`emotion-${emotion.replace(' ', '-')}`);
+}
+
+function dimEmotionLight(emotion) {
+    const lightElement = emotionLightElement(emotion);
+    if (lightElement) {
+        lightElement.style.opacity = '0.3';
+        lightElement.style.backgroundColor = 'transparent';
+        lightElement.style.boxShadow = '';
+        lightElement.style.animation = '';
+        lightElement.classList.remove('active');
+    }
+}
+
+// 更新情緒燈光：只有情緒或亮度級距改變時才修改 DOM
+function updateEmotionLights(detectedEmotion, confidence) {
+    // 根據信心度設定亮度（0.5 - 1.0），以 0.1 為級距
+    const opacity = Math.round((0.5 + confidence * 0.5) * 10) / 10;
+    if (detectedEmotion === litEmotion && opacity === litOpacity) {
+        return;
+    }
+    
+    const lightElement = emotionLightElement(detectedEmotion);
+    if (detectedEmotion !== litEmotion) {
+        if (litEmotion) {
+            dimEmotionLight(litEmotion);
+        }
+        if (lightElement) {
+            lightElement.style.backgroundColor = EMOTION_ICONS[detectedEmotion].color + '20'; // 添加透明背景
+            lightElement.classList.add('active');
+            
+            // 添加發光效果
+            lightElement.style.boxShadow = `0 0 20px ${EMOTION_ICONS[detectedEmotion].color}`;
+            
+            // 添加脈動動畫
+            lightElement.style.animation = 'emotionPulse 2s infinite';
+        }
+    }
+    if (lightElement) {
+        lightElement.style.opacity = opacity;
+    }
+    litEmotion = detectedEmotion;
+    litOpacity = opacity;
+}
+
+// 顯示檢測警告
+function showDetectionWarning(message) {
+    const warningElement = document.getElementById('detectionWarning');
+    const messageElement = document.getElementById('warningMessage');
+    
+    if (warningElement && messageElement) {
+        messageElement.textContent = message;
+        warningElement.style.display = 'block';
+        
+        // 5秒後自動隱藏
+        setTimeout(() => {
+            hideDetectionWarning();
+        }, 5000);
+    }
+}
+
+// 隱藏檢測警告
+function hideDetectionWarning() {
+    const warningElement = document.getElementById('detectionWarning');
+    if (warningElement) {
+        warningElement.style.display = 'none';
+    }
+}
+
+// 更新專注度指示器
+function updateAttentionIndicator(attentionLevel) {
+    if (attentionLevel === shownAttentionLevel) {
+        return;
+    }
+    shownAttentionLevel = attentionLevel;
+    
+    const lowLight = document.getElementById('lowAttention');
+    const mediumLight = document.getElementById('mediumAttention');
+    const highLight = document.getElementById('highAttention');
+    
+    // 重置所有指示燈
+    [lowLight, mediumLight, highLight].forEach(light => {
+        if (light) {
+            light.classList.remove('active');
+        }
+    });
+    
+    // 點亮對應的指示燈
+    if (attentionLevel === 1 && lowLight) {
+        lowLight.classList.add('active');
+    } else if (attentionLevel === 2 && mediumLight) {
+        mediumLight.classList.add('active');
+    } else if (attentionLevel === 3 && highLight) {
+        highLight.classList.add('active');
+    }
+}
+
+// 記錄情緒數據
+async function recordEmotionData(detectionResult) {
+    try {
+        if (windowAggregator) {
+            const finished = windowAggregator.add(detectionResult, Date.now());
+            if (finished) {
+                await sampleQueue.pushWindow(currentSessionId, finished);
+            }
+            return;
+        }
+        await sampleQueue.push(currentSessionId, {
+            clientTs: detectionResult.timestamp,
+            probabilities: Array.from(detectionResult.probabilities),
+            emotion: detectionResult.emotion,
+            attention_level: detectionResult.attention,
+            confidence: detectionResult.confidence,
+            sample_weight: detectionResult.weight
+        });
+    } catch (error) {
+        console.error('記錄情緒數據失敗:', error);
+    }
+}
+
+// 暫停或結束時送出未滿的時間窗，時間窗不跨越暫停期間
+async function flushEmotionWindow() {
+    const finished = windowAggregator ? windowAggregator.close(Date.now()) : null;
+    if (finished) {
+        await sampleQueue.pushWindow(currentSessionId, finished);
+    }
+}
+
+// 專注度（1-3）轉為百分比
+function attentionPercent(attention) {
+    return Math.round(attention * 100 / 3) + '%';
+}
+
+// 更新統計資訊（平均值取自累計統計，成本與學習時間長短無關）
+function updateStatistics() {
+    const avgAttentionElement = document.getElementById('avgAttention');
+    const recentAttentionElement = document.getElementById('recentAttention');
+    const detectionCountElement = document.getElementById('detectionCount');
+    const validDetectionsElement = document.getElementById('validDetections');
+    
+    if (sessionStats.count > 0) {
+        setText(avgAttentionElement, attentionPercent(sessionStats.averageAttention));
+        setText(recentAttentionElement, attentionPercent(sessionStats.recentAverageAttention));
+    }
+    
+    setText(detectionCountElement, String(detectionCount));
+    setText(validDetectionsElement, String(validDetections));
+}
+
+// 只在內容改變時寫入 DOM
+function setText(element, text) {
+    if (element && element.textContent !== text) {
+        element.textContent = text;
+    }
+}
+
+// 暫停/繼續學習 - 修正暫停功能
+function togglePauseStudySession() {
+    const pauseButton = document.getElementById('pauseButton');
+    
+    if (!isPaused) {
+        // 暫停
+        isPaused = true;
+        flushEmotionWindow().catch(error => console.error('記錄情緒數據失敗:', error));
+        pauseButton.innerHTML = '<i class="fas fa-play me-2"></i>繼續';
+        pauseButton.classList.remove('btn-warning');
+        pauseButton.classList.add('btn-success');
+    } else {
+        // 繼續
+        isPaused = false;
+        pauseButton.innerHTML = '<i class="fas fa-pause me-2"></i>暫停';
+        pauseButton.classList.remove('btn-success');
+        pauseButton.classList.add('btn-warning');
+    }
+}
+
+// 結束學習
+async function endStudySession() {
+    isDetecting = false;
+    isPaused = false;
+    clearInterval(studyTimer);
+    stopFaceDetection();
+    
+    try {
+        // 先送出剩餘的情緒資料再結束；離線時兩者都留在佇列中，連線恢復後自動送出
+        await flushEmotionWindow();
+        const result = await sampleQueue.endSession(currentSessionId);
+        
+        if (!result) {
+            updateCameraStatus('網路連線中斷，學習資料已保存在此裝置，連線恢復後會自動上傳', 'warning');
+            showSessionCompleteModal();
+        } else if (result.success) {
+            showSessionCompleteModal();
+        } else {
+            showMessage(result.message);
+        }
+        
+    } catch (error) {
+        showMessage('結束學習失敗，請稍後再試');
+    }
+}
+
+// 顯示學習完成模態框
+function showSessionCompleteModal() {
+    const modal = document.getElementById('sessionCompleteModal');
+    const finalDurationElement = document.getElementById('finalDuration');
+    const finalAttentionElement = document.getElementById('finalAttention');
+    const finalDetectionsElement = document.getElementById('finalDetections');
+    
+    if (finalDurationElement) {
+        const actualDuration = Math.floor((new Date() - startTime - pausedTime) / (1000 * 60));
+        finalDurationElement.textContent = `${actualDuration} 分鐘`;
+    }
+    
+    if (finalAttentionElement && sessionStats.count > 0) {
+        finalAttentionElement.textContent = attentionPercent(sessionStats.averageAttention);
+    }
+    
+    if (finalDetectionsElement) {
+        finalDetectionsElement.textContent = validDetections;
+    }
+    
+    if (modal) {
+        const bootstrapModal = new bootstrap.Modal(modal);
+        bootstrapModal.show();
+    }
+}
+
+// 生成報告 - 改為返回智慧建議頁面
+function generateReport() {
+    window.location.href = '/smart_suggestions';
+}
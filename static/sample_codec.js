@@ -0,0 +1,53 @@
+// static/sample_codec.js
+// 情緒資料批次的二進位格式，每筆 37 bytes（JSON 約 250 bytes），格式說明見伺服器的 sample_codec.py
+// 含時間窗摘要、未知情緒或序號／時間差超出 uint16 範圍的批次無法編碼，改以 JSON 上傳
+
+const SAMPLE_BATCH_CONTENT_TYPE = 'application/x-emotion-samples';
+const SAMPLE_BATCH_MAGIC = 'EMS1';
+const SAMPLE_BATCH_HEADER_SIZE = 20;
+const SAMPLE_RECORD_SIZE = 37;
+const SAMPLE_PROBABILITY_COUNT = 7;
+const UINT16_MAX = 0xffff;
+
+// records 為 SampleQueue 中同一學習階段、依序號排列的資料；無法編碼時回傳 null
+function encodeSampleBatch(sessionId, records, labels) {
+    if (!records.length || labels.length !== SAMPLE_PROBABILITY_COUNT) return null;
+    const buffer = new ArrayBuffer(SAMPLE_BATCH_HEADER_SIZE + records.length * SAMPLE_RECORD_SIZE);
+    const view = new DataView(buffer);
+    const baseSeq = records[0].seq;
+    let previousTs = records[0].clientTs;
+
+    for (let i = 0; i < SAMPLE_BATCH_MAGIC.length; i++) {
+        view.setUint8(i, SAMPLE_BATCH_MAGIC.charCodeAt(i));
+    }
+    view.setUint32(4, sessionId, true);
+    view.setUint32(8, baseSeq, true);
+    view.setFloat64(12, previousTs, true);
+
+    for (let i = 0; i < records.length; i++) {
+        const record = records[i];
+        const offset = SAMPLE_BATCH_HEADER_SIZE + i * SAMPLE_RECORD_SIZE;
+        const seqDelta = record.seq - baseSeq;
+        const timeDelta = Math.round(record.clientTs - previousTs);
+        const code = labels.indexOf(record.emotion);
+        if (record.window || code < 0 || typeof record.confidence !== 'number' ||
+            !(seqDelta >= 0 && seqDelta <= UINT16_MAX) || !(timeDelta >= 0 && timeDelta <= UINT16_MAX)) {
+            return null;
+        }
+        // 以累加後的時間為基準，伺服器還原的時間與裝置時間不會因四捨五入而漂移
+        previousTs += timeDelta;
+
+        view.setUint16(offset, seqDelta, true);
+        view.setUint16(offset + 2, timeDelta, true);
+        view.setUint8(offset + 4, code);
+        view.setUint8(offset + 5, record.attention_level);
+        view.setUint8(offset + 6, Math.round(Math.min(1, Math.max(0, record.confidence)) * 255));
+        view.setUint16(offset + 7, Math.min(UINT16_MAX, Math.round((record.sample_weight || 0) * 1000)), true);
+        const probabilities = record.probabilities && record.probabilities.length === SAMPLE_PROBABILITY_COUNT
+            ? record.probabilities : null;
+        for (let j = 0; j < SAMPLE_PROBABILITY_COUNT; j++) {
+            view.setFloat32(offset + 9 + j * 4, probabilities ? probabilities[j] : NaN, true);
+        }
+    }
+    return buffer;
+}
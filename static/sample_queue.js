@@ -0,0 +1,289 @@
+// static/sample_queue.js
+// 離線優先的情緒資料佇列：每筆資料先寫入 IndexedDB，再分批上傳到 /record_emotion_batch
+// 網路中斷時資料留在瀏覽器中，連線恢復或下次開啟學習頁面時繼續上傳；伺服器以 (session_id, seq) 去除重複，
+// 重送同一批資料不會重複寫入。結束學習的請求也排在佇列中，待該次學習的資料全部送出後才送出
+// 佇列中可以是逐筆資料或時間窗摘要（WindowAggregator），兩者共用同一組序號
+// 提供情緒標籤時，只含逐筆資料的批次以二進位格式（sample_codec.js）上傳，伺服器不支援時改回 JSON
+
+const SAMPLE_QUEUE_DB = 'emotion-sample-queue';
+const SAMPLE_QUEUE_VERSION = 1;
+const SAMPLE_BATCH_SIZE = 50;
+const SAMPLE_FLUSH_DELAY_MS = 2000;    // 累積一段時間再上傳，減少請求數
+const SAMPLE_RETRY_BASE_MS = 2000;
+const SAMPLE_RETRY_MAX_MS = 60000;
+
+// IndexedDB 請求包裝為 Promise
+function idbResult(request) {
+    return new Promise((resolve, reject) => {
+        request.onsuccess = () => resolve(request.result);
+        request.onerror = () => reject(request.error);
+    });
+}
+
+function idbComplete(transaction) {
+    return new Promise((resolve, reject) => {
+        transaction.oncomplete = () => resolve();
+        transaction.onerror = () => reject(transaction.error);
+        transaction.onabort = () => reject(transaction.error);
+    });
+}
+
+class SampleQueue {
+    constructor(options = {}) {
+        this.batchUrl = options.batchUrl || '/record_emotion_batch';
+        this.endUrl = options.endUrl || '/end_session';
+        this.onResponse = options.onResponse || (() => {});   // 伺服器的回覆（取樣間隔等）
+        this.labels = options.labels || null;                 // 二進位格式的情緒代碼對照
+        this.binary = Boolean(this.labels);
+        this.db = null;
+        this.memory = null;        // 無法使用 IndexedDB 時改存在記憶體，至少在本頁內仍會重試
+        this.seqs = new Map();     // 各學習階段的下一個序號
+        this.flushing = null;
+        this.timer = null;
+        this.failures = 0;
+        this.retryAfterMs = 0;     // 伺服器限流或過載時要求的等待時間（Retry-After）
+        this.lastEnding = null;    // 最近一次送達的結束學習回覆
+        this.stopped = false;      // 登入逾時等需使用者處理的錯誤，下次開啟頁面再重試
+    }
+
+    async open() {
+        try {
+            const request = indexedDB.open(SAMPLE_QUEUE_DB, SAMPLE_QUEUE_VERSION);
+            request.onupgradeneeded = () => {
+                request.result.createObjectStore('samples', { keyPath: ['sessionId', 'seq'] });
+                request.result.createObjectStore('endings', { keyPath: 'sessionId' });
+            };
+            this.db = await idbResult(request);
+        } catch (error) {
+            console.warn('無法使用 IndexedDB，離線資料只保留在本頁:', error);
+            this.memory = { samples: [], endings: new Map() };
+        }
+
+        window.addEventListener('online', () => this.flush());
+        document.addEventListener('visibilitychange', () => {
+            if (document.visibilityState === 'hidden') this.flush();
+        });
+    }
+
+    // 加入一筆資料，附上序號與裝置時間
+    async push(sessionId, sample) {
+        await this.store('samples', { sessionId, seq: this.nextSeq(sessionId), clientTs: Date.now(), ...sample });
+        this.schedule(SAMPLE_FLUSH_DELAY_MS);
+    }
+
+    // 加入一個時間窗摘要
+    async pushWindow(sessionId, window) {
+        await this.store('samples', { sessionId, seq: this.nextSeq(sessionId), clientTs: Date.now(), window });
+        this.schedule(SAMPLE_FLUSH_DELAY_MS);
+    }
+
+    nextSeq(sessionId) {
+        const seq = (this.seqs.get(sessionId) || 0) + 1;
+        this.seqs.set(sessionId, seq);
+        return seq;
+    }
+
+    // 排入結束學習的請求並立即嘗試送出；送達時回傳伺服器的回覆，仍在佇列中時回傳 null
+    async endSession(sessionId) {
+        await this.store('endings', { sessionId, endedAt: Date.now() });
+        await this.flushing;   // 進行中的上傳可能在排入之前就已讀取佇列
+        await this.flush();
+        return this.lastEnding && this.lastEnding.sessionId === sessionId ? this.lastEnding.result : null;
+    }
+
+    schedule(delayMs) {
+        if (this.timer || this.stopped) return;
+        this.timer = setTimeout(() => {
+            this.timer = null;
+            this.flush();
+        }, delayMs);
+    }
+
+    // 同一時間只有一個上傳流程；失敗時以指數退避加上隨機延遲重試，避免整間教室同時重送
+    flush() {
+        if (!this.flushing) {
+            this.flushing = this.drain()
+                .then(() => {
+                    this.failures = 0;
+                })
+                .catch(error => {
+                    this.failures++;
+                    if (navigator.onLine === false) return;   // 離線時等待 online 事件
+                    const backoffMs = Math.min(SAMPLE_RETRY_MAX_MS, SAMPLE_RETRY_BASE_MS * 2 ** (this.failures - 1));
+                    // 不早於伺服器要求的時間，並加上隨機延遲以免同時重送
+                    const delayMs = Math.max(backoffMs * (0.5 + Math.random() / 2),
+                        this.retryAfterMs * (1 + Math.random() / 2));
+                    this.retryAfterMs = 0;
+                    console.warn(`上傳情緒資料失敗，${Math.round(delayMs / 1000)} 秒後重試:`, error);
+                    this.schedule(delayMs);
+                })
+                .finally(() => {
+                    this.flushing = null;
+                });
+        }
+        return this.flushing;
+    }
+
+    async drain() {
+        if (this.stopped) return;
+        if (this.timer) {
+            clearTimeout(this.timer);
+            this.timer = null;
+        }
+
+        for (let batch = await this.readBatch(); batch.length; batch = await this.readBatch()) {
+            await this.sendBatch(batch);
+        }
+        for (const ending of await this.readEndings()) {
+            const response = await this.post(this.endUrl, { session_id: ending.sessionId, ended_at: ending.endedAt });
+            if (response) {
+                this.lastEnding = { sessionId: ending.sessionId, result: await response.json().catch(() => null) };
+            }
+            await this.remove('endings', ending.sessionId);
+        }
+    }
+
+    async sendBatch(batch) {
+        const sessionId = batch[0].sessionId;
+        const encoded = this.binary ? encodeSampleBatch(sessionId, batch, this.labels) : null;
+        const response = encoded
+            ? await this.post(this.batchUrl, encoded, SAMPLE_BATCH_CONTENT_TYPE)
+            : await this.post(this.batchUrl, this.jsonBatch(sessionId, batch));
+
+        if (!response) {
+            // 學習記錄已刪除或資料無法接受，重送也不會成功
+            console.warn(`捨棄學習階段 ${sessionId} 的離線資料`);
+            await this.removeSession(sessionId);
+            return;
+        }
+        const result = await response.json();
+        this.onResponse(result);
+        const acked = new Set(result.acked || []);
+        await this.removeSamples(sessionId, batch.filter(record => acked.has(record.seq)).map(record => record.seq));
+        if (acked.size < batch.length) {
+            throw new Error('伺服器未確認整批資料');
+        }
+    }
+
+    // 無法以二進位格式編碼的批次（含時間窗摘要等）
+    jsonBatch(sessionId, batch) {
+        return {
+            session_id: sessionId,
+            samples: batch.filter(record => !record.window).map(record => ({
+                seq: record.seq,
+                client_ts: record.clientTs,
+                emotion: record.emotion,
+                attention_level: record.attention_level,
+                confidence: record.confidence,
+                sample_weight: record.sample_weight,
+                probabilities: record.probabilities
+            })),
+            windows: batch.filter(record => record.window).map(record => ({ seq: record.seq, ...record.window }))
+        };
+    }
+
+    // 成功時回傳 response，資料無法接受（400 / 404）時回傳 null，其餘錯誤拋出以便重試
+    // contentType 省略時 body 以 JSON 送出，否則直接送出（二進位批次）
+    async post(url, body, contentType) {
+        const response = await fetch(url, {
+            method: 'POST',
+            // 送出時的裝置時間，伺服器據此校正裝置時鐘的誤差
+            headers: { 'Content-Type': contentType || 'application/json', 'X-Client-Time': String(Date.now()) },
+            body: contentType ? body : JSON.stringify(body)
+        });
+        if (response.ok) return response;
+        if (response.status === 400 || response.status === 404) return null;
+        if (response.status === 401) {
+            this.stopped = true;
+        }
+        if (response.status === 415) {
+            this.binary = false;   // 伺服器不接受二進位格式，重試時改用 JSON
+        }
+        if (response.status === 429) {
+            // 限流或過載：依 Retry-After 延後重送，並套用回覆中建議的取樣間隔
+            const retryAfter = Number(response.headers.get('Retry-After'));
+            this.retryAfterMs = retryAfter > 0 ? retryAfter * 1000 : 0;
+            const result = await response.json().catch(() => null);
+            if (result) this.onResponse(result);
+        }
+        throw new Error(`HTTP ${response.status}`);
+    }
+
+    // 以下為儲存層：IndexedDB 或記憶體
+    async store(storeName, value) {
+        if (this.memory) {
+            if (storeName === 'samples') this.memory.samples.push(value);
+            else this.memory.endings.set(value.sessionId, value);
+            return;
+        }
+        const transaction = this.db.transaction(storeName, 'readwrite');
+        transaction.objectStore(storeName).put(value);
+        await idbComplete(transaction);
+    }
+
+    // 依 (sessionId, seq) 順序取出最舊的一批，同一批只含一個學習階段
+    readBatch() {
+        if (this.memory) {
+            const first = this.memory.samples[0];
+            return Promise.resolve(first
+                ? this.memory.samples.filter(record => record.sessionId === first.sessionId).slice(0, SAMPLE_BATCH_SIZE)
+                : []);
+        }
+        return new Promise((resolve, reject) => {
+            const records = [];
+            const request = this.db.transaction('samples').objectStore('samples').openCursor();
+            request.onsuccess = () => {
+                const cursor = request.result;
+                if (cursor && records.length < SAMPLE_BATCH_SIZE &&
+                    (!records.length || cursor.value.sessionId === records[0].sessionId)) {
+                    records.push(cursor.value);
+                    cursor.continue();
+                } else {
+                    resolve(records);
+                }
+            };
+            request.onerror = () => reject(request.error);
+        });
+    }
+
+    async readEndings() {
+        if (this.memory) return Array.from(this.memory.endings.values());
+        return await idbResult(this.db.transaction('endings').objectStore('endings').getAll());
+    }
+
+    async remove(storeName, key) {
+        if (this.memory) {
+            this.memory.endings.delete(key);
+            return;
+        }
+        const transaction = this.db.transaction(storeName, 'readwrite');
+        transaction.objectStore(storeName).delete(key);
+        await idbComplete(transaction);
+    }
+
+    async removeSamples(sessionId, seqs) {
+        if (this.memory) {
+            const removed = new Set(seqs);
+            this.memory.samples = this.memory.samples.filter(
+                record => record.sessionId !== sessionId || !removed.has(record.seq));
+            return;
+        }
+        const transaction = this.db.transaction('samples', 'readwrite');
+        const store = transaction.objectStore('samples');
+        seqs.forEach(seq => store.delete([sessionId, seq]));
+        await idbComplete(transaction);
+    }
+
+    async removeSession(sessionId) {
+        if (this.memory) {
+            this.memory.samples = this.memory.samples.filter(record => record.sessionId !== sessionId);
+            this.memory.endings.delete(sessionId);
+            return;
+        }
+        const transaction = this.db.transaction(['samples', 'endings'], 'readwrite');
+        // 陣列鍵中 [id] 小於 [id, 任何序號]，而 [id, []] 大於所有數字序號
+        transaction.objectStore('samples').delete(IDBKeyRange.bound([sessionId], [sessionId, []]));
+        transaction.objectStore('endings').delete(sessionId);
+        await idbComplete(transaction);
+    }
+}
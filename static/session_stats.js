@@ -0,0 +1,169 @@
+// static/session_stats.js
+// 學習頁面的即時統計：以累計值維護加權平均與情緒分布，每筆資料的更新成本固定；另含上傳用的時間窗彙整
+// 近期趨勢只保留固定筆數的環狀緩衝區，學習時間再長記憶體用量也不會增加
+
+const RECENT_SAMPLE_CAPACITY = 60;
+
+// 固定容量的加權數值緩衝區，額滿後覆寫最舊的一筆，並同步維護加總
+class RingBuffer {
+    constructor(capacity) {
+        this.capacity = capacity;
+        this.values = new Float64Array(capacity);
+        this.weights = new Float64Array(capacity);
+        this.clear();
+    }
+
+    clear() {
+        this.head = 0;
+        this.size = 0;
+        this.valueSum = 0;
+        this.weightSum = 0;
+    }
+
+    push(value, weight = 1) {
+        if (this.size === this.capacity) {
+            this.valueSum -= this.values[this.head] * this.weights[this.head];
+            this.weightSum -= this.weights[this.head];
+        } else {
+            this.size++;
+        }
+        this.values[this.head] = value;
+        this.weights[this.head] = weight;
+        this.valueSum += value * weight;
+        this.weightSum += weight;
+        this.head = (this.head + 1) % this.capacity;
+
+        // 每繞一圈重新加總一次，避免加減造成的浮點誤差累積（攤提後仍為常數成本）
+        if (this.head === 0) {
+            this.resum();
+        }
+    }
+
+    resum() {
+        this.valueSum = 0;
+        this.weightSum = 0;
+        for (let i = 0; i < this.size; i++) {
+            this.valueSum += this.values[i] * this.weights[i];
+            this.weightSum += this.weights[i];
+        }
+    }
+
+    weightedMean() {
+        return this.weightSum > 0 ? this.valueSum / this.weightSum : null;
+    }
+
+    // 由舊到新依序走訪
+    forEach(callback) {
+        const start = (this.head - this.size + this.capacity) % this.capacity;
+        for (let i = 0; i < this.size; i++) {
+            const index = (start + i) % this.capacity;
+            callback(this.values[index], this.weights[index]);
+        }
+    }
+}
+
+// 整次學習的累計統計：筆數、加權專注度與各情緒的加權次數
+class SessionStats {
+    constructor(labels, recentCapacity = RECENT_SAMPLE_CAPACITY) {
+        this.labels = labels;
+        this.recentAttention = new RingBuffer(recentCapacity);
+        this.reset();
+    }
+
+    reset() {
+        this.count = 0;
+        this.weightSum = 0;
+        this.attentionSum = 0;
+        this.histogram = {};
+        this.labels.forEach(label => {
+            this.histogram[label] = 0;
+        });
+        this.recentAttention.clear();
+    }
+
+    // sample: {emotion, attention, weight}；weight 為此筆資料代表的秒數
+    add(sample) {
+        const weight = sample.weight || 1;
+        this.count++;
+        this.weightSum += weight;
+        this.attentionSum += sample.attention * weight;
+        if (this.histogram.hasOwnProperty(sample.emotion)) {
+            this.histogram[sample.emotion] += weight;
+        }
+        this.recentAttention.push(sample.attention, weight);
+    }
+
+    get averageAttention() {
+        return this.weightSum > 0 ? this.attentionSum / this.weightSum : null;
+    }
+
+    get recentAverageAttention() {
+        return this.recentAttention.weightedMean();
+    }
+}
+
+// 固定時間窗的彙整：啟用時間窗上傳模式時，每個時間窗只上傳一筆摘要而非逐筆資料
+// 平均值依取樣權重加權，與伺服器以逐筆資料計算的結果相同
+class WindowAggregator {
+    constructor(labels, windowMs) {
+        this.labels = labels;
+        this.windowMs = windowMs;
+        this.startedAt = null;
+    }
+
+    get active() {
+        return this.startedAt !== null;
+    }
+
+    // 加入一筆資料；若此筆資料落在新的時間窗，先結束並回傳上一個時間窗的摘要
+    add(sample, now) {
+        let finished = null;
+        if (this.active && now - this.startedAt >= this.windowMs) {
+            finished = this.close(now);
+        }
+        if (!this.active) {
+            this.open(now);
+        }
+
+        const weight = sample.weight || 1;
+        this.sampleCount++;
+        this.weight += weight;
+        this.attentionSum += sample.attention * weight;
+        this.confidenceSum += sample.confidence * weight;
+        this.maxConfidence = Math.max(this.maxConfidence, sample.confidence);
+        if (this.emotionCounts.hasOwnProperty(sample.emotion)) {
+            this.emotionCounts[sample.emotion] += weight;
+        }
+        return finished;
+    }
+
+    open(now) {
+        this.startedAt = now;
+        this.sampleCount = 0;
+        this.weight = 0;
+        this.attentionSum = 0;
+        this.confidenceSum = 0;
+        this.maxConfidence = 0;
+        this.emotionCounts = {};
+        this.labels.forEach(label => {
+            this.emotionCounts[label] = 0;
+        });
+    }
+
+    // 結束目前的時間窗（暫停、結束學習時也會呼叫），沒有資料時回傳 null
+    close(now) {
+        if (!this.active) return null;
+        const summary = this.sampleCount ? {
+            start_ts: this.startedAt,
+            duration_ms: Math.min(now - this.startedAt, this.windowMs),
+            sample_count: this.sampleCount,
+            weight: this.weight,
+            avg_attention: this.attentionSum / this.weight,
+            avg_confidence: this.confidenceSum / this.weight,
+            max_confidence: this.maxConfidence,
+            emotion_counts: this.emotionCounts
+        } : null;
+        this.startedAt = null;
+        return summary;
+    }
+}
@@ -0,0 +1,88 @@
+"""測試共用設定
+
+app.py 於匯入時讀取環境變數，需先指定測試用的資料庫並關閉背景工作，再於 fixture 中延後匯入。
+每個測試結束後清空資料表、登錄表與權杖桶。
+"""
+import os
+import sys
+import tempfile
+from datetime import datetime
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+TEST_DIR = tempfile.mkdtemp(prefix='learning_system_test_')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(TEST_DIR, 'test.db')
+os.environ['JOB_WORKER_ENABLED'] = '0'
+os.environ['SHARED_BACKEND_URL'] = ''
+os.environ['LIVE_SESSION_REDIS_URL'] = ''
+os.environ['PASSWORD_HASH_WORKERS'] = '0'
+os.environ['BCRYPT_LOG_ROUNDS'] = '4'
+
+
+@pytest.fixture(scope='session')
+def app_module():
+    import app as app_module
+    with app_module.app.app_context():
+        app_module.db.create_all()
+        app_module.upgrade_database()
+    return app_module
+
+
+@pytest.fixture
+def app_ctx(app_module, monkeypatch):
+    from live_sessions import MemoryRegistry
+    from rate_limits import MemoryRateLimiter
+    from shared_backend import MemoryCache
+
+    monkeypatch.setattr(app_module, 'live_registry', MemoryRegistry())
+    monkeypatch.setattr(app_module, 'rate_limiter', MemoryRateLimiter())
+    monkeypatch.setattr(app_module, 'analytics_cache', MemoryCache())
+    with app_module.app.app_context():
+        yield app_module
+        app_module.db.session.rollback()
+        for table in reversed(app_module.db.metadata.sorted_tables):
+            app_module.db.session.execute(table.delete())
+        app_module.db.session.commit()
+
+
+@pytest.fixture
+def make_child(app_ctx):
+    """建立帳號與小孩檔案，回傳 (user_id, child_id)"""
+    def make(username='parent'):
+        user = app_ctx.User(username=username, email=f'{username}@example.com', password_hash='x')
+        app_ctx.db.session.add(user)
+        app_ctx.db.session.commit()
+        child = app_ctx.Child(user_id=user.id, nickname=username, gender='female', age=10,
+                              education_stage='elementary')
+        app_ctx.db.session.add(child)
+        app_ctx.db.session.commit()
+        return user.id, child.id
+    return make
+
+
+@pytest.fixture
+def make_session(app_ctx):
+    """建立學習階段，回傳 StudySession"""
+    def make(child_id, start_time=None, end_time=None):
+        study_session = app_ctx.StudySession(child_id=child_id, subject='math', duration_minutes=0,
+                                             start_time=start_time or datetime.utcnow(), end_time=end_time)
+        app_ctx.db.session.add(study_session)
+        app_ctx.db.session.commit()
+        return study_session
+    return make
+
+
+@pytest.fixture
+def login(app_ctx):
+    """以指定帳號登入的測試用瀏覽器"""
+    def make(user_id, child_id=None):
+        client = app_ctx.app.test_client()
+        with client.session_transaction() as session:
+            session['user_id'] = user_id
+            if child_id is not None:
+                session['child_id'] = child_id
+        return client
+    return make
@@ -0,0 +1,67 @@
+import glob
+import os
+import shutil
+import subprocess
+
+import pytest
+
+from build_assets import minify_js
+from conftest import ROOT
+
+requires_node = pytest.mark.skipif(shutil.which('node') is None, reason='需要 node')
+
+TRICKY_SOURCE = '''
+const tick = '`';
+const pattern = /`+/g;   // 反引號 `
+/* 註解中的 ` 反引號
+   第二行 */
+const nested = `outer ${items.map(item => `  ${item}  `).join(',')}
+    第二行保留縮排   `;
+const ratio = total / count / 2;
+const continued = 'a\\
+    b   ';
+function html() {
+    return `
+        <div class="${ratio > 1 ? `a` : 'b'}">   </div>
+    `;
+}
+'''
+
+
+def minified_files():
+    paths = glob.glob(os.path.join(ROOT, 'static', '*.js')) + glob.glob(os.path.join(ROOT, 'static', 'pages', '*.js'))
+    return sorted(os.path.relpath(path, ROOT) for path in paths)
+
+
+def test_literals_are_left_untouched():
+    lines = minify_js(TRICKY_SOURCE).split('\n')
+    assert "const tick = '`';" in lines
+    assert '    第二行保留縮排   `;' in lines
+    assert 'const ratio = total / count / 2;' in lines
+    assert "    b   ';" in lines
+    assert '        <div class="${ratio > 1 ? `a` : \'b\'}">   </div>' in lines
+    assert 'function html() {' in lines
+
+
+@requires_node
+def test_tricky_source_still_evaluates_the_same(tmp_path):
+    prelude = 'const items = [1, 2]; const total = 8, count = 2;\n'
+    epilogue = '\nconsole.log(JSON.stringify([tick, String(pattern), nested, ratio, continued, html()]));\n'
+    outputs = []
+    for source in (TRICKY_SOURCE, minify_js(TRICKY_SOURCE)):
+        path = tmp_path / 'tricky.js'
+        path.write_text(prelude + source + epilogue, encoding='utf-8')
+        outputs.append(subprocess.run(['node', str(path)], capture_output=True, text=True, check=True).stdout)
+    assert outputs[0] == outputs[1]
+
+
+@requires_node
+@pytest.mark.parametrize('name', minified_files())
+def test_shipped_scripts_parse_after_minifying(name, tmp_path):
+    with open(os.path.join(ROOT, name), encoding='utf-8') as f:
+        source = f.read()
+    # 頁面模組為 ES 模組
+    path = tmp_path / (os.path.basename(name)[:-3] + ('.mjs' if name.startswith('static' + os.sep + 'pages') else '.js'))
+    path.write_text(minify_js(source), encoding='utf-8')
+    result = subprocess.run(['node', '--check', str(path)], capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
@@ -0,0 +1,74 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, text
+
+CHUNK_SIZE = 7
+
+
+def add_history(app_ctx, make_session, child_id, sessions=5, samples=6):
+    """每個學習記錄各有逐筆資料與一個時間窗摘要"""
+    study_sessions = []
+    for index in range(sessions):
+        study_session = make_session(child_id, start_time=datetime.utcnow() - timedelta(hours=index + 1))
+        for seq in range(1, samples + 1):
+            app_ctx.db.session.add(app_ctx.EmotionData(
+                session_id=study_session.id, seq=seq, timestamp=study_session.start_time, emotion='happy',
+                attention_level=2, confidence=0.5, sample_weight=1.0))
+        app_ctx.db.session.add(app_ctx.EmotionWindow(
+            session_id=study_session.id, seq=1, start_time=study_session.start_time, duration_seconds=60,
+            sample_count=10, weight=10, avg_attention=2, avg_confidence=0.5, max_confidence=0.6,
+            emotion_counts='{}'))
+        study_sessions.append(study_session)
+    app_ctx.db.session.commit()
+    return study_sessions
+
+
+def count_orphans(app_ctx):
+    return app_ctx.db.session.execute(text(
+        'SELECT (SELECT COUNT(*) FROM emotion_data WHERE session_id NOT IN (SELECT id FROM study_session))'
+        ' + (SELECT COUNT(*) FROM emotion_window WHERE session_id NOT IN (SELECT id FROM study_session))'
+    )).scalar()
+
+
+def test_chunked_delete_removes_sessions_and_samples(app_ctx, make_child, make_session, monkeypatch):
+    monkeypatch.setattr(app_ctx, 'DELETE_CHUNK_SIZE', CHUNK_SIZE)
+    _, child_id = make_child('deleted')
+    _, other_child_id = make_child('kept')
+    # 30 筆逐筆資料與 5 個學習記錄，各需要多批（含剛好整批的情況）才能刪完
+    add_history(app_ctx, make_session, child_id, sessions=5, samples=6)
+    kept = add_history(app_ctx, make_session, other_child_id, sessions=2, samples=3)
+    assert app_ctx.db.session.execute(text('PRAGMA foreign_keys')).scalar() == 1
+
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith('DELETE FROM emotion_data'):
+            statements.append(statement)
+
+    event.listen(app_ctx.db.engine, 'before_cursor_execute', record)
+    try:
+        deleted = app_ctx.delete_study_sessions(app_ctx.StudySession.child_id == child_id)
+    finally:
+        event.remove(app_ctx.db.engine, 'before_cursor_execute', record)
+
+    assert deleted == 5
+    assert len(statements) == 5    # 30 筆，每批 7 筆
+    assert app_ctx.StudySession.query.filter_by(child_id=child_id).count() == 0
+    assert app_ctx.EmotionData.query.count() == 6
+    assert app_ctx.EmotionWindow.query.count() == 2
+    assert {row.session_id for row in app_ctx.EmotionData.query} == {study_session.id for study_session in kept}
+    assert count_orphans(app_ctx) == 0
+
+
+def test_delete_chunk_boundary(app_ctx, make_child, make_session, monkeypatch):
+    monkeypatch.setattr(app_ctx, 'DELETE_CHUNK_SIZE', CHUNK_SIZE)
+    _, child_id = make_child()
+    # 逐筆資料剛好是整數批（7 × 2 = 14）
+    add_history(app_ctx, make_session, child_id, sessions=2, samples=7)
+
+    app_ctx.delete_child_data(child_id)
+
+    assert app_ctx.db.session.get(app_ctx.Child, child_id) is None
+    assert app_ctx.StudySession.query.count() == 0
+    assert app_ctx.EmotionData.query.count() == 0 and app_ctx.EmotionWindow.query.count() == 0
+    assert count_orphans(app_ctx) == 0
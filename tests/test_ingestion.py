@@ -0,0 +1,141 @@
+import time
+from datetime import datetime, timedelta
+
+
+def sample(seq, client_ts=None, attention_level=3):
+    return {'seq': seq, 'client_ts': client_ts if client_ts is not None else time.time() * 1000,
+            'emotion': 'no emotion', 'attention_level': attention_level, 'confidence': 0.8, 'sample_weight': 1}
+
+
+def test_insert_new_rows_skips_existing_seq(app_ctx, make_child, make_session):
+    _, child_id = make_child()
+    study_session = make_session(child_id)
+    with app_ctx.app.test_request_context():
+        rows = {seq: app_ctx.parse_batch_sample(sample(seq), study_session)[1] for seq in (1, 2, 3)}
+        assert app_ctx.insert_new_rows(app_ctx.EmotionData, rows) == 3
+        assert app_ctx.insert_new_rows(app_ctx.EmotionData, rows) == 0
+        rows[4] = app_ctx.parse_batch_sample(sample(4), study_session)[1]
+        assert app_ctx.insert_new_rows(app_ctx.EmotionData, rows) == 1
+    assert app_ctx.EmotionData.query.filter_by(session_id=study_session.id).count() == 4
+
+
+def test_resent_batch_is_acked_without_duplicates(app_ctx, make_child, make_session, login):
+    user_id, child_id = make_child()
+    study_session = make_session(child_id)
+    client = login(user_id, child_id)
+    batch = {'session_id': study_session.id, 'samples': [sample(seq) for seq in range(1, 6)]}
+
+    first = client.post('/record_emotion_batch', json=batch).get_json()
+    second = client.post('/record_emotion_batch', json=batch).get_json()
+
+    assert first['inserted'] == 5 and second['inserted'] == 0
+    assert second['acked'] == [1, 2, 3, 4, 5]
+    assert app_ctx.EmotionData.query.filter_by(session_id=study_session.id).count() == 5
+    live = app_ctx.live_registry.get(study_session.id)
+    assert live.sample_count == 5 and live.average_attention == 3
+
+
+def test_device_clock_skew_is_corrected(app_ctx, make_child, make_session):
+    _, child_id = make_child()
+    study_session = make_session(child_id, start_time=datetime.utcnow() - timedelta(minutes=30))
+    # 裝置時鐘快一小時：送出時間與資料時間同樣偏移，校正後為 10 分鐘前
+    skew_ms = 3600 * 1000
+    now_ms = time.time() * 1000
+    with app_ctx.app.test_request_context(headers={'X-Client-Time': str(now_ms + skew_ms)}):
+        recorded = app_ctx.parse_client_time(now_ms + skew_ms - 600 * 1000, study_session)
+    assert abs(recorded - (datetime.utcnow() - timedelta(minutes=10))) < timedelta(seconds=5)
+
+
+def test_small_skew_is_left_alone(app_ctx, make_child, make_session):
+    _, child_id = make_child()
+    study_session = make_session(child_id, start_time=datetime.utcnow() - timedelta(minutes=30))
+    now_ms = time.time() * 1000
+    with app_ctx.app.test_request_context(headers={'X-Client-Time': str(now_ms + 500)}):
+        assert app_ctx.client_clock_offset() == timedelta(0)
+        recorded = app_ctx.parse_client_time(now_ms - 60 * 1000, study_session)
+    assert abs(recorded - (datetime.utcnow() - timedelta(minutes=1))) < timedelta(seconds=5)
+
+
+def window(seq, start_ms, sample_count=10, weight=10, avg_attention=2.0):
+    return {'seq': seq, 'start_ts': start_ms, 'duration_ms': 10000, 'sample_count': sample_count, 'weight': weight,
+            'avg_attention': avg_attention, 'avg_confidence': 0.6, 'max_confidence': 0.9,
+            'emotion_counts': {'happy': 6, 'neutral': 4}}
+
+
+def test_window_boundaries(app_ctx, make_child, make_session, login):
+    user_id, child_id = make_child()
+    study_session = make_session(child_id, start_time=datetime.utcnow() - timedelta(minutes=5))
+    client = login(user_id, child_id)
+    now_ms = time.time() * 1000
+    max_weight = 10 * app_ctx.app.config['MAX_SAMPLE_WEIGHT']
+    windows = [
+        window(1, now_ms - 60 * 1000, weight=max_weight, avg_attention=1),
+        window(2, now_ms - 3600 * 1000, avg_attention=3),         # 早於學習開始
+        window(3, now_ms + 3600 * 1000),                          # 晚於現在
+        window(4, now_ms, weight=max_weight + 1),                 # 權重超過上限
+        window(5, now_ms, avg_attention=3.5),                     # 專注度超出範圍
+        dict(window(6, now_ms), avg_confidence=0.95)              # 平均信心度大於最大值
+    ]
+
+    result = client.post('/record_emotion_batch', json={'session_id': study_session.id, 'windows': windows}).get_json()
+
+    assert result['acked'] == [1, 2, 3, 4, 5, 6] and result['inserted'] == 3
+    stored = {row.seq: row for row in app_ctx.EmotionWindow.query.filter_by(session_id=study_session.id)}
+    assert sorted(stored) == [1, 2, 3]
+    assert stored[1].duration_seconds == 10 and stored[1].weight == max_weight
+    assert stored[2].start_time == study_session.start_time
+    assert stored[3].start_time <= datetime.utcnow()
+
+
+def test_duplicate_window_seq_is_stored_once(app_ctx, make_child, make_session, login):
+    user_id, child_id = make_child()
+    study_session = make_session(child_id, start_time=datetime.utcnow() - timedelta(minutes=5))
+    client = login(user_id, child_id)
+    now_ms = time.time() * 1000
+    first = {'session_id': study_session.id,
+             'windows': [window(1, now_ms - 20000, avg_attention=1), window(1, now_ms - 10000, avg_attention=3)]}
+    second = {'session_id': study_session.id, 'windows': [window(1, now_ms, avg_attention=3), window(2, now_ms)]}
+
+    assert client.post('/record_emotion_batch', json=first).get_json()['inserted'] == 1
+    result = client.post('/record_emotion_batch', json=second).get_json()
+
+    assert result['acked'] == [1, 2] and result['inserted'] == 1
+    stored = app_ctx.EmotionWindow.query.filter_by(session_id=study_session.id).order_by(app_ctx.EmotionWindow.seq).all()
+    assert [(row.seq, row.avg_attention) for row in stored] == [(1, 1.0), (2, 2.0)]
+    live = app_ctx.live_registry.get(study_session.id)
+    assert live.sample_count == 20
+
+
+def test_batch_spanning_several_windows(app_ctx, make_child, make_session, login):
+    user_id, child_id = make_child()
+    study_session = make_session(child_id, start_time=datetime.utcnow() - timedelta(minutes=5))
+    client = login(user_id, child_id)
+    now_ms = time.time() * 1000
+    # 三個 10 秒時間窗，加上每個時間窗內的逐筆資料
+    samples = [sample(seq, client_ts=now_ms - 30000 + seq * 1000) for seq in range(1, 31)]
+    windows = [window(seq, now_ms - 30000 + (seq - 1) * 10000) for seq in range(1, 4)]
+
+    result = client.post('/record_emotion_batch',
+                         json={'session_id': study_session.id, 'samples': samples, 'windows': windows}).get_json()
+
+    assert result['inserted'] == 33 and result['acked'] == list(range(1, 31))
+    assert app_ctx.EmotionData.query.filter_by(session_id=study_session.id).count() == 30
+    assert app_ctx.EmotionWindow.query.filter_by(session_id=study_session.id).count() == 3
+    live = app_ctx.live_registry.get(study_session.id)
+    assert live.sample_count == 60
+
+
+def test_batch_over_the_limit_is_rejected(app_ctx, make_child, make_session, login, monkeypatch):
+    monkeypatch.setitem(app_ctx.app.config, 'MAX_INGEST_BATCH', 4)
+    user_id, child_id = make_child()
+    study_session = make_session(child_id)
+    client = login(user_id, child_id)
+    now_ms = time.time() * 1000
+
+    too_large = {'session_id': study_session.id, 'samples': [sample(seq) for seq in range(1, 4)],
+                 'windows': [window(1, now_ms), window(2, now_ms)]}
+    assert client.post('/record_emotion_batch', json=too_large).status_code == 400
+    assert app_ctx.EmotionData.query.count() == 0 and app_ctx.EmotionWindow.query.count() == 0
+
+    too_large['windows'].pop()
+    assert client.post('/record_emotion_batch', json=too_large).get_json()['inserted'] == 4
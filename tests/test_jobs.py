@@ -0,0 +1,152 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event
+
+from shared_backend import LocalReportStore
+
+
+@pytest.fixture
+def jobs(app_ctx, monkeypatch, tmp_path):
+    monkeypatch.setattr(app_ctx, 'report_store', LocalReportStore(str(tmp_path)))
+    monkeypatch.setitem(app_ctx.app.config, 'JOB_CHUNK_PAUSE_SECONDS', 0)
+    monkeypatch.setitem(app_ctx.app.config, 'JOB_MAX_ATTEMPTS', 2)
+    return app_ctx
+
+
+def test_delete_child_job_runs_in_process(jobs, make_child, make_session):
+    user_id, child_id = make_child()
+    make_session(child_id)
+    job = jobs.enqueue_job('delete_child', child_id)
+    assert jobs.enqueue_job('delete_child', child_id).id == job.id
+    assert jobs.visible_children(user_id).count() == 0
+
+    claimed = jobs.claim_next_job()
+    assert claimed.id == job.id and claimed.status == 'running' and claimed.attempts == 1
+    assert jobs.claim_next_job() is None
+    jobs.run_job(claimed)
+
+    assert claimed.status == 'done' and claimed.error is None and claimed.finished_at is not None
+    assert jobs.db.session.get(jobs.Child, child_id) is None
+    assert jobs.StudySession.query.count() == 0
+
+
+def test_failed_job_is_retried_then_marked_failed(jobs, monkeypatch):
+    calls = []
+
+    def broken(job, payload):
+        calls.append(payload)
+        raise RuntimeError('boom')
+
+    monkeypatch.setitem(jobs.JOB_HANDLERS, 'broken', broken)
+    job = jobs.enqueue_job('broken', value=1)
+
+    assert jobs.run_pending_jobs() == 2
+    assert calls == [{'value': 1}, {'value': 1}]
+    jobs.db.session.refresh(job)
+    assert job.status == 'failed' and job.attempts == 2 and job.error == 'boom'
+
+
+def test_unknown_job_type_fails(jobs):
+    job = jobs.enqueue_job('no_such_job')
+    jobs.run_pending_jobs()
+    jobs.db.session.refresh(job)
+    assert job.status == 'failed' and 'no_such_job' in job.error
+
+
+def test_periodic_jobs_are_requeued_after_the_interval(jobs):
+    expected = sorted(job_type for job_type, _, _ in jobs.PERIODIC_JOBS)
+    jobs.enqueue_periodic_jobs()
+    jobs.enqueue_periodic_jobs()
+    assert sorted(job.job_type for job in jobs.BackgroundJob.query) == expected
+
+    jobs.run_pending_jobs()
+    assert {job.status for job in jobs.BackgroundJob.query} == {'done'}
+    jobs.enqueue_periodic_jobs()
+    assert jobs.BackgroundJob.query.filter_by(status='pending').count() == 0
+
+    interval = timedelta(hours=jobs.app.config['VACUUM_INTERVAL_HOURS'])
+    for job in jobs.BackgroundJob.query:
+        job.created_at = datetime.utcnow() - interval - timedelta(minutes=1)
+    jobs.db.session.commit()
+    jobs.enqueue_periodic_jobs()
+    assert sorted(job.job_type for job in jobs.BackgroundJob.query.filter_by(status='pending')) == expected
+
+
+def test_stale_running_jobs_are_requeued(jobs):
+    job = jobs.enqueue_job('cleanup_reports')
+    jobs.claim_next_job()
+    job.started_at = datetime.utcnow() - timedelta(hours=2)
+    jobs.db.session.commit()
+
+    jobs.requeue_stale_jobs()
+    jobs.db.session.refresh(job)
+    assert job.status == 'pending'
+
+
+@pytest.mark.parametrize('payload', [{}, {'vacuum': True}])
+def test_optimize_database(jobs, payload):
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    jobs.db.session.commit()
+    event.listen(jobs.db.engine, 'before_cursor_execute', record)
+    try:
+        jobs.job_optimize_database(None, payload)
+    finally:
+        event.remove(jobs.db.engine, 'before_cursor_execute', record)
+    assert statements == (['ANALYZE', 'VACUUM'] if payload else ['ANALYZE'])
+
+
+def test_vacuum_is_a_separate_periodic_job(jobs):
+    jobs.enqueue_periodic_jobs()
+    payloads = [job.payload for job in jobs.BackgroundJob.query.filter_by(job_type='optimize_database')]
+    assert sorted(payloads) == ['{"vacuum": true}', '{}']
+
+
+def test_failed_user_deletion_stays_pending_and_is_retried(jobs, make_child, monkeypatch):
+    user_id, child_id = make_child()
+    job = jobs.enqueue_job('delete_user', user_id)
+
+    def broken(user_id, pause=0):
+        raise RuntimeError('database is locked')
+
+    delete_user_data = jobs.delete_user_data
+    monkeypatch.setattr(jobs, 'delete_user_data', broken)
+    jobs.run_pending_jobs()
+    jobs.db.session.refresh(job)
+    assert job.status == 'failed'
+    assert jobs.is_user_pending_deletion(user_id)
+    assert jobs.visible_children(user_id).count() == 1
+
+    jobs.requeue_failed_deletions()
+    jobs.db.session.refresh(job)
+    assert job.status == 'failed'
+    job.finished_at = datetime.utcnow() - timedelta(hours=jobs.app.config['MAINTENANCE_INTERVAL_HOURS'], minutes=1)
+    jobs.db.session.commit()
+    jobs.requeue_failed_deletions()
+    jobs.db.session.refresh(job)
+    assert job.status == 'pending' and job.attempts == 0
+
+    monkeypatch.setattr(jobs, 'delete_user_data', delete_user_data)
+    jobs.run_pending_jobs()
+    jobs.db.session.refresh(job)
+    assert job.status == 'done'
+    assert jobs.db.session.get(jobs.User, user_id) is None
+    assert not jobs.is_user_pending_deletion(user_id)
+
+
+def test_children_pending_deletion_are_hidden_from_handlers(jobs, make_child, make_session, login):
+    user_id, child_id = make_child()
+    make_session(child_id)
+    jobs.enqueue_job('delete_child', child_id)
+    client = login(user_id, child_id)
+
+    assert client.post(f'/reset_learning_history/{child_id}').get_json()['success'] is False
+    profile = {'child_id': child_id, 'nickname': 'renamed', 'gender': 'female', 'age': 10,
+               'education_stage': 'elementary'}
+    assert client.post('/update_child_profile', json=profile).get_json()['message'] == '找不到小孩檔案'
+    assert client.get(f'/generate_report/{child_id}').status_code == 302
+    assert jobs.StudySession.query.count() == 1
@@ -0,0 +1,21 @@
+from datetime import datetime, timedelta
+
+
+def test_sessions_ended_elsewhere_are_dropped_from_the_dashboard(app_ctx, make_child, make_session, login):
+    user_id, child_id = make_child()
+    active = make_session(child_id, start_time=datetime.utcnow() - timedelta(minutes=10))
+    ended = make_session(child_id, start_time=datetime.utcnow() - timedelta(minutes=20))
+    app_ctx.register_live_session(active, user_id)
+    app_ctx.register_live_session(ended, user_id)
+    # 其他程序結束了學習，這個程序的登錄表仍保留該項目
+    ended.end_time = datetime.utcnow()
+    app_ctx.db.session.commit()
+    client = login(user_id, child_id)
+
+    sessions = client.get('/live_sessions').get_json()['sessions']
+
+    assert [live['session_id'] for live in sessions] == [active.id]
+    assert sessions[0]['child_nickname'] == 'parent'
+    assert app_ctx.live_registry.get(ended.id) is None
+    assert app_ctx.live_registry.get(active.id) is not None
+    assert client.get('/dashboard').status_code == 200
@@ -0,0 +1,89 @@
+import time
+
+import pytest
+
+import rate_limits
+from rate_limits import MemoryRateLimiter
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(rate_limits.time, 'monotonic', clock)
+    return clock
+
+
+def test_token_bucket(clock):
+    limiter = MemoryRateLimiter()
+    assert [limiter.take('key', rate=2, burst=3) for _ in range(3)] == [0, 0, 0]
+    assert limiter.take('key', rate=2, burst=3) == pytest.approx(0.5)
+    clock.now += 0.5
+    assert limiter.take('key', rate=2, burst=3) == 0
+    clock.now += 100
+    assert [limiter.take('key', rate=2, burst=3) for _ in range(4)][-1] > 0
+    assert limiter.take('other', rate=2, burst=3) == 0
+
+
+def test_zero_rate_is_unlimited(clock):
+    limiter = MemoryRateLimiter()
+    assert all(limiter.take('key', rate=0, burst=1) == 0 for _ in range(100))
+
+
+def batch(session_id, seq):
+    return {'session_id': session_id, 'samples': [{
+        'seq': seq, 'client_ts': time.time() * 1000, 'emotion': 'happy', 'attention_level': 2, 'confidence': 0.7}]}
+
+
+def test_session_bucket_limits_the_owner(app_ctx, make_child, make_session, login):
+    user_id, child_id = make_child()
+    study_session = make_session(child_id)
+    client = login(user_id, child_id)
+    burst = app_ctx.app.config['INGEST_SESSION_BURST']
+
+    statuses = [client.post('/record_emotion_batch', json=batch(study_session.id, seq)).status_code
+                for seq in range(1, burst + 2)]
+
+    assert statuses[:burst] == [200] * burst
+    assert statuses[burst] == 429
+
+
+def test_other_accounts_cannot_drain_a_session_bucket(app_ctx, make_child, make_session, login):
+    owner_id, owner_child = make_child('owner')
+    intruder_id, intruder_child = make_child('intruder')
+    study_session = make_session(owner_child)
+    intruder = login(intruder_id, intruder_child)
+
+    for seq in range(1, app_ctx.app.config['INGEST_SESSION_BURST'] + 5):
+        response = intruder.post('/record_emotion', json={'session_id': study_session.id, 'seq': seq,
+                                                          'emotion': 'happy', 'attention_level': 2, 'confidence': 0.7})
+        assert response.get_json()['success'] is False
+        response = intruder.post('/record_emotion_batch', json=batch(study_session.id, seq))
+        assert response.status_code == 404
+
+    owner = login(owner_id, owner_child)
+    response = owner.post('/record_emotion_batch', json=batch(study_session.id, 1))
+    assert response.status_code == 200
+    assert response.get_json()['inserted'] == 1
+    assert app_ctx.EmotionData.query.filter_by(session_id=study_session.id).count() == 1
+
+
+def test_rejected_requests_still_charge_the_caller(app_ctx, make_child, make_session, login):
+    owner_id, owner_child = make_child('owner')
+    intruder_id, intruder_child = make_child('intruder')
+    study_session = make_session(owner_child)
+    intruder = login(intruder_id, intruder_child)
+    burst = app_ctx.app.config['INGEST_USER_BURST']
+
+    statuses = [intruder.post('/record_emotion_batch', json=batch(study_session.id, seq)).status_code
+                for seq in range(1, burst + 2)]
+
+    assert statuses[:burst] == [404] * burst
+    assert statuses[burst] == 429
@@ -0,0 +1,111 @@
+from datetime import datetime, timedelta, timezone
+
+
+def add_sample(app_ctx, study_session, minutes_ago, attention_level, confidence, weight, seq):
+    app_ctx.db.session.add(app_ctx.EmotionData(
+        session_id=study_session.id, seq=seq, timestamp=datetime.utcnow() - timedelta(minutes=minutes_ago),
+        emotion='happy', attention_level=attention_level, confidence=confidence, sample_weight=weight))
+
+
+def add_window(app_ctx, study_session, minutes_ago, avg_attention, avg_confidence, weight, seq):
+    app_ctx.db.session.add(app_ctx.EmotionWindow(
+        session_id=study_session.id, seq=seq, start_time=datetime.utcnow() - timedelta(minutes=minutes_ago),
+        duration_seconds=60, sample_count=10, weight=weight, avg_attention=avg_attention,
+        avg_confidence=avg_confidence, max_confidence=avg_confidence, emotion_counts='{}'))
+
+
+def test_reaps_idle_sessions_with_weighted_averages(app_ctx, make_child, make_session):
+    user_id, child_id = make_child()
+    now = datetime.utcnow()
+    idle = make_session(child_id, start_time=now - timedelta(minutes=60))
+    add_sample(app_ctx, idle, 50, 3, 0.9, 1, seq=1)
+    add_sample(app_ctx, idle, 45, 1, 0.5, 3, seq=2)
+    add_window(app_ctx, idle, 40, 2.0, 0.7, 4, seq=3)
+    empty = make_session(child_id, start_time=now - timedelta(minutes=45))
+    active = make_session(child_id, start_time=now - timedelta(minutes=60))
+    add_sample(app_ctx, active, 5, 3, 0.9, 1, seq=1)
+    app_ctx.db.session.commit()
+    app_ctx.register_live_session(idle, user_id)
+
+    assert app_ctx.reap_abandoned_sessions(idle_minutes=30) == 2
+
+    app_ctx.db.session.expire_all()
+    assert abs(idle.end_time - (now - timedelta(minutes=40))) < timedelta(seconds=5)
+    assert idle.duration_minutes == 20
+    # (3×1 + 1×3 + 2×4) / 8 與 (0.9×1 + 0.5×3 + 0.7×4) / 8
+    assert idle.avg_attention == 1.75
+    assert abs(idle.avg_emotion_score - 0.65) < 1e-9
+    assert empty.end_time == empty.start_time and empty.duration_minutes == 0
+    assert active.end_time is None
+    assert app_ctx.live_registry.get(idle.id) is None
+
+
+def test_reaper_disabled(app_ctx, make_child, make_session):
+    _, child_id = make_child()
+    study_session = make_session(child_id, start_time=datetime.utcnow() - timedelta(hours=5))
+    assert app_ctx.reap_abandoned_sessions(idle_minutes=0) == 0
+    app_ctx.db.session.expire_all()
+    assert study_session.end_time is None
+
+
+def end_session(client, study_session, ended_at):
+    return client.post('/end_session', json={'session_id': study_session.id,
+                                             'ended_at': ended_at.replace(tzinfo=timezone.utc).timestamp() * 1000})
+
+
+def test_late_end_session_refinalizes_a_reaped_session(app_ctx, make_child, make_session, login):
+    user_id, child_id = make_child()
+    now = datetime.utcnow()
+    study_session = make_session(child_id, start_time=now - timedelta(minutes=60))
+    add_sample(app_ctx, study_session, 50, 3, 0.9, 1, seq=1)
+    app_ctx.db.session.commit()
+    assert app_ctx.reap_abandoned_sessions(idle_minutes=30) == 1
+    app_ctx.db.session.expire_all()
+    assert study_session.reaped and study_session.duration_minutes == 10
+
+    # 離線的前端恢復連線後補傳資料與結束時間
+    client = login(user_id, child_id)
+    samples = [{'seq': 2, 'client_ts': (now - timedelta(minutes=36)).replace(tzinfo=timezone.utc).timestamp() * 1000,
+                'emotion': 'sad', 'attention_level': 1, 'confidence': 0.5}]
+    assert client.post('/record_emotion_batch', json={'session_id': study_session.id, 'samples': samples}).status_code == 200
+    assert end_session(client, study_session, now - timedelta(minutes=35)).get_json()['success']
+
+    app_ctx.db.session.expire_all()
+    assert abs(study_session.end_time - (now - timedelta(minutes=35))) < timedelta(seconds=5)
+    assert study_session.duration_minutes == 25
+    assert study_session.avg_attention == 2
+    assert not study_session.reaped
+
+    # 重送或較早的結束時間不再改變結果
+    assert end_session(client, study_session, now - timedelta(minutes=30)).get_json()['success']
+    app_ctx.db.session.expire_all()
+    assert study_session.duration_minutes == 25
+
+
+def test_earlier_end_time_keeps_the_reaped_result(app_ctx, make_child, make_session, login):
+    user_id, child_id = make_child()
+    now = datetime.utcnow()
+    study_session = make_session(child_id, start_time=now - timedelta(minutes=60))
+    add_sample(app_ctx, study_session, 50, 3, 0.9, 1, seq=1)
+    app_ctx.db.session.commit()
+    app_ctx.reap_abandoned_sessions(idle_minutes=30)
+    client = login(user_id, child_id)
+
+    assert end_session(client, study_session, now - timedelta(minutes=55)).get_json()['success']
+    assert client.post('/end_session', json={'session_id': study_session.id}).get_json()['success']
+
+    app_ctx.db.session.expire_all()
+    assert study_session.reaped and study_session.duration_minutes == 10
+
+
+def test_client_ended_session_ignores_later_end_times(app_ctx, make_child, make_session, login):
+    user_id, child_id = make_child()
+    now = datetime.utcnow()
+    study_session = make_session(child_id, start_time=now - timedelta(minutes=60))
+    client = login(user_id, child_id)
+
+    assert end_session(client, study_session, now - timedelta(minutes=40)).get_json()['success']
+    assert end_session(client, study_session, now - timedelta(minutes=10)).get_json()['success']
+
+    app_ctx.db.session.expire_all()
+    assert study_session.duration_minutes == 20 and not study_session.reaped
@@ -0,0 +1,64 @@
+import math
+import struct
+
+import pytest
+
+import sample_codec
+from emotion_smoothing import EMOTION_LABELS, unpack_probabilities
+from sample_codec import HEADER_FORMAT, MAGIC, RECORD_FORMAT, decode_sample_batch
+
+
+def encode(session_id, base_seq, base_ts, records):
+    """與 static/sample_codec.js 的 encodeSampleBatch 相同的格式"""
+    body = struct.pack(HEADER_FORMAT, MAGIC, session_id, base_seq, base_ts)
+    for seq_delta, time_delta, code, attention, confidence, weight, probabilities in records:
+        body += struct.pack(RECORD_FORMAT, seq_delta, time_delta, code, attention, confidence, weight, *probabilities)
+    return body
+
+
+PROBABILITIES = [0.05, 0.05, 0.1, 0.5, 0.2, 0.05, 0.05]
+NAN = [math.nan] * len(EMOTION_LABELS)
+
+
+def test_round_trip():
+    body = encode(42, 100, 1700000000000.0, [
+        (0, 0, 3, 2, 255, 1000, PROBABILITIES),
+        (1, 1500, 4, 3, 128, 2500, NAN),
+        (3, 65535, 0, 1, 0, 0, PROBABILITIES)
+    ])
+    session_id, samples = decode_sample_batch(body)
+
+    assert session_id == 42
+    assert [sample['seq'] for sample in samples] == [100, 101, 103]
+    assert [sample['client_ts'] for sample in samples] == [1700000000000.0, 1700000001500.0, 1700000067035.0]
+    assert [sample['emotion'] for sample in samples] == ['happy', 'no emotion', 'anger']
+    assert [sample['attention_level'] for sample in samples] == [2, 3, 1]
+    assert samples[0]['confidence'] == 1.0 and samples[2]['confidence'] == 0.0
+    assert samples[1]['sample_weight'] == 2.5
+    assert unpack_probabilities(samples[0]['probabilities']) == pytest.approx(PROBABILITIES)
+    assert samples[1]['probabilities'] is None
+
+
+def test_invalid_emotion_code_and_probabilities():
+    _, samples = decode_sample_batch(encode(1, 1, 0.0, [(0, 0, 200, 2, 10, 1000, [0.5] * 6 + [1.5])]))
+    assert samples[0]['emotion'] is None
+    assert samples[0]['probabilities'] is None
+
+
+@pytest.mark.parametrize('body', [
+    b'',
+    b'EMS2' + b'\0' * 16,
+    struct.pack(HEADER_FORMAT, MAGIC, 1, 1, math.inf),
+    encode(1, 1, 0.0, [(0, 0, 3, 2, 10, 1000, PROBABILITIES)])[:-1]
+])
+def test_malformed_batches(body):
+    with pytest.raises(ValueError):
+        decode_sample_batch(body)
+
+
+def test_struct_fallback_matches(monkeypatch):
+    body = encode(7, 1, 5.0, [(i, i * 10, i % 7, 1 + i % 3, i, i * 100, PROBABILITIES if i % 2 else NAN)
+                              for i in range(20)])
+    expected = decode_sample_batch(body)
+    monkeypatch.setattr(sample_codec, 'np', None)
+    assert decode_sample_batch(body) == expected
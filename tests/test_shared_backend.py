@@ -0,0 +1,85 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import shared_backend
+from shared_backend import FileCache, create_shared_backend
+
+
+def test_file_cache_is_shared_between_instances(tmp_path):
+    first, second = FileCache(str(tmp_path)), FileCache(str(tmp_path))
+    first.set('analytics:1:0:analysis', {'value': 1}, ttl=60)
+    assert second.get('analytics:1:0:analysis') == {'value': 1}
+    assert first.incr('analytics_version:1') == 1
+    assert second.incr('analytics_version:1') == 2
+    assert first.get('analytics_version:1') == 2
+
+
+def test_file_cache_expires(tmp_path, monkeypatch):
+    cache = FileCache(str(tmp_path))
+    cache.set('key', 'value', ttl=10)
+    now = shared_backend.time.time()
+    monkeypatch.setattr(shared_backend.time, 'time', lambda: now + 11)
+    assert cache.get('key') is None
+
+
+def test_redis_url_without_redis_package_fails(monkeypatch):
+    monkeypatch.setattr(shared_backend, 'redis', None)
+    with pytest.raises(RuntimeError):
+        create_shared_backend('redis://localhost:6379/0')
+    with pytest.raises(ValueError):
+        create_shared_backend('memcached://localhost')
+
+
+def test_analytics_cache_is_off_without_shared_backend(app_module):
+    assert app_module.app.config['ANALYTICS_CACHE_SECONDS'] == 0
+
+
+def test_analytics_cache_hit_and_invalidation(app_ctx, monkeypatch):
+    monkeypatch.setitem(app_ctx.app.config, 'ANALYTICS_CACHE_SECONDS', 60)
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return len(calls)
+
+    assert app_ctx.cached_analytics(1, 'analysis', compute) == 1
+    assert app_ctx.cached_analytics(1, 'analysis', compute) == 1
+    app_ctx.invalidate_analytics(2)
+    assert app_ctx.cached_analytics(1, 'analysis', compute) == 1
+    app_ctx.invalidate_analytics(1)
+    assert app_ctx.cached_analytics(1, 'analysis', compute) == 2
+
+
+def test_data_analysis_reads_sessions_only_on_miss(app_ctx, make_child, make_session, login, monkeypatch):
+    monkeypatch.setitem(app_ctx.app.config, 'ANALYTICS_CACHE_SECONDS', 60)
+    user_id, child_id = make_child()
+    start_time = datetime.utcnow() - timedelta(minutes=30)
+    make_session(child_id, start_time=start_time, end_time=start_time + timedelta(minutes=20))
+    client = login(user_id, child_id)
+    assert client.get('/data_analysis').status_code == 200
+
+    calls = []
+    prepare_chart_data = app_ctx.prepare_chart_data
+    monkeypatch.setattr(app_ctx, 'prepare_chart_data',
+                        lambda study_sessions: calls.append(1) or prepare_chart_data(study_sessions))
+    response = client.get('/data_analysis')
+    assert response.status_code == 200
+    assert start_time.strftime('%Y-%m-%d %H:%M') in response.get_data(as_text=True)
+    assert calls == []
+
+    app_ctx.invalidate_analytics(child_id)
+    assert client.get('/data_analysis').status_code == 200
+    assert calls == [1]
+
+
+def test_insert_missing_rows_without_on_conflict(app_ctx, make_child, make_session):
+    _, child_id = make_child()
+    study_session = make_session(child_id)
+    rows = [{'session_id': study_session.id, 'seq': seq, 'timestamp': datetime.utcnow(), 'emotion': 'happy',
+             'attention_level': 2, 'confidence': 0.5, 'sample_weight': 1.0} for seq in (1, 2)]
+    assert app_ctx.insert_missing_rows(app_ctx.EmotionData, rows) == 2
+    rows.append(dict(rows[0], seq=3))
+    assert app_ctx.insert_missing_rows(app_ctx.EmotionData, rows) == 1
+    app_ctx.db.session.commit()
+    assert app_ctx.EmotionData.query.filter_by(session_id=study_session.id).count() == 3
@@ -0,0 +1,104 @@
+import json
+import os
+import random
+import shutil
+import subprocess
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from conftest import ROOT
+from emotion_smoothing import EMOTION_LABELS, EmotionSmoother, pack_probabilities, unpack_probabilities
+
+
+def fixed_samples(count=40, seed=7):
+    """固定的機率與裝置時間（含間隔不一與時間倒退），機率經 float32 保存後的值"""
+    rng = random.Random(seed)
+    samples = []
+    timestamp = 1700000000000.0
+    for _ in range(count):
+        weights = [rng.random() ** 3 for _ in EMOTION_LABELS]
+        probabilities = [weight / sum(weights) for weight in weights]
+        timestamp += rng.choice([-200, 0, 150, 500, 1000, 5000, 20000])
+        samples.append((unpack_probabilities(pack_probabilities(probabilities)), timestamp))
+    return samples
+
+
+def smooth(samples):
+    smoother = EmotionSmoother()
+    return [smoother.update(probabilities, timestamp) for probabilities, timestamp in samples]
+
+
+@pytest.mark.skipif(shutil.which('node') is None, reason='需要 node')
+def test_python_matches_emotion_smoothing_js(tmp_path):
+    samples = fixed_samples()
+    script = tmp_path / 'smooth.js'
+    with open(os.path.join(ROOT, 'static', 'emotion_smoothing.js'), encoding='utf-8') as f:
+        source = f.read()
+    script.write_text(source + f'''
+const smoother = new EmotionSmoother({json.dumps(EMOTION_LABELS)});
+const samples = {json.dumps(samples)};
+console.log(JSON.stringify(samples.map(([probabilities, timestamp]) => smoother.update(probabilities, timestamp))));
+''', encoding='utf-8')
+    expected = json.loads(subprocess.run(['node', str(script)], capture_output=True, text=True, check=True).stdout)
+
+    for python_state, js_state in zip(smooth(samples), expected, strict=True):
+        assert python_state['emotion'] == js_state['emotion']
+        assert python_state['attention'] == js_state['attention']
+        assert python_state['confidence'] == pytest.approx(js_state['confidence'], abs=1e-12)
+
+
+def add_samples(app_ctx, study_session, samples):
+    """以錯誤的情緒與專注度寫入，寫入順序與序號不同"""
+    rows = list(enumerate(samples, start=1))
+    random.Random(1).shuffle(rows)
+    for seq, (probabilities, timestamp) in rows:
+        app_ctx.db.session.add(app_ctx.EmotionData(
+            session_id=study_session.id, seq=seq, client_ts=timestamp,
+            timestamp=study_session.start_time + timedelta(seconds=seq), emotion='fear', attention_level=1,
+            confidence=0.0, sample_weight=1.0, probabilities=pack_probabilities(probabilities)))
+    app_ctx.db.session.commit()
+
+
+def stored_rows(app_ctx, study_session):
+    rows = app_ctx.EmotionData.query.filter_by(session_id=study_session.id).order_by(app_ctx.EmotionData.seq)
+    return [(row.seq, row.emotion, row.confidence, row.attention_level) for row in rows]
+
+
+def test_finalize_resmooths_like_emotion_smoothing(app_ctx, make_child, make_session):
+    _, child_id = make_child()
+    study_session = make_session(child_id, start_time=datetime.utcnow() - timedelta(minutes=20))
+    samples = fixed_samples()
+    add_samples(app_ctx, study_session, samples)
+
+    app_ctx.finalize_study_session(study_session, datetime.utcnow())
+    app_ctx.db.session.commit()
+
+    rows = stored_rows(app_ctx, study_session)
+    for (_, emotion, confidence, attention_level), state in zip(rows, smooth(samples), strict=True):
+        assert (emotion, attention_level) == (state['emotion'], state['attention'])
+        assert confidence == pytest.approx(state['confidence'])
+
+
+def test_finalizing_twice_does_not_change_rows(app_ctx, make_child, make_session, login):
+    user_id, child_id = make_child()
+    study_session = make_session(child_id, start_time=datetime.utcnow() - timedelta(minutes=20))
+    add_samples(app_ctx, study_session, fixed_samples())
+    client = login(user_id, child_id)
+    ended_at = time.time() * 1000
+
+    assert client.post('/end_session', json={'session_id': study_session.id, 'ended_at': ended_at}).get_json()['success']
+    app_ctx.db.session.expire_all()
+    rows = stored_rows(app_ctx, study_session)
+    finalized = (study_session.end_time, study_session.duration_minutes,
+                 study_session.avg_attention, study_session.avg_emotion_score)
+
+    assert client.post('/end_session', json={'session_id': study_session.id, 'ended_at': ended_at}).get_json()['success']
+    app_ctx.finalize_study_session(study_session, study_session.end_time)
+    app_ctx.db.session.commit()
+    app_ctx.db.session.expire_all()
+
+    assert stored_rows(app_ctx, study_session) == rows
+    assert (study_session.end_time, study_session.duration_minutes,
+            study_session.avg_attention, study_session.avg_emotion_score) == finalized